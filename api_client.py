@@ -0,0 +1,218 @@
+"""
+Client asyncio cho API upload/status: gửi nhiều ảnh song song (giới hạn bằng semaphore), poll các job
+đang chờ theo lô (?job_ids=) với exponential backoff có jitter và trả kết quả dần qua async iterator.
+HTTP đi qua requests.Session dùng chung trong thread pool nên không cần thêm thư viện async.
+"""
+import asyncio
+import base64
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+import requests
+import clients
+import image_output
+
+TERMINAL_STATUSES = {"COMPLETED", "FAILED"}
+# Số job tối đa trong một request ?job_ids= (MAX_BATCH_JOB_IDS của Status Lambda)
+STATUS_BATCH_SIZE = 100
+
+class ApiError(Exception):
+    """API trả về mã lỗi HTTP"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+class AsyncRekognitionClient:
+    """
+    Dùng với `async with`. `run(paths)` upload toàn bộ ảnh (tối đa `concurrency` upload cùng lúc) và
+    yield kết quả của từng job ngay khi job kết thúc, theo thứ tự hoàn thành:
+    response của /status kèm `image`; job quá `job_timeout` giây có status `TIMEOUT`.
+    """
+
+    def __init__(self, upload_url: str | None = None, status_url: str | None = None, concurrency: int = 16,
+                 upload_mode: str = "base64", poll_initial: float = 1.0, poll_max: float = 15.0,
+                 job_timeout: float = 300.0, upload_retries: int = 2, session=None):
+        if upload_url is None or status_url is None:
+            from settings import get_settings
+            settings = get_settings()
+            upload_url = upload_url or settings.api_upload_url
+            status_url = status_url or settings.api_status_url
+        if not upload_url or not status_url:
+            raise ValueError("upload_url and status_url are required")
+        if upload_mode not in ("base64", "presigned"):
+            raise ValueError("upload_mode must be 'base64' or 'presigned'")
+
+        self.upload_url = upload_url
+        self.status_url = status_url
+        self.upload_mode = upload_mode
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.job_timeout = job_timeout
+        self.upload_retries = upload_retries
+        self.session = session or clients.get_http_session()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Đủ thread cho mọi upload đang chạy cộng với các request poll theo lô
+        self._executor = ThreadPoolExecutor(max_workers=concurrency + 4, thread_name_prefix="api-client")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _request(self, method: str, url: str, **kwargs):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(self._executor, partial(self.session.request, method, url, **kwargs))
+        if response.status_code not in (200, 204):
+            raise ApiError(response.status_code, response.text)
+        return response
+
+    async def _post_job(self, payload: dict, timeout: float):
+        """
+        POST tới API upload, thử lại tối đa `upload_retries` lần khi lỗi mạng/timeout/5xx/429.
+        Mọi lần thử dùng chung một Idempotency-Key nên request tới nơi nhiều lần vẫn chỉ tạo một job.
+        """
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        for attempt in range(self.upload_retries + 1):
+            try:
+                return await self._request("POST", self.upload_url, json=payload, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout, ApiError) as e:
+                retryable = not isinstance(e, ApiError) or e.status_code >= 500 or e.status_code == 429
+                if not retryable or attempt == self.upload_retries:
+                    raise
+                await asyncio.sleep(self._next_delay(attempt))
+
+    async def submit(self, image_path, max_labels: int = 10, min_confidence: float = 40, **options) -> str:
+        """Upload một ảnh (base64 hoặc presigned POST), trả về job_id. `options`: callback_url, render, tiled, output"""
+        payload = {"max_labels": max_labels, "min_confidence": min_confidence, **options}
+        image_bytes = await asyncio.to_thread(Path(image_path).read_bytes)
+        if self.upload_mode == "presigned":
+            content_type = image_output.sniff_content_type(image_bytes) or "image/jpeg"
+            response = await self._post_job({**payload, "mode": "presigned", "content_type": content_type}, timeout=10)
+            result = response.json()
+            upload = result["upload"]
+            await self._request(
+                "POST", upload["url"], data=upload["fields"],
+                files={"file": (Path(image_path).name, image_bytes, content_type)}, timeout=60,
+            )
+            return result["job_id"]
+
+        payload["image"] = base64.b64encode(image_bytes).decode("utf-8")
+        response = await self._post_job(payload, timeout=30)
+        return response.json()["job_id"]
+
+    async def get_jobs(self, job_ids: list[str]) -> dict[str, dict]:
+        """Trạng thái nhiều job, mỗi request tối đa STATUS_BATCH_SIZE job (các lô gửi song song)"""
+        async def fetch(chunk):
+            response = await self._request("GET", self.status_url, params={"job_ids": ",".join(chunk)}, timeout=10)
+            return response.json()["jobs"]
+
+        chunks = [job_ids[start:start + STATUS_BATCH_SIZE] for start in range(0, len(job_ids), STATUS_BATCH_SIZE)]
+        results = await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+        return {job["job_id"]: job for jobs in results for job in jobs}
+
+    def _next_delay(self, attempt: int) -> float:
+        """Exponential backoff với jitter (50-100% khoảng chờ) để các job không poll dồn cùng lúc"""
+        delay = min(self.poll_max, self.poll_initial * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def run(self, image_paths, **options):
+        """Async iterator: upload mọi ảnh rồi yield kết quả từng job theo thứ tự hoàn thành"""
+        image_paths = list(image_paths)
+        results = asyncio.Queue()
+        # job_id -> [image, thời điểm submit, số lần đã poll, thời điểm poll kế tiếp]
+        pending = {}
+        new_job = asyncio.Event()
+
+        async def submit_one(image_path):
+            async with self._semaphore:
+                try:
+                    job_id = await self.submit(image_path, **options)
+                except Exception as e:
+                    await results.put({"image": str(image_path), "status": "FAILED", "error_message": f"upload: {e}"})
+                    return
+            now = time.monotonic()
+            pending[job_id] = [str(image_path), now, 0, now + self._next_delay(0)]
+            new_job.set()
+
+        async def poll():
+            # Hai lượt poll cách nhau ít nhất `window` giây; các job tới hạn trong khoảng đó được gộp vào cùng lô
+            window = self.poll_initial / 4
+            last_poll = float("-inf")
+            while not (submitters.done() and not pending):
+                now = time.monotonic()
+                due = [job_id for job_id, job in pending.items() if job[3] <= now + window] if now >= last_poll + window else []
+                if due:
+                    last_poll = now
+                    try:
+                        jobs = await self.get_jobs(due)
+                    except Exception:
+                        # Lỗi tạm thời của /status: các job được poll lại ở lượt backoff sau
+                        jobs = {}
+                    now = time.monotonic()
+                    for job_id in due:
+                        image, submitted_at, attempt, _ = pending[job_id]
+                        job = jobs.get(job_id)
+                        if job and job.get("status") in TERMINAL_STATUSES:
+                            del pending[job_id]
+                            await results.put({"image": image, **job})
+                        elif now - submitted_at > self.job_timeout:
+                            del pending[job_id]
+                            await results.put({"image": image, "job_id": job_id, "status": "TIMEOUT"})
+                        else:
+                            pending[job_id][2:] = [attempt + 1, now + self._next_delay(attempt + 1)]
+
+                next_poll = max(min((job[3] for job in pending.values()), default=now + self.poll_max) - window, last_poll + window)
+                new_job.clear()
+                # Thức dậy sớm khi có job mới hoặc khi đã upload xong hết
+                waiter = asyncio.ensure_future(new_job.wait())
+                await asyncio.wait(
+                    [waiter] if submitters.done() else [waiter, submitters],
+                    timeout=max(0.0, next_poll - time.monotonic()), return_when=asyncio.FIRST_COMPLETED,
+                )
+                waiter.cancel()
+
+        submitters = asyncio.ensure_future(asyncio.gather(*(submit_one(path) for path in image_paths)))
+        poller = asyncio.create_task(poll())
+        try:
+            for _ in range(len(image_paths)):
+                getter = asyncio.ensure_future(results.get())
+                await asyncio.wait([getter, poller], return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    # Vòng poll dừng vì lỗi: ném lại lỗi thay vì chờ mãi
+                    getter.cancel()
+                    poller.result()
+                yield getter.result()
+        finally:
+            submitters.cancel()
+            poller.cancel()
+
+class RekognitionClient:
+    """Facade đồng bộ cho script: mỗi lời gọi chạy một event loop riêng"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def analyze_many(self, image_paths, on_result=None, **options) -> list[dict]:
+        """Xử lý nhiều ảnh, trả về danh sách kết quả theo thứ tự hoàn thành (on_result được gọi với từng kết quả)"""
+        async def collect():
+            collected = []
+            async with AsyncRekognitionClient(**self.kwargs) as client:
+                async for result in client.run(image_paths, **options):
+                    if on_result:
+                        on_result(result)
+                    collected.append(result)
+            return collected
+
+        return asyncio.run(collect())
+
+    def analyze(self, image_path, **options) -> dict:
+        """Upload một ảnh và chờ kết quả"""
+        return self.analyze_many([image_path], **options)[0]
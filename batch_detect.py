@@ -0,0 +1,193 @@
+"""Gắn nhãn hàng loạt ảnh local: DetectLabels song song, vẽ box bằng process pool, ghi kết quả ra JSONL (chạy tiếp được)"""
+import argparse
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict
+from pathlib import Path
+import numpy as np
+from botocore.exceptions import ClientError
+from main import detect_labels_from_local_file, draw_bounding_box, rekognition_backend
+from ratelimit import AdaptiveRateLimiter, ThrottlingRetry
+from label_index import SqliteLabelIndex
+import preprocessing
+import detection
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+def find_images(source: Path, exclude: Path | None = None) -> list[Path]:
+    """
+    Ảnh trong thư mục (đệ quy, bỏ qua thư mục `exclude` chứa ảnh đã vẽ)
+    hoặc danh sách đường dẫn trong file manifest (mỗi dòng một ảnh, # là chú thích)
+    """
+    if source.is_dir():
+        exclude = exclude.resolve() if exclude else None
+        return sorted(
+            path for path in source.rglob("*")
+            if path.suffix.lower() in IMAGE_EXTENSIONS and not (exclude and path.resolve().is_relative_to(exclude))
+        )
+    images = []
+    for line in source.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            path = Path(line)
+            images.append(path if path.is_absolute() else source.parent / path)
+    return images
+
+def output_path_for(image_path: Path, source: Path, output_dir: Path) -> Path:
+    """Giữ nguyên cấu trúc thư mục con để các ảnh trùng tên không ghi đè nhau"""
+    root = source if source.is_dir() else source.parent
+    try:
+        relative = image_path.relative_to(root)
+    except ValueError:
+        relative = Path(image_path.name)
+    return output_dir / relative.parent / f"detected_{relative.name}"
+
+def load_done(results_path: Path, draw: bool) -> set[str]:
+    """Ảnh đã xử lý xong ở lần chạy trước (lỗi thì chạy lại, ảnh có box phải còn file output đã vẽ)"""
+    done = set()
+    if not results_path.exists():
+        return done
+    with open(results_path, encoding="utf-8") as results_file:
+        for line in results_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Dòng cuối có thể bị cắt dở nếu lần chạy trước bị dừng đột ngột
+                continue
+            if record.get("status") == "empty" or (
+                record.get("status") == "ok" and (not draw or not record.get("labels")
+                                                  or (record.get("output") and Path(record["output"]).exists()))
+            ):
+                done.add(record["image"])
+    return done
+
+def detect_one(image_path: Path, args, backend) -> dict:
+    """
+    Chạy trong thread pool: phát hiện nhãn cho một ảnh bằng `backend` (Rekognition, local hoặc cascade), trả về
+    bản ghi kết quả. Ảnh chỉ được đọc và thu nhỏ một lần; chỉ lời gọi DetectLabels bên trong backend mới đi qua
+    limiter và được retry khi bị throttle.
+    """
+    record = {"image": str(image_path)}
+    start = time.perf_counter()
+    options = dict(max_labels=args.max_labels, min_confidence=args.min_confidence, max_edge=args.max_edge or None,
+                   verbose=False, raise_errors=True)
+    try:
+        detected = detect_labels_from_local_file(image_path, **options, backend=backend)
+        record.update(
+            status="ok" if detected else "empty",
+            labels=[asdict(label) for label in detected.labels] if detected else [],
+            image_labels=[asdict(label) for label in detected.image_labels] if detected else [],
+        )
+        if detected and detected.attempts:
+            record["attempts"] = detected.attempts
+        record["_detection"] = detected
+    except ClientError as e:
+        record.update(status="error", error=f"{e.response['Error']['Code']}: {e.response['Error']['Message']}")
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", type=Path, help="thư mục ảnh hoặc file manifest (mỗi dòng một đường dẫn)")
+    parser.add_argument("--output-dir", type=Path, default=Path("image/detected"), help="thư mục lưu ảnh đã vẽ box")
+    parser.add_argument("--results", type=Path, default=None, help="file JSONL kết quả (mặc định <output-dir>/results.jsonl)")
+    parser.add_argument("--max-labels", type=int, default=10)
+    parser.add_argument("--min-confidence", type=float, default=40)
+    parser.add_argument("--max-edge", type=int, default=preprocessing.MAX_EDGE, help="0 = gửi nguyên ảnh")
+    parser.add_argument("--workers", type=int, default=8, help="số lời gọi DetectLabels song song")
+    parser.add_argument("--draw-workers", type=int, default=None, help="số process vẽ box (mặc định = số CPU)")
+    parser.add_argument("--tps", type=float, default=5, help="giới hạn lời gọi/giây (0 = không giới hạn)")
+    parser.add_argument("--max-retries", type=int, default=6, help="số lần retry khi bị throttle")
+    parser.add_argument("--no-draw", action="store_true", help="chỉ ghi nhãn, không vẽ ảnh")
+    parser.add_argument("--detector", choices=detection.BACKENDS, default="rekognition",
+                        help="cascade: model local trả lời ảnh dễ, chỉ gọi Rekognition cho ảnh chưa chắc chắn")
+    parser.add_argument("--local-model", default=detection.LOCAL_MODEL_PATH, help="model phân loại ONNX cho local/cascade")
+    parser.add_argument("--local-labels", default=detection.LOCAL_MODEL_LABELS, help="file tên nhãn của model (mỗi dòng một nhãn)")
+    parser.add_argument("--cascade-threshold", type=float, default=detection.CASCADE_MIN_CONFIDENCE,
+                        help="confidence tối thiểu (0-100) để dùng câu trả lời local")
+    parser.add_argument("--blank-max-stddev", type=float, default=detection.BLANK_MAX_STDDEV,
+                        help="ảnh có độ lệch chuẩn độ sáng không quá ngưỡng này coi là một màu, không có nhãn (0 = tắt)")
+    parser.add_argument("--index", type=Path, default=None,
+                        help="file SQLite chỉ mục nhãn -> ảnh (tra bằng python label_index.py <file> <nhãn>)")
+    args = parser.parse_args()
+
+    draw = not args.no_draw
+    results_path = args.results or args.output_dir / "results.jsonl"
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+
+    images = find_images(args.source, exclude=args.output_dir if draw else None)
+    done = load_done(results_path, draw)
+    todo = [path for path in images if str(path) not in done]
+    print(f"📁 {len(images)} ảnh, bỏ qua {len(images) - len(todo)} ảnh đã xử lý, còn {len(todo)} ảnh")
+    if not todo:
+        return
+
+    # Tốc độ giảm một nửa khi bị throttle rồi tăng dần lại tới --tps (AIMD)
+    limiter = AdaptiveRateLimiter(args.tps) if args.tps else None
+    retry = ThrottlingRetry(limiter, max_retries=args.max_retries, base_delay=0.5, max_delay=20.0)
+    try:
+        backend = detection.create_backend(args.detector, rekognition_backend(retry), args.local_model,
+                                           args.local_labels, args.cascade_threshold, args.blank_max_stddev)
+    except ValueError as e:
+        parser.error(str(e))
+    latencies = []
+    counts = {"ok": 0, "empty": 0, "error": 0}
+    start = time.perf_counter()
+
+    index = SqliteLabelIndex(args.index) if args.index else None
+
+    with ThreadPoolExecutor(max_workers=args.workers) as detect_pool, \
+            ProcessPoolExecutor(max_workers=args.draw_workers) as draw_pool, \
+            open(results_path, "a", encoding="utf-8") as results_file:
+
+        def write(record):
+            counts[record["status"]] += 1
+            if index and record["status"] in ("ok", "empty"):
+                index.add(record["image"], record.get("image_labels", []))
+            results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            results_file.flush()
+            finished = sum(counts.values())
+            if finished % 50 == 0 or finished == len(todo):
+                print(f"  {finished}/{len(todo)} ảnh ({finished / (time.perf_counter() - start):.2f} ảnh/s)")
+
+        pending = {detect_pool.submit(detect_one, path, args, backend): None for path in todo}
+        while pending:
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                record = pending.pop(future)
+                if record is None:
+                    # Kết quả DetectLabels: ảnh có box thì chuyển sang process pool để vẽ
+                    record = future.result()
+                    detected = record.pop("_detection", None)
+                    latencies.append(record["latency_ms"])
+                    if draw and detected and detected.labels:
+                        image_path = Path(record["image"])
+                        output_path = output_path_for(image_path, args.source, args.output_dir)
+                        pending[draw_pool.submit(draw_bounding_box, image_path, detected, output_path=output_path)] = record
+                        continue
+                else:
+                    # Kết quả vẽ box
+                    try:
+                        record["output"] = str(future.result())
+                    except Exception as e:
+                        record.update(status="error", error=f"draw: {e}")
+                write(record)
+
+    elapsed = time.perf_counter() - start
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"\n✅ {counts['ok']} ảnh có nhãn, {counts['empty']} ảnh không có đối tượng, {counts['error']} lỗi, {retry.throttled} lần bị throttle")
+    print(f"⏱️ {len(todo) / elapsed:.2f} ảnh/s, độ trễ DetectLabels p50 {p50:.0f} ms, p95 {p95:.0f} ms")
+    if isinstance(backend, detection.CascadeBackend):
+        stats = backend.stats
+        print(f"🪜 Cascade: {backend.avoided()} ảnh không gọi Rekognition ({stats['blank']} ảnh một màu, "
+              f"{stats['local']} model local), {stats['rekognition']} lời gọi Rekognition, {stats['local_errors']} lỗi model local")
+    print(f"📝 Kết quả: {results_path}")
+    if index:
+        index.close()
+        print(f"🔎 Chỉ mục nhãn: {args.index} (python label_index.py {args.index} <nhãn> --min-confidence 80)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+S3, DynamoDB, SQS, SNS và Rekognition giả lập trong bộ nhớ cho benchmark: chỉ cài các API mà các handler
+trong lambda/ thực sự gọi. `install()` đặt chúng vào clients.py nên handler dùng luôn mà không cần sửa code.
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from botocore.exceptions import ClientError
+import clients
+
+def client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+class StreamingBody:
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read(self, amt=None):
+        # Như botocore: read() trả phần còn lại, read(amt) đọc từng khối (shutil.copyfileobj)
+        end = len(self._data) if amt is None else self._position + amt
+        chunk = self._data[self._position:end]
+        self._position += len(chunk)
+        return chunk
+
+class FakeS3:
+    """Object store dạng dict (key -> bytes), bỏ qua tên bucket"""
+
+    def __init__(self, latency=0.0):
+        self.objects = {}
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._wait()
+        data = Body.read() if hasattr(Body, 'read') else Body
+        with self._lock:
+            self.objects[Key] = {'Body': bytes(data), 'Metadata': kwargs.get('Metadata', {}), 'ContentType': kwargs.get('ContentType')}
+        return {'ETag': f'"{uuid.uuid4().hex}"'}
+
+    def _get(self, Key, operation):
+        with self._lock:
+            obj = self.objects.get(Key)
+        if obj is None:
+            raise client_error('404' if operation == 'HeadObject' else 'NoSuchKey', 'Not Found', operation)
+        return obj
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._wait()
+        obj = self._get(Key, 'GetObject')
+        return {'Body': StreamingBody(obj['Body']), 'ContentLength': len(obj['Body']), 'ContentType': obj['ContentType'], 'Metadata': obj['Metadata']}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        obj = self._get(Key, 'HeadObject')
+        return {'ContentLength': len(obj['Body']), 'ContentType': obj['ContentType'], 'Metadata': obj['Metadata']}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?Expires={int(time.time()) + ExpiresIn}"
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        return {'url': f'https://{Bucket}.s3.local/', 'fields': {**(Fields or {}), 'key': Key}}
+
+class Condition:
+    """
+    ConditionExpression tối giản: so sánh (=, <>, <, <=, >, >=, BETWEEN), attribute_exists/attribute_not_exists,
+    AND/OR/NOT và ngoặc. So sánh với attribute không tồn tại luôn sai, giống DynamoDB.
+    """
+    TOKEN = re.compile(r"<>|<=|>=|[=<>(),]|[^\s=<>(),]+")
+    MISSING = object()
+
+    def __init__(self, expression, names, values):
+        self.tokens = self.TOKEN.findall(expression)
+        self.names = names
+        self.values = values
+
+    def evaluate(self, item):
+        self.item, self.position = item, 0
+        return self._or()
+
+    def _next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _peek(self):
+        return self.tokens[self.position].upper() if self.position < len(self.tokens) else None
+
+    def _or(self):
+        result = self._and()
+        while self._peek() == 'OR':
+            self._next()
+            result = self._and() or result
+        return result
+
+    def _and(self):
+        result = self._factor()
+        while self._peek() == 'AND':
+            self._next()
+            result = self._factor() and result
+        return result
+
+    def _factor(self):
+        token = self._next()
+        if token.upper() == 'NOT':
+            return not self._factor()
+        if token == '(':
+            result = self._or()
+            self._next()
+            return result
+        if token in ('attribute_exists', 'attribute_not_exists'):
+            self._next()
+            exists = self._operand(self._next()) is not self.MISSING
+            self._next()
+            return exists if token == 'attribute_exists' else not exists
+        left, operator = self._operand(token), self._next()
+        if operator.upper() == 'BETWEEN':
+            low, _, high = self._operand(self._next()), self._next(), self._operand(self._next())
+            return left is not self.MISSING and low <= left <= high
+        right = self._operand(self._next())
+        if left is self.MISSING or right is self.MISSING:
+            return False
+        return {'=': left == right, '<>': left != right, '<': left < right, '<=': left <= right,
+                '>': left > right, '>=': left >= right}[operator]
+
+    def _operand(self, token):
+        if token.startswith(':'):
+            return self.values[token]
+        return self.item.get(self.names.get(token, token), self.MISSING)
+
+class FakeTable:
+    """
+    Bảng DynamoDB: item lưu theo khoá chính, hỗ trợ các UpdateExpression dạng `SET a = :v, ...`, `ADD a :v`,
+    `REMOVE a` và ConditionExpression dạng chuỗi (xem Condition)
+    """
+
+    def __init__(self, name, key_names):
+        self.name = name
+        self.key_names = key_names
+        self.items = {}
+        # Thời điểm (perf_counter) mỗi item chuyển sang từng status, để đo độ trễ end-to-end
+        self.status_times = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return tuple(key[name] for name in self.key_names)
+
+    def _check(self, item, kwargs, operation):
+        if 'ConditionExpression' not in kwargs:
+            return
+        condition = Condition(kwargs['ConditionExpression'], kwargs.get('ExpressionAttributeNames') or {},
+                              kwargs.get('ExpressionAttributeValues') or {})
+        if not condition.evaluate(item or {}):
+            raise client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def put_item(self, Item, **kwargs):
+        with self._lock:
+            self._check(self.items.get(self._key(Item)), kwargs, 'PutItem')
+            self.items[self._key(Item)] = dict(Item)
+            self._record_status(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        with self._lock:
+            item = self.items.get(self._key(Key))
+        return {'Item': dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            self._check(self.items.get(self._key(Key)), {**kwargs, 'ExpressionAttributeNames': names,
+                                                         'ExpressionAttributeValues': values}, 'UpdateItem')
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            # Tách theo từ khoá SET/ADD/REMOVE rồi theo dấu phẩy
+            parts = re.split(r'\b(SET|ADD|REMOVE)\b', UpdateExpression)
+            for action, clauses in zip(parts[1::2], parts[2::2]):
+                for clause in clauses.split(','):
+                    tokens = clause.split()
+                    if not tokens:
+                        continue
+                    attribute = names.get(tokens[0], tokens[0])
+                    if action == 'SET':
+                        item[attribute] = values[tokens[-1]]
+                    elif action == 'ADD':
+                        item[attribute] = item.get(attribute, 0) + values[tokens[-1]]
+                    elif action == 'REMOVE':
+                        item.pop(attribute, None)
+            self._record_status(item)
+        return {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        condition = Condition(KeyConditionExpression, ExpressionAttributeNames or {}, ExpressionAttributeValues or {})
+        with self._lock:
+            items = [dict(item) for item in self.items.values() if condition.evaluate(item)]
+        return {'Items': items, 'Count': len(items)}
+
+    def batch_writer(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def _record_status(self, item):
+        if 'status' in item:
+            self.status_times.setdefault(self._key(item), {}).setdefault(item['status'], time.perf_counter())
+
+class FakeDynamoDB:
+    """Thay cho boto3.resource('dynamodb')"""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            responses[name] = [item for item in (table.get_item(Key=key).get('Item') for key in request['Keys']) if item]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+class FakeSQS:
+    """
+    Các hàng đợi FIFO trong bộ nhớ (mỗi QueueUrl một hàng đợi); consumer lấy theo lô giống event source mapping
+    của Lambda. `duplicate_rate`: tỷ lệ message được giao thêm một lần nữa (SQS chỉ đảm bảo at-least-once).
+    """
+
+    def __init__(self, duplicate_rate=0.0):
+        self.queues = {}
+        self.duplicate_rate = duplicate_rate
+        self.duplicates = 0
+        self._available = threading.Condition()
+
+    def _queue(self, queue_url):
+        return self.queues.setdefault(queue_url, deque())
+
+    def _enqueue(self, queue_url, body):
+        message_id = str(uuid.uuid4())
+        with self._available:
+            self._queue(queue_url).append({
+                'messageId': message_id,
+                'body': body,
+                'attributes': {'SentTimestamp': str(int(time.time() * 1000)), 'ApproximateReceiveCount': '1'},
+                'eventSourceARN': queue_url,
+            })
+            self._available.notify_all()
+        return message_id
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        return {'MessageId': self._enqueue(QueueUrl, MessageBody)}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        return {
+            'Successful': [{'Id': entry['Id'], 'MessageId': self._enqueue(QueueUrl, entry['MessageBody'])} for entry in Entries],
+            'Failed': [],
+        }
+
+    def depth(self, queue_url=None):
+        """Số message đang chờ của một hàng đợi (None = mọi hàng đợi)"""
+        with self._available:
+            return len(self._queue(queue_url)) if queue_url else sum(map(len, self.queues.values()))
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        # Message được coi là xoá ngay khi nhận nên không có message đang xử lý/đang delay
+        return {'Attributes': {
+            'ApproximateNumberOfMessages': str(self.depth(QueueUrl)),
+            'ApproximateNumberOfMessagesNotVisible': '0',
+            'ApproximateNumberOfMessagesDelayed': '0',
+        }}
+
+    def wait(self, timeout):
+        """Chờ tới khi có message mới (hoặc hết `timeout` giây)"""
+        with self._available:
+            if not self.depth():
+                self._available.wait(timeout)
+
+    def receive_batch(self, max_messages=10, wait=0.05, queue_url=None):
+        """
+        Lấy tối đa max_messages message của một hàng đợi (None = lần lượt các hàng đợi theo thứ tự tạo),
+        chờ tối đa `wait` giây để gom đủ lô
+        """
+        deadline = time.perf_counter() + wait
+        with self._available:
+            while self.depth(queue_url) < max_messages and time.perf_counter() < deadline:
+                self._available.wait(max(0.0, deadline - time.perf_counter()))
+            batch = []
+            for queue in [self._queue(queue_url)] if queue_url else list(self.queues.values()):
+                while queue and len(batch) < max_messages:
+                    batch.append(queue.popleft())
+            for message in batch:
+                if self.duplicate_rate and random.random() < self.duplicate_rate:
+                    attributes = {**message['attributes'], 'ApproximateReceiveCount': str(int(message['attributes']['ApproximateReceiveCount']) + 1)}
+                    self._queue(message['eventSourceARN']).append({**message, 'attributes': attributes})
+                    self.duplicates += 1
+            return batch
+
+class FakeSNS:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, TopicArn, Message, **kwargs):
+        self.published.append(Message)
+        return {'MessageId': str(uuid.uuid4())}
+
+class FakeRekognition:
+    """
+    DetectLabels trả về các nhãn cố định với độ trễ ngẫu nhiên trong khoảng latency ± jitter.
+    `quota` > 0: quá `quota` lời gọi trong một giây thì trả ThrottlingException như hạn mức TPS thật.
+    """
+
+    LABELS = [
+        {'Name': 'Person', 'Confidence': 99.1, 'Instances': [
+            {'BoundingBox': {'Left': 0.12, 'Top': 0.08, 'Width': 0.25, 'Height': 0.8}, 'Confidence': 99.1},
+            {'BoundingBox': {'Left': 0.55, 'Top': 0.1, 'Width': 0.22, 'Height': 0.78}, 'Confidence': 97.4},
+        ], 'Parents': []},
+        {'Name': 'Human', 'Confidence': 99.1, 'Instances': [
+            {'BoundingBox': {'Left': 0.121, 'Top': 0.081, 'Width': 0.25, 'Height': 0.8}, 'Confidence': 99.1},
+        ], 'Parents': []},
+        {'Name': 'Chair', 'Confidence': 87.5, 'Instances': [
+            {'BoundingBox': {'Left': 0.4, 'Top': 0.55, 'Width': 0.15, 'Height': 0.3}, 'Confidence': 87.5},
+        ], 'Parents': [{'Name': 'Furniture'}]},
+        {'Name': 'Indoors', 'Confidence': 76.0, 'Instances': [], 'Parents': []},
+        {'Name': 'Lamp', 'Confidence': 42.3, 'Instances': [
+            {'BoundingBox': {'Left': 0.82, 'Top': 0.05, 'Width': 0.08, 'Height': 0.2}, 'Confidence': 42.3},
+        ], 'Parents': []},
+    ]
+
+    def __init__(self, latency=0.2, jitter=0.5, labels=None, quota=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.labels = labels or self.LABELS
+        self.quota = quota
+        self.calls = 0
+        self.throttled = 0
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+
+    def detect_labels(self, Image, MaxLabels=10, MinConfidence=55, **kwargs):
+        with self._lock:
+            if self.quota:
+                second = int(time.monotonic())
+                window, count = self._window if self._window[0] == second else (second, 0)
+                if count >= self.quota:
+                    self.throttled += 1
+                    raise client_error('ThrottlingException', 'Rate exceeded', 'DetectLabels')
+                self._window = (window, count + 1)
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        labels = [label for label in self.labels if label['Confidence'] >= MinConfidence][:MaxLabels]
+        return {'Labels': labels, 'LabelModelVersion': '3.0'}
+
+def install(jobs_table='jobs', cache_table=None, rekognition_latency=0.2, rekognition_jitter=0.5, s3_latency=0.0,
+            duplicate_rate=0.0, rekognition_quota=0.0):
+    """Đăng ký các dịch vụ giả lập vào clients.py, trả về dict các fake để benchmark đọc số liệu"""
+    tables = {jobs_table: FakeTable(jobs_table, ['job_id'])}
+    if cache_table:
+        tables[cache_table] = FakeTable(cache_table, ['content_hash', 'params'])
+    fakes = {
+        's3': FakeS3(s3_latency),
+        'sqs': FakeSQS(duplicate_rate),
+        'sns': FakeSNS(),
+        'rekognition': FakeRekognition(rekognition_latency, rekognition_jitter, quota=rekognition_quota),
+        'dynamodb': FakeDynamoDB(tables),
+    }
+    with clients._lock:
+        for name in ('s3', 'sqs', 'sns', 'rekognition'):
+            clients._clients[name] = fakes[name]
+        # Client Rekognition không tự retry (max_attempts=1) của Processing Lambda
+        clients._clients['rekognition:1'] = fakes['rekognition']
+        clients._resources['dynamodb'] = fakes['dynamodb']
+    return fakes
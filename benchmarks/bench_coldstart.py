@@ -0,0 +1,158 @@
+"""
+Đo thời gian khởi tạo (cold start) của từng Lambda trên máy local: mỗi lần chạy là một process Python mới,
+đo thời gian import module handler và thời gian tạo các AWS client mà handler dùng (credential giả, không gọi mạng).
+Giống trên Lambda: không có settings.py/pydantic-settings, cấu hình đọc từ biến môi trường.
+
+    python benchmarks/bench_coldstart.py --runs 10
+    python benchmarks/bench_coldstart.py status --importtime 15     # module import chậm nhất của handler
+    python benchmarks/bench_coldstart.py --bundle dist               # đo trên zip của package_lambdas.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from package_lambdas import HANDLERS
+
+# Chạy trong process con: in JSON gồm thời gian import, tạo client và số module đã nạp
+CHILD = r'''
+import json, sys, time
+paths = json.loads(sys.argv[1])
+sys.path[:0] = paths
+sys.modules['settings'] = None
+started = time.perf_counter()
+if sys.argv[2] == 'boto3':
+    # Cách cũ để so sánh: boto3 và resource DynamoDB tạo ngay lúc import
+    import boto3
+    imported = time.perf_counter()
+    session = boto3.session.Session()
+    session.resource('dynamodb')
+    session.client('s3')
+else:
+    import importlib
+    importlib.import_module(sys.argv[2])
+    imported = time.perf_counter()
+    import clients
+    # Client lazy của handler và các module local nó import (result_cache, label_index...)
+    local = [module for module in list(sys.modules.values())
+             if str(getattr(module, '__file__', '')).startswith(tuple(paths))]
+    for value in [value for module in local for value in vars(module).values()]:
+        if isinstance(value, clients.LazyClient):
+            value._factory(value._service_name, **value._kwargs)
+finished = time.perf_counter()
+print(json.dumps({'import': imported - started, 'clients': finished - imported, 'modules': len(sys.modules),
+                  'boto3': 'boto3' in sys.modules, 'imaging': 'PIL' in sys.modules or 'numpy' in sys.modules}))
+'''
+
+# Biến môi trường tối thiểu để handler import được; credential giả vì không gửi request nào
+CHILD_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'TABLE_NAME': 'jobs',
+    'BUCKET_NAME': 'bucket',
+    'QUEUE_URL': 'https://sqs.us-east-1.amazonaws.com/000000000000/jobs',
+    'METRICS_ENABLED': 'false',
+}
+
+def run_once(paths, target):
+    env = {**os.environ, **CHILD_ENV}
+    env.pop('PYTHONPATH', None)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, json.dumps(paths), target],
+                            env=env, capture_output=True, text=True, cwd=tempfile.gettempdir())
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f'{target}: {result.stderr.strip().splitlines()[-1]}')
+    return {**json.loads(result.stdout), 'process': wall}
+
+def import_offenders(paths, target, top):
+    """Các module có thời gian import (cộng dồn) lớn nhất, từ `python -X importtime`"""
+    code = f'import sys; sys.path[:0] = {paths!r}; sys.modules["settings"] = None; import {target}'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env={**os.environ, **CHILD_ENV},
+                            capture_output=True, text=True, cwd=tempfile.gettempdir())
+    rows, pending = [], []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        pending.append((int(parts[1]) / 1000, parts[2].rstrip()))
+        # Module con được in trước module cha; chỉ giữ cây import của handler (bỏ site, encodings... lúc khởi động)
+        if not parts[2].startswith('  '):
+            if parts[2].strip() == target:
+                rows.extend(pending)
+            pending = []
+    return sorted(rows, reverse=True)[:top]
+
+def extract_bundles(bundle_dir: Path, workdir: Path):
+    """Giải nén zip của từng handler vào thư mục riêng; trả về handler -> sys.path"""
+    paths = {}
+    for short_name, (handler, zip_name, _) in HANDLERS.items():
+        path = bundle_dir / f'{zip_name}.zip'
+        if path.is_file():
+            with zipfile.ZipFile(path) as bundle:
+                bundle.extractall(workdir / zip_name)
+            paths[handler] = [str(workdir / zip_name)]
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('handlers', nargs='*', help=f"{', '.join(HANDLERS)} (mặc định: tất cả)")
+    parser.add_argument('--runs', type=int, default=5, help='số process mới cho mỗi handler')
+    parser.add_argument('--bundle', type=Path, default=None, help='thư mục chứa zip của package_lambdas.py')
+    parser.add_argument('--no-baseline', action='store_true', help='bỏ dòng so sánh import boto3 + resource DynamoDB')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N', help='in N module import chậm nhất')
+    parser.add_argument('--json', type=Path, default=None, help='ghi kết quả ra file JSON để so sánh giữa các lần chạy')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.handlers if name not in HANDLERS]
+    if unknown:
+        parser.error(f"Unknown handlers: {', '.join(unknown)} (allowed: {', '.join(HANDLERS)})")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source_paths = [str(ROOT), str(ROOT / 'lambda')]
+        bundle_paths = extract_bundles(args.bundle, Path(workdir)) if args.bundle else {}
+        targets = [HANDLERS[name][0] for name in args.handlers or HANDLERS]
+        if not args.no_baseline:
+            targets.append('boto3')
+
+        # Chạy một lượt trước để __pycache__ của mã nguồn và site-packages đã có sẵn
+        for target in targets:
+            run_once(bundle_paths.get(target, source_paths), target)
+
+        results = {}
+        print(f"{'handler':<30} {'import':>9} {'clients':>9} {'init':>9} {'process':>9} {'modules':>8}  ghi chú")
+        for target in targets:
+            paths = bundle_paths.get(target, source_paths)
+            runs = [run_once(paths, target) for _ in range(args.runs)]
+            summary = {key: statistics.median(run[key] for run in runs) * 1000 for key in ('import', 'clients', 'process')}
+            summary['init'] = statistics.median((run['import'] + run['clients']) for run in runs) * 1000
+            summary['modules'] = runs[-1]['modules']
+            notes = [note for note, flag in (('boto3', runs[-1]['boto3']), ('Pillow/NumPy', runs[-1]['imaging'])) if flag]
+            if target in bundle_paths:
+                notes.append('zip')
+            results[target] = summary
+            print(f"{target:<30} {summary['import']:>7.1f}ms {summary['clients']:>7.1f}ms {summary['init']:>7.1f}ms "
+                  f"{summary['process']:>7.1f}ms {summary['modules']:>8}  {', '.join(notes)}")
+
+            if args.importtime and target != 'boto3':
+                for cumulative, name in import_offenders(paths, target, args.importtime):
+                    print(f"    {cumulative:>8.1f}ms {name}")
+
+    print('\ninit = import + tạo client (median). process = cả process, gồm khởi động interpreter.')
+    if args.json:
+        args.json.write_text(json.dumps({'args': {key: str(value) for key, value in vars(args).items()},
+                                         'results': results}, indent=2))
+        print(f"📝 Kết quả: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Benchmark toàn bộ pipeline trong một process: Upload Lambda -> SQS -> Processing Lambda -> Status Lambda,
+chạy trên S3/DynamoDB/SQS/Rekognition giả lập (benchmarks/aws_fakes.py). Báo cáo độ trễ từng bước và số job/giây.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "lambda"), str(Path(__file__).resolve().parent)]
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Thứ tự các bước trong báo cáo; tên bên phải là tên bước trong bản ghi metrics của Processing Lambda
+STAGES = ["upload", "queue_wait", "status_update", "s3_get", "decode", "local_detect", "rate_limit_wait", "backoff",
+          "detect", "download_wait", "draw", "encode", "put", "thumbnails", "complete", "processing", "status", "end_to_end",
+          "end_to_end_bulk"]
+PROCESSOR_STAGES = {"queue_wait": "queue_wait", "status_update": "status_update", "s3_get": "s3_get", "decode": "decode",
+                    "local_detect": "local_detect", "rate_limit_wait": "rate_limit_wait", "backoff": "backoff", "detect": "detect",
+                    "download_wait": "download_wait", "draw": "draw", "encode": "encode",
+                    "s3_put": "put", "thumbnails": "thumbnails", "complete": "complete", "total": "processing"}
+
+def make_images(count, width, height, seed, blank=0):
+    """
+    Ảnh JPEG tổng hợp (gradient + hình chữ nhật ngẫu nhiên) có kích thước file gần với ảnh chụp;
+    `blank` ảnh đầu tiên là ảnh một màu (khung hình đen/che ống kính) mà cascade trả lời không cần Rekognition.
+    """
+    rng = random.Random(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :].repeat(height, axis=0)
+    images = []
+    for index in range(count):
+        if index < blank:
+            buffer = io.BytesIO()
+            Image.new("RGB", (width, height), (index * 53 % 256,) * 3).save(buffer, format="JPEG", quality=90)
+            images.append(base64.b64encode(buffer.getvalue()).decode("utf-8"))
+            continue
+        image = Image.fromarray(np.stack([gradient, gradient[::-1], np.full_like(gradient, index * 37 % 256)], axis=-1))
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            left, top = rng.randrange(width), rng.randrange(height)
+            draw.rectangle([left, top, left + rng.randrange(20, width // 3), top + rng.randrange(20, height // 3)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        images.append(base64.b64encode(buffer.getvalue()).decode("utf-8"))
+    return images
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {"count": len(values), "mean": values.mean(), "p50": p50, "p90": p90, "p95": p95, "p99": p99, "max": values.max()}
+
+def print_histogram(values, width=40):
+    """Histogram theo thang log (ms)"""
+    values = np.asarray(values) * 1000
+    edges = np.unique(np.geomspace(max(values.min(), 0.01), values.max() * 1.0001, 9))
+    counts, edges = np.histogram(values, bins=edges)
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        bar = "█" * int(round(width * count / max(1, counts.max())))
+        print(f"    {low:>10.2f} - {high:<10.2f} ms {count:>6} {bar}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=200, help="số ảnh upload")
+    parser.add_argument("--bulk-jobs", type=int, default=0, help="số job bulk (backfill) upload trước các job interactive")
+    parser.add_argument("--single-queue", action="store_true", help="mọi làn dùng chung một hàng đợi (để so sánh)")
+    parser.add_argument("--concurrency", type=int, default=16, help="số request upload/status đồng thời")
+    parser.add_argument("--consumers", type=int, default=4, help="số lần gọi Processing Lambda đồng thời")
+    parser.add_argument("--bulk-consumers", type=int, default=1,
+                        help="Maximum concurrency của trigger hàng đợi bulk (khi không dùng --single-queue)")
+    parser.add_argument("--batch-size", type=int, default=10, help="số message SQS mỗi lần gọi Processing Lambda")
+    parser.add_argument("--batch-workers", type=int, default=4, help="BATCH_WORKERS của Processing Lambda")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--distinct-images", type=int, default=8, help="số ảnh khác nhau dùng luân phiên")
+    parser.add_argument("--rekognition-latency", type=float, default=0.2, help="độ trễ trung bình DetectLabels (giây)")
+    parser.add_argument("--rekognition-jitter", type=float, default=0.5, help="dao động độ trễ (tỷ lệ)")
+    parser.add_argument("--rekognition-quota", type=float, default=0, help="hạn mức TPS của DetectLabels giả lập (0 = không giới hạn)")
+    parser.add_argument("--rekognition-tps", type=float, default=0, help="REKOGNITION_TPS của Processing Lambda (0 = không giới hạn)")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="độ trễ mỗi lời gọi get/put S3 (giây)")
+    parser.add_argument("--cache", action="store_true", help="bật cache kết quả theo nội dung ảnh")
+    parser.add_argument("--detector", default="rekognition", help="DETECTION_BACKEND của Processing Lambda (rekognition/local/cascade)")
+    parser.add_argument("--blank-images", type=int, default=0, help="số ảnh một màu trong --distinct-images")
+    parser.add_argument("--no-render", action="store_true", help="chỉ lấy overlay JSON, không vẽ ảnh")
+    parser.add_argument("--output-format", default=None, help="định dạng ảnh đã vẽ (JPEG/WEBP/PNG/AVIF)")
+    parser.add_argument("--thumbnails", type=int, nargs="*", default=[], help="cạnh dài của các thumbnail")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="tỷ lệ message SQS được giao lại (at-least-once)")
+    parser.add_argument("--timeout", type=float, default=300, help="thời gian chờ tối đa (giây)")
+    parser.add_argument("--histogram", action="store_true", help="in histogram của từng bước")
+    parser.add_argument("--json", type=Path, default=None, help="ghi kết quả ra file JSON để so sánh giữa các lần chạy")
+    parser.add_argument("--verbose", action="store_true", help="giữ log của các handler")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(
+        AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-1"),
+        BUCKET_NAME="bench-bucket", TABLE_NAME="jobs", QUEUE_URL="https://sqs.local/bench",
+        BATCH_WORKERS=str(args.batch_workers), REKOGNITION_TPS=str(args.rekognition_tps),
+        DETECTION_BACKEND=args.detector,
+    )
+    os.environ.pop("BULK_QUEUE_URL", None)
+    if not args.single_queue:
+        os.environ["BULK_QUEUE_URL"] = "https://sqs.local/bench-bulk"
+    # Thời gian từng bước của Processing Lambda lấy từ bản ghi metrics (METRICS_ENABLED=false thì chỉ còn upload/status)
+    os.environ.setdefault("METRICS_ENABLED", "true")
+    for name in ("CACHE_TABLE_NAME", "NOTIFY_TOPIC_ARN", "CALLBACK_SECRET"):
+        os.environ.pop(name, None)
+    if args.cache:
+        os.environ["CACHE_TABLE_NAME"] = "cache"
+
+    import aws_fakes
+    fakes = aws_fakes.install(
+        cache_table="cache" if args.cache else None, rekognition_latency=args.rekognition_latency,
+        rekognition_jitter=args.rekognition_jitter, s3_latency=args.s3_latency, duplicate_rate=args.duplicate_rate,
+        rekognition_quota=args.rekognition_quota,
+    )
+    import lambda_upload_handler
+    import lambda_rekognition_processor
+    import lambda_get_job_status
+    import lanes
+    import metrics
+
+    samples = {stage: [] for stage in STAGES}
+    samples_lock = threading.Lock()
+
+    def record(stage, seconds):
+        with samples_lock:
+            samples[stage].append(seconds)
+
+    # Lấy thời gian từng bước từ bản ghi metrics mà Processing Lambda emit cho mỗi job
+    duplicates = []
+
+    def capture_metrics(metrics_record):
+        if metrics_record["Service"] != "processor":
+            return
+        if metrics_record.get("duplicates"):
+            duplicates.append(metrics_record["job_id"])
+            return
+        for key, stage in PROCESSOR_STAGES.items():
+            if key in metrics_record:
+                record(stage, metrics_record[key] / 1000)
+
+    metrics.listeners.append(capture_metrics)
+
+    print(f"🖼️  Tạo {args.distinct_images} ảnh {args.width}x{args.height}...")
+    images = make_images(args.distinct_images, args.width, args.height, args.seed, args.blank_images)
+    options = {"max_labels": 10, "min_confidence": 40}
+    if args.no_render:
+        options["render"] = False
+    if args.output_format or args.thumbnails:
+        options["output"] = {"format": args.output_format or "auto", "thumbnails": args.thumbnails}
+
+    stop = threading.Event()
+    failed_records = []
+
+    sqs = fakes["sqs"]
+    def consume(queue_url):
+        """Giả lập event source mapping của một hàng đợi: lấy lô message, gọi Processing Lambda và đếm các record bị trả lại"""
+        while not stop.is_set():
+            batch = sqs.receive_batch(args.batch_size, wait=0, queue_url=queue_url)
+            if not batch:
+                sqs.wait(0.05)
+                continue
+            event = {"Records": batch}
+            response = lambda_rekognition_processor.lambda_handler(event, None)
+            failed = {failure["itemIdentifier"] for failure in response["batchItemFailures"]}
+            failed_records.extend(failed)
+
+    def upload(index, priority="interactive"):
+        body = json.dumps({"image": images[index % len(images)], **options, "priority": priority})
+        start = time.perf_counter()
+        response = lambda_upload_handler.lambda_handler({"body": body}, None)
+        record("upload", time.perf_counter() - start)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"upload failed: {response['body']}")
+        return json.loads(response["body"])["job_id"], start
+
+    def check_status(job_id):
+        start = time.perf_counter()
+        response = lambda_get_job_status.lambda_handler({"queryStringParameters": {"job_id": job_id}}, None)
+        record("status", time.perf_counter() - start)
+        return json.loads(response["body"])["status"]
+
+    jobs_table = fakes["dynamodb"].Table("jobs")
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    if args.bulk_jobs:
+        print(f"📦 {args.bulk_jobs} job bulk upload trước, {'chung một hàng đợi' if args.single_queue else 'hàng đợi riêng'}")
+    print(f"🚀 {args.jobs} job, {args.concurrency} upload đồng thời, {args.consumers} consumer x lô {args.batch_size} x {args.batch_workers} worker")
+
+    with output:
+        # Như khi triển khai: mỗi hàng đợi có trigger riêng, trigger bulk bị giới hạn --bulk-consumers lần gọi đồng thời
+        queues = [lanes.queue_url("interactive")] * args.consumers
+        if not args.single_queue:
+            queues += [lanes.queue_url("bulk")] * args.bulk_consumers
+        consumers = [threading.Thread(target=consume, args=(queue_url,), daemon=True) for queue_url in queues]
+        for consumer in consumers:
+            consumer.start()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            # Backfill đã nằm sẵn trong hàng đợi khi các job interactive tới
+            bulk = dict(executor.map(upload, range(args.bulk_jobs), ["bulk"] * args.bulk_jobs))
+            submitted = {**bulk, **dict(executor.map(upload, range(args.jobs)))}
+
+        # Chờ tới khi mọi job kết thúc
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            finished = [job_id for job_id in submitted if {"COMPLETED", "FAILED"} & jobs_table.status_times.get((job_id,), {}).keys()]
+            if len(finished) == len(submitted):
+                break
+            time.sleep(0.05)
+        stop.set()
+        for consumer in consumers:
+            consumer.join()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            statuses = list(executor.map(check_status, submitted))
+
+    completed_at = {}
+    for job_id, start in submitted.items():
+        times = jobs_table.status_times.get((job_id,), {})
+        if "COMPLETED" in times:
+            completed_at[job_id] = times["COMPLETED"]
+            record("end_to_end_bulk" if job_id in bulk else "end_to_end", times["COMPLETED"] - start)
+    elapsed = (max(completed_at.values()) if completed_at else time.perf_counter()) - started
+
+    print(f"\n{'stage':<15}{'count':>7}{'mean':>10}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+    report = {}
+    for stage in STAGES:
+        if not samples[stage]:
+            continue
+        stats = report[stage] = percentiles(samples[stage])
+        print(f"{stage:<15}{stats['count']:>7}" + "".join(f"{stats[key]:>10.1f}" for key in ("mean", "p50", "p90", "p95", "p99", "max")))
+        if args.histogram:
+            print_histogram(samples[stage])
+
+    summary = {
+        "jobs": args.jobs,
+        "bulk_jobs": args.bulk_jobs,
+        "completed": statuses.count("COMPLETED"),
+        "failed": statuses.count("FAILED"),
+        "unfinished": len(statuses) - statuses.count("COMPLETED") - statuses.count("FAILED"),
+        "retried_records": len(failed_records),
+        "redelivered": fakes["sqs"].duplicates,
+        "duplicates_skipped": len(duplicates),
+        "rekognition_calls": fakes["rekognition"].calls,
+        "rekognition_throttled": fakes["rekognition"].throttled,
+        "detector": dict(getattr(lambda_rekognition_processor.detector, "stats", {})),
+        "elapsed_s": elapsed,
+        "jobs_per_s": len(completed_at) / elapsed if elapsed else 0.0,
+    }
+    print(f"\n✅ {summary['completed']}/{len(submitted)} COMPLETED, {summary['failed']} FAILED, {summary['unfinished']} chưa xong, "
+          f"{summary['retried_records']} record trả lại SQS, {summary['rekognition_calls']} lời gọi DetectLabels")
+    if summary["redelivered"]:
+        print(f"🔁 {summary['redelivered']} message giao lại, {summary['duplicates_skipped']} lần bị bỏ qua vì trùng")
+    if summary["detector"]:
+        print(f"🪜 Cascade: {lambda_rekognition_processor.detector.avoided()} ảnh không gọi Rekognition "
+              f"({', '.join(f'{name}={count}' for name, count in sorted(summary['detector'].items()))})")
+    if summary["rekognition_throttled"]:
+        print(f"🚦 {summary['rekognition_throttled']} lời gọi DetectLabels bị throttle")
+    print(f"⏱️  {summary['jobs_per_s']:.1f} job/s ({elapsed:.2f} s)")
+
+    if args.json:
+        args.json.write_text(json.dumps({"args": {key: str(value) for key, value in vars(args).items()},
+                                         "summary": summary, "stages": report}, indent=2, default=float))
+        print(f"📝 Kết quả: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""So sánh recall và độ trễ giữa gọi DetectLabels một lần cho cả ảnh và chế độ tile, dùng Rekognition giả lập"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+import tiling
+from ratelimit import RateLimiter
+
+class StubRekognition:
+    """
+    Rekognition giả lập: đối tượng quá nhỏ so với khung ảnh gửi lên bị bỏ sót,
+    mỗi lời gọi trả về tối đa `max_instances` instance (ưu tiên đối tượng lớn).
+    """
+
+    def __init__(self, objects, min_fraction=0.02, max_instances=25, latency=0.15):
+        self.objects = objects
+        self.min_fraction = min_fraction
+        self.max_instances = max_instances
+        self.latency = latency
+        self.calls = 0
+
+    def detect(self, tile, box):
+        self.calls += 1
+        time.sleep(self.latency)
+
+        left, top, right, bottom = box
+        tile_width, tile_height = right - left, bottom - top
+        visible = []
+        for obj_left, obj_top, obj_right, obj_bottom in self.objects:
+            clip_left, clip_top = max(left, obj_left), max(top, obj_top)
+            clip_right, clip_bottom = min(right, obj_right), min(bottom, obj_bottom)
+            if clip_right <= clip_left or clip_bottom <= clip_top:
+                continue
+            area = (obj_right - obj_left) * (obj_bottom - obj_top)
+            if (clip_right - clip_left) * (clip_bottom - clip_top) < 0.5 * area:
+                continue
+            size = max(clip_right - clip_left, clip_bottom - clip_top) / max(tile_width, tile_height)
+            if size < self.min_fraction:
+                continue
+            visible.append((size, clip_left, clip_top, clip_right, clip_bottom))
+
+        visible.sort(reverse=True)
+        instances = [
+            {
+                "BoundingBox": {
+                    "Left": (clip_left - left) / tile_width,
+                    "Top": (clip_top - top) / tile_height,
+                    "Width": (clip_right - clip_left) / tile_width,
+                    "Height": (clip_bottom - clip_top) / tile_height,
+                },
+                "Confidence": min(99.0, 60 + 400 * size),
+            }
+            for size, clip_left, clip_top, clip_right, clip_bottom in visible[:self.max_instances]
+        ]
+        if not instances:
+            return []
+        return [{"Name": "Box", "Confidence": max(instance["Confidence"] for instance in instances), "Instances": instances}]
+
+def make_scene(width, height, small, large, seed):
+    """Sinh toạ độ pixel của các đối tượng nhỏ và lớn không chồng nhau"""
+    rng = random.Random(seed)
+    objects = []
+    while len(objects) < small + large:
+        side = rng.randint(25, 60) if len(objects) < small else rng.randint(400, 900)
+        left, top = rng.randint(0, width - side), rng.randint(0, height - side)
+        candidate = (left, top, left + side, top + side)
+        if all(candidate[2] <= o[0] or o[2] <= candidate[0] or candidate[3] <= o[1] or o[3] <= candidate[1] for o in objects):
+            objects.append(candidate)
+    return objects
+
+def iou(a, b):
+    inter_width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_width * inter_height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+def evaluate(labels, objects, width, height):
+    """Recall/precision với ngưỡng IoU 0.5 (ghép tham lam)"""
+    detections = [
+        (bbox["Left"] * width, bbox["Top"] * height, (bbox["Left"] + bbox["Width"]) * width, (bbox["Top"] + bbox["Height"]) * height)
+        for label in labels for bbox in (instance["BoundingBox"] for instance in label["Instances"])
+    ]
+    unmatched = list(objects)
+    matched = 0
+    for detection in detections:
+        best = max(unmatched, key=lambda obj: iou(obj, detection), default=None)
+        if best and iou(best, detection) >= 0.5:
+            unmatched.remove(best)
+            matched += 1
+    return matched / len(objects), (matched / len(detections) if detections else 0.0), len(detections)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--small", type=int, default=150, help="số đối tượng nhỏ")
+    parser.add_argument("--large", type=int, default=5, help="số đối tượng lớn")
+    parser.add_argument("--tile-size", type=int, default=tiling.TILE_SIZE)
+    parser.add_argument("--overlap", type=float, default=tiling.TILE_OVERLAP)
+    parser.add_argument("--concurrency", type=int, default=tiling.TILE_CONCURRENCY)
+    parser.add_argument("--tps", type=float, default=0, help="giới hạn lời gọi/giây (0 = không giới hạn)")
+    parser.add_argument("--latency", type=float, default=0.15, help="độ trễ giả lập mỗi lời gọi (giây)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    objects = make_scene(args.width, args.height, args.small, args.large, args.seed)
+    image = Image.new("RGB", (args.width, args.height))
+    full_box = (0, 0, args.width, args.height)
+
+    print(f"{'mode':<10}{'calls':>7}{'latency (s)':>13}{'recall':>9}{'precision':>11}{'boxes':>7}")
+
+    stub = StubRekognition(objects, latency=args.latency)
+    start = time.perf_counter()
+    labels = tiling.remap_labels(stub.detect(image, full_box), full_box, args.width, args.height)
+    elapsed = time.perf_counter() - start
+    recall, precision, count = evaluate(labels, objects, args.width, args.height)
+    print(f"{'single':<10}{stub.calls:>7}{elapsed:>13.2f}{recall:>9.2%}{precision:>11.2%}{count:>7}")
+
+    stub = StubRekognition(objects, latency=args.latency)
+    limiter = RateLimiter(args.tps) if args.tps else None
+    start = time.perf_counter()
+    labels = tiling.detect_tiled(
+        image, stub.detect, max_labels=10, tile_size=args.tile_size, overlap=args.overlap,
+        concurrency=args.concurrency, rate_limiter=limiter,
+    )
+    elapsed = time.perf_counter() - start
+    recall, precision, count = evaluate(labels, objects, args.width, args.height)
+    print(f"{'tiled':<10}{stub.calls:>7}{elapsed:>13.2f}{recall:>9.2%}{precision:>11.2%}{count:>7}")
+
+if __name__ == "__main__":
+    main()
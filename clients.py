@@ -0,0 +1,129 @@
+import os
+import threading
+
+# Mỗi client/resource chỉ được tạo một lần trong mỗi process (container Lambda), khi được dùng lần đầu.
+# Client tạo thẳng từ botocore (không import boto3): package boto3 kéo theo s3transfer, thêm ~150 ms cold start.
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+_session = None
+_config = None
+_http_session = None
+
+def _load_settings():
+    """Đọc settings.get_settings(); trên Lambda không có pydantic-settings thì dùng biến môi trường"""
+    try:
+        from settings import get_settings
+    except ImportError:
+        return None
+    return get_settings()
+
+def _setting(settings, name, default):
+    if settings is not None:
+        return getattr(settings, name)
+    return os.environ.get(name.upper(), default)
+
+def _get_session_and_config():
+    """Tạo botocore Session và Config dùng chung (gọi khi đang giữ _lock)"""
+    global _session, _config
+    if _session is None:
+        import botocore.session
+        from botocore.config import Config
+
+        settings = _load_settings()
+        session = botocore.session.get_session()
+        region = _setting(settings, 'aws_region', None) or os.environ.get('AWS_DEFAULT_REGION')
+        if region:
+            session.set_config_variable('region', region)
+        # Chỉ đặt credential khi có cấu hình, nếu không botocore tự dùng credential chain (execution role)
+        access_key = _setting(settings, 'aws_access_key_id', None)
+        if access_key:
+            session.set_credentials(
+                access_key,
+                _setting(settings, 'aws_secret_access_key', None),
+                _setting(settings, 'aws_session_token', None) or None,
+            )
+        _session = session
+        _config = Config(
+            max_pool_connections=int(_setting(settings, 'aws_max_pool_connections', 50)),
+            connect_timeout=float(_setting(settings, 'aws_connect_timeout', 5)),
+            read_timeout=float(_setting(settings, 'aws_read_timeout', 30)),
+            retries={
+                'max_attempts': int(_setting(settings, 'aws_max_attempts', 5)),
+                'mode': _setting(settings, 'aws_retry_mode', 'standard'),
+            },
+            tcp_keepalive=True,
+        )
+    return _session, _config
+
+def get_client(service_name, max_attempts=None):
+    """
+    Client botocore dùng chung cho cả process (thread-safe). `max_attempts` thay số lần thử của botocore
+    (1 = không tự retry, để nơi gọi tự retry và nhận biết throttling); mỗi giá trị là một client riêng.
+    """
+    key = service_name if max_attempts is None else f'{service_name}:{max_attempts}'
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                session, config = _get_session_and_config()
+                if max_attempts is not None:
+                    from botocore.config import Config
+
+                    config = config.merge(Config(retries={'total_max_attempts': max_attempts, 'mode': config.retries['mode']}))
+                client = session.create_client(service_name, config=config)
+                _clients[key] = client
+    return client
+
+def get_resource(service_name):
+    """
+    Resource dùng chung cho cả process. Chỉ có 'dynamodb': dynamodb_table.DynamoDB trên client botocore,
+    cùng cách dùng với resource của boto3 (Table(), batch_writer(), batch_get_item()) nhưng không import boto3.
+    """
+    resource = _resources.get(service_name)
+    if resource is None:
+        if service_name != 'dynamodb':
+            raise ValueError(f'Unsupported resource: {service_name}')
+        import dynamodb_table
+
+        client = get_client(service_name)
+        with _lock:
+            resource = _resources.setdefault(service_name, dynamodb_table.DynamoDB(client))
+    return resource
+
+class LazyClient:
+    """Đại diện cho client/resource, chỉ thật sự khởi tạo ở lần gọi đầu tiên"""
+
+    def __init__(self, service_name, factory=get_client, **kwargs):
+        self._service_name = service_name
+        self._factory = factory
+        self._kwargs = kwargs
+
+    def __getattr__(self, name):
+        return getattr(self._factory(self._service_name, **self._kwargs), name)
+
+def lazy_client(service_name, **kwargs):
+    """Client tạo khi dùng lần đầu, để handler không trả giá cho client không bao giờ dùng tới"""
+    return LazyClient(service_name, **kwargs)
+
+def lazy_resource(service_name):
+    """Resource tạo khi dùng lần đầu"""
+    return LazyClient(service_name, get_resource)
+
+def get_http_session():
+    """requests.Session dùng chung (giữ kết nối HTTP tới API Gateway/S3)"""
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                pool_size = int(_setting(_load_settings(), 'aws_max_pool_connections', 50))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
@@ -0,0 +1,59 @@
+"""
+Phân tích video/zip/ảnh động trên máy local giống job chuỗi khung hình (xem sequence.py): lấy mẫu frame, bỏ frame
+gần giống nhau, phát hiện nhãn trên các frame còn lại và in tóm tắt nhãn theo thời gian.
+
+    python detect_sequence.py camera.mp4 --fps 2 --threshold 0.05 --dry-run    # số frame sẽ phải gọi DetectLabels
+"""
+import argparse
+import json
+import mimetypes
+import sys
+from pathlib import Path
+import detection
+import preprocessing
+import sequence
+from main import rekognition_backend
+
+# Nhãn dạng compact giống job trên Lambda (result_cache nằm cùng các handler trong lambda/)
+sys.path.append(str(Path(__file__).resolve().parent / 'lambda'))
+import result_cache
+
+def main():
+    parser = argparse.ArgumentParser(description='Lấy mẫu và bỏ frame gần giống nhau của video/zip/ảnh động, tuỳ chọn phát hiện nhãn')
+    parser.add_argument('path')
+    parser.add_argument('--fps', type=float, default=sequence.SAMPLE_FPS, help='số frame lấy mẫu mỗi giây')
+    parser.add_argument('--threshold', type=float, default=sequence.DIFF_THRESHOLD, help='khoảng cách hash tối thiểu (0-1) để phân tích frame')
+    parser.add_argument('--source-fps', type=float, default=sequence.SOURCE_FPS, help='tốc độ khung hình của các frame trong file zip')
+    parser.add_argument('--max-frames', type=int, default=sequence.MAX_FRAMES)
+    parser.add_argument('--dry-run', action='store_true', help='chỉ đếm frame sẽ được phân tích, không gọi DetectLabels')
+    parser.add_argument('--detector', default='rekognition', help='rekognition/local/cascade (xem detection.py)')
+    parser.add_argument('--min-confidence', type=float, default=40)
+    parser.add_argument('--max-labels', type=int, default=10)
+    parser.add_argument('--output', default=None, help='ghi track ra file JSON')
+    args = parser.parse_args()
+
+    options = sequence.SequenceOptions.from_dict({'sample_fps': args.fps, 'diff_threshold': args.threshold, 'source_fps': args.source_fps})
+    with open(args.path, 'rb') as source:
+        content_type = sequence.sniff_content_type(source.read(64)) or mimetypes.guess_type(args.path)[0]
+
+    if args.dry_run:
+        detect = lambda image: []
+    else:
+        backend = detection.create_backend(args.detector, rekognition_backend())
+
+        def detect(image):
+            data = preprocessing.prepare_image(image).data
+            image_input = detection.DetectionImage(lambda: {'Bytes': data}, lambda: image)
+            return result_cache.compact_labels(backend.detect(image_input, args.max_labels, args.min_confidence).labels)
+
+    track = sequence.analyze(sequence.frames(args.path, content_type, options, args.max_frames), detect, options.diff_threshold)
+    print(f"{track.sampled} frame lấy mẫu, {track.analyzed} frame phân tích, {track.skipped} frame bỏ qua "
+          f"({track.duration:.1f} s)")
+    for entry in track.summary():
+        print(f"  {entry['name']:<24} {entry['confidence']:6.2f}  {entry['first_seen']:.1f}-{entry['last_seen']:.1f} s  {entry['frames']} frame")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(track.to_dict(), output, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
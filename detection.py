@@ -0,0 +1,237 @@
+"""
+Backend phát hiện nhãn dùng chung cho main.py/batch_detect.py và Processing Lambda:
+
+- RekognitionBackend: DetectLabels (mặc định).
+- LocalBackend: chạy trên CPU, không gọi API. Ảnh gần như một màu (ảnh đen, che ống kính...) trả về không nhãn;
+  ảnh còn lại qua model phân loại ONNX (OnnxModel, nên dùng bản lượng tử hoá int8) nếu có.
+- CascadeBackend: hỏi LocalBackend trước, chỉ gọi Rekognition khi câu trả lời local chưa đủ chắc chắn.
+
+Mọi backend trả về nhãn cùng dạng response['Labels'] của DetectLabels (Name, Confidence, Instances, Parents)
+nên phần lưu cache, nén nhãn và vẽ box phía sau không đổi. Nhãn của model phân loại không có Instances (không có box).
+"""
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from io import BytesIO
+from typing import TYPE_CHECKING
+import metrics
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# rekognition | local | cascade
+DETECTION_BACKEND = os.environ.get('DETECTION_BACKEND', 'rekognition')
+# Model ONNX phân loại ảnh và file tên nhãn (mỗi dòng một nhãn, theo thứ tự output của model)
+LOCAL_MODEL_PATH = os.environ.get('LOCAL_MODEL_PATH')
+LOCAL_MODEL_LABELS = os.environ.get('LOCAL_MODEL_LABELS')
+LOCAL_MODEL_THREADS = int(os.environ.get('LOCAL_MODEL_THREADS', '1'))
+# Câu trả lời local được dùng khi confidence (0-100) của nó từ ngưỡng này trở lên
+CASCADE_MIN_CONFIDENCE = float(os.environ.get('CASCADE_MIN_CONFIDENCE', '90'))
+# Độ lệch chuẩn độ sáng (0-255) tối đa để coi ảnh là một màu (0 = tắt)
+BLANK_MAX_STDDEV = float(os.environ.get('BLANK_MAX_STDDEV', '2.0'))
+
+BACKENDS = ('rekognition', 'local', 'cascade')
+
+# Chuẩn hoá đầu vào của phần lớn model phân loại huấn luyện trên ImageNet
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+@dataclass
+class Detection:
+    labels: list[dict]
+    # Mức chắc chắn của cả câu trả lời (0-100), CascadeBackend so với ngưỡng
+    confidence: float
+    # Nơi trả lời: rekognition, blank hoặc local
+    source: str
+    attempts: int = 0
+
+class DetectionImage:
+    """
+    Ảnh đầu vào của backend. Rekognition nhận tham số Image (S3Object hoặc bytes), model local cần ảnh đã decode;
+    mỗi dạng chỉ được tạo khi có backend cần tới (job chỉ gọi Rekognition không phải tải ảnh về).
+    """
+
+    def __init__(self, request, pixels):
+        self._request = request
+        self._pixels = pixels
+        self._cache = {}
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DetectionImage':
+        def decode():
+            from PIL import Image
+
+            image = Image.open(BytesIO(data))
+            image.load()
+            return image
+
+        return cls(lambda: {'Bytes': data}, decode)
+
+    def request(self) -> dict:
+        """Tham số Image của DetectLabels"""
+        if 'request' not in self._cache:
+            self._cache['request'] = self._request()
+        return self._cache['request']
+
+    def pixels(self) -> 'Image.Image':
+        if 'pixels' not in self._cache:
+            self._cache['pixels'] = self._pixels()
+        return self._cache['pixels']
+
+class RekognitionBackend:
+    """DetectLabels qua `client()` (hàm trả về client, để test/benchmark thay client sau khi import)"""
+
+    def __init__(self, client, retry=None):
+        self.client = client
+        self.retry = retry
+
+    def detect(self, image: DetectionImage, max_labels: int, min_confidence: float) -> Detection:
+        request = {'Image': image.request(), 'MaxLabels': max_labels, 'MinConfidence': min_confidence}
+        if self.retry:
+            response, attempts = self.retry.call(self.client().detect_labels, stage='detect', **request)
+        else:
+            with metrics.timer('detect'):
+                response = self.client().detect_labels(**request)
+            attempts = 1
+        return Detection(response['Labels'], 100.0, 'rekognition', attempts)
+
+def is_blank(image: 'Image.Image', max_stddev: float = BLANK_MAX_STDDEV) -> bool:
+    """Ảnh gần như một màu: độ lệch chuẩn độ sáng trên bản thu nhỏ không quá max_stddev"""
+    from PIL import ImageStat
+
+    gray = image.convert('L')
+    return ImageStat.Stat(gray.reduce(max(1, min(gray.size) // 64))).stddev[0] <= max_stddev
+
+class OnnxModel:
+    """
+    Model phân loại ảnh ONNX chạy trên CPU bằng onnxruntime (import và nạp model ở lần dùng đầu tiên).
+    Đầu vào float32 NCHW (hoặc NHWC) chuẩn hoá theo ImageNet; output [1, số lớp] là xác suất hoặc logit.
+    """
+
+    def __init__(self, model_path: str, labels_path: str | None = None, threads: int = LOCAL_MODEL_THREADS,
+                 mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.threads = threads
+        self.mean = mean
+        self.std = std
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = onnxruntime.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+        if self.labels_path:
+            with open(self.labels_path, encoding='utf-8') as labels_file:
+                self.labels = [line.strip() for line in labels_file if line.strip()]
+        else:
+            self.labels = None
+        model_input = session.get_inputs()[0]
+        shape = [dim if isinstance(dim, int) else None for dim in model_input.shape]
+        self.channels_last = shape[-1] == 3
+        height, width = shape[1:3] if self.channels_last else shape[2:4]
+        self.input_name, self.input_size = model_input.name, (width or 224, height or 224)
+        return session
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._load()
+            return self._session
+
+    def predict(self, image: 'Image.Image') -> list[tuple[str, float]]:
+        """(tên nhãn, xác suất 0-1) của mọi lớp, xác suất giảm dần"""
+        import numpy as np
+        from PIL import Image
+
+        session = self.session
+        pixels = image.convert('RGB').resize(self.input_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        tensor = (np.asarray(pixels, dtype=np.float32) / 255 - np.array(self.mean, np.float32)) / np.array(self.std, np.float32)
+        tensor = tensor[None] if self.channels_last else tensor.transpose(2, 0, 1)[None]
+        with metrics.timer('local_model'):
+            scores = session.run(None, {self.input_name: tensor})[0].reshape(-1).astype(np.float64)
+        if scores.min() < 0 or abs(scores.sum() - 1) > 1e-3:
+            scores = np.exp(scores - scores.max())
+            scores /= scores.sum()
+        order = np.argsort(-scores)
+        names = self.labels or [str(index) for index in range(len(scores))]
+        return [(names[index], float(scores[index])) for index in order]
+
+class LocalBackend:
+    """Trả lời trên CPU: ảnh một màu thì không có nhãn, ảnh khác hỏi model (không có model thì chưa chắc chắn)"""
+
+    def __init__(self, model: OnnxModel | None = None, blank_max_stddev: float = BLANK_MAX_STDDEV):
+        self.model = model
+        self.blank_max_stddev = blank_max_stddev
+
+    def detect(self, image: DetectionImage, max_labels: int, min_confidence: float) -> Detection:
+        pixels = image.pixels()
+        if self.blank_max_stddev and is_blank(pixels, self.blank_max_stddev):
+            return Detection([], 100.0, 'blank')
+        if self.model is None:
+            return Detection([], 0.0, 'local')
+        predictions = self.model.predict(pixels)
+        labels = [
+            {'Name': name, 'Confidence': probability * 100, 'Instances': [], 'Parents': []}
+            for name, probability in predictions[:max_labels] if probability * 100 >= min_confidence
+        ]
+        return Detection(labels, predictions[0][1] * 100 if predictions else 0.0, 'local')
+
+class CascadeBackend:
+    """
+    LocalBackend trả lời khi confidence >= min_confidence, còn lại gọi `remote` (Rekognition). Lỗi của model local
+    không làm hỏng job: ảnh được chuyển sang remote. `stats` đếm số ảnh theo nơi trả lời trong process.
+    """
+
+    def __init__(self, local: LocalBackend, remote: RekognitionBackend, min_confidence: float = CASCADE_MIN_CONFIDENCE):
+        self.local = local
+        self.remote = remote
+        self.min_confidence = min_confidence
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _record(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def detect(self, image: DetectionImage, max_labels: int, min_confidence: float) -> Detection:
+        try:
+            with metrics.timer('local_detect'):
+                detection = self.local.detect(image, max_labels, min_confidence)
+        except Exception as e:
+            print(f"Local detector failed, falling back to Rekognition: {e}")
+            metrics.count('local_detect_errors')
+            self._record('local_errors')
+            detection = None
+
+        avoided = detection is not None and detection.confidence >= self.min_confidence
+        metrics.count('rekognition_avoided', 1 if avoided else 0)
+        if avoided:
+            self._record(detection.source)
+            return detection
+        self._record('rekognition')
+        return self.remote.detect(image, max_labels, min_confidence)
+
+    def avoided(self) -> int:
+        """Số ảnh không phải gọi Rekognition"""
+        return sum(count for name, count in self.stats.items() if name not in ('rekognition', 'local_errors'))
+
+def create_backend(kind: str, remote: RekognitionBackend, model_path: str | None = LOCAL_MODEL_PATH,
+                   labels_path: str | None = LOCAL_MODEL_LABELS, min_confidence: float = CASCADE_MIN_CONFIDENCE,
+                   blank_max_stddev: float = BLANK_MAX_STDDEV):
+    """Backend theo tên (DETECTION_BACKEND), ValueError nếu tên không hợp lệ hoặc chế độ local thiếu model"""
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown detection backend: {kind} (allowed: {', '.join(BACKENDS)})")
+    if kind == 'rekognition':
+        return remote
+    model = OnnxModel(model_path, labels_path) if model_path else None
+    if kind == 'local' and model is None:
+        raise ValueError('Detection backend "local" requires LOCAL_MODEL_PATH')
+    local = LocalBackend(model, blank_max_stddev)
+    return local if kind == 'local' else CascadeBackend(local, remote, min_confidence)
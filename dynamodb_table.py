@@ -0,0 +1,198 @@
+"""
+Lớp Table/batch_writer gọn trên client DynamoDB của botocore, thay cho `boto3.resource('dynamodb')`.
+Resource của boto3 kéo theo cả package boto3 (boto3 -> s3transfer, ~150 ms) và lớp resource (~30 ms) lúc cold start;
+ở đây chỉ chuyển đổi giá trị Python <-> AttributeValue cho đúng các tham số mà handler dùng.
+
+Cách dùng giữ nguyên như resource: `clients.get_resource('dynamodb').Table(name).get_item(Key=...)`.
+Giá trị số đọc ra là Decimal, float bị từ chối (giống boto3). Biểu thức (KeyConditionExpression,
+ConditionExpression...) phải là chuỗi, không dùng boto3.dynamodb.conditions.
+"""
+import random
+import time
+from collections.abc import Mapping, Set
+from decimal import Decimal
+
+# Tham số request/response chứa một item (map tên attribute -> giá trị)
+ITEM_PARAMS = ('Key', 'Item', 'ExclusiveStartKey', 'ExpressionAttributeValues')
+ITEM_RESULTS = ('Item', 'Attributes', 'LastEvaluatedKey')
+
+# batch_write_item nhận tối đa 25 request mỗi lần gọi
+BATCH_WRITE_SIZE = 25
+# Gửi lại UnprocessedItems: exponential backoff với full jitter (như botocore), bỏ cuộc sau MAX_WRITE_RETRIES lần liên tiếp
+MAX_WRITE_RETRIES = 8
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 5.0
+
+class UnprocessedItemsError(Exception):
+    """batch_write_item vẫn trả UnprocessedItems sau số lần gửi lại tối đa; `items` là các request chưa ghi"""
+
+    def __init__(self, table_name, items, retries):
+        super().__init__(f'{len(items)} writes to {table_name} still unprocessed after {retries} retries')
+        self.items = items
+
+def serialize(value) -> dict:
+    """Giá trị Python thành AttributeValue"""
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, (int, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, Mapping):
+        return {'M': serialize_item(value)}
+    if isinstance(value, Set) and value:
+        if all(isinstance(member, str) for member in value):
+            return {'SS': list(value)}
+        if all(isinstance(member, (int, Decimal)) and not isinstance(member, bool) for member in value):
+            return {'NS': [str(member) for member in value]}
+        if all(isinstance(member, (bytes, bytearray)) for member in value):
+            return {'BS': [bytes(member) for member in value]}
+    if isinstance(value, (list, tuple)):
+        return {'L': [serialize(member) for member in value]}
+    raise TypeError(f'Unsupported type "{type(value)}" for value "{value}"')
+
+def deserialize(attribute: dict):
+    """AttributeValue thành giá trị Python (số -> Decimal, tập hợp -> set)"""
+    (kind, value), = attribute.items()
+    if kind in ('S', 'B', 'BOOL'):
+        return value
+    if kind == 'N':
+        return Decimal(value)
+    if kind == 'NULL':
+        return None
+    if kind == 'M':
+        return deserialize_item(value)
+    if kind == 'L':
+        return [deserialize(member) for member in value]
+    if kind == 'NS':
+        return {Decimal(member) for member in value}
+    if kind in ('SS', 'BS'):
+        return set(value)
+    raise TypeError(f'Unknown DynamoDB type "{kind}"')
+
+def serialize_item(item: Mapping) -> dict:
+    return {name: serialize(value) for name, value in item.items()}
+
+def deserialize_item(item: dict) -> dict:
+    return {name: deserialize(value) for name, value in item.items()}
+
+def _request(params: dict) -> dict:
+    return {key: serialize_item(value) if key in ITEM_PARAMS else value for key, value in params.items()}
+
+def _response(response: dict) -> dict:
+    for key in ITEM_RESULTS:
+        if key in response:
+            response[key] = deserialize_item(response[key])
+    if 'Items' in response:
+        response['Items'] = [deserialize_item(item) for item in response['Items']]
+    return response
+
+class DynamoDB:
+    """Thay cho ServiceResource `dynamodb` của boto3: Table() và batch_get_item()"""
+
+    def __init__(self, client):
+        self.meta_client = client
+
+    def Table(self, name):
+        return Table(self.meta_client, name)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        request = {
+            name: {**table_request, 'Keys': [serialize_item(key) for key in table_request['Keys']]}
+            for name, table_request in RequestItems.items()
+        }
+        response = self.meta_client.batch_get_item(RequestItems=request, **kwargs)
+        response['Responses'] = {
+            name: [deserialize_item(item) for item in items] for name, items in response.get('Responses', {}).items()
+        }
+        # Key chưa xử lý trả về ở dạng gửi lại được thẳng cho batch_get_item
+        response['UnprocessedKeys'] = {
+            name: {**table_request, 'Keys': [deserialize_item(key) for key in table_request['Keys']]}
+            for name, table_request in response.get('UnprocessedKeys', {}).items()
+        }
+        return response
+
+class Table:
+    """Các thao tác trên một bảng, cùng tham số với boto3 `Table` (trừ TableName)"""
+
+    def __init__(self, client, name):
+        self.meta_client = client
+        self.name = name
+
+    def _call(self, operation, kwargs):
+        return _response(getattr(self.meta_client, operation)(TableName=self.name, **_request(kwargs)))
+
+    def get_item(self, **kwargs):
+        return self._call('get_item', kwargs)
+
+    def put_item(self, **kwargs):
+        return self._call('put_item', kwargs)
+
+    def update_item(self, **kwargs):
+        return self._call('update_item', kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._call('delete_item', kwargs)
+
+    def query(self, **kwargs):
+        return self._call('query', kwargs)
+
+    def scan(self, **kwargs):
+        return self._call('scan', kwargs)
+
+    def batch_writer(self):
+        return BatchWriter(self.meta_client, self.name)
+
+class BatchWriter:
+    """
+    Gom put_item/delete_item thành batch_write_item (25 request/lần) và gửi lại UnprocessedItems,
+    giống batch_writer của boto3. Dùng với `with`: phần còn lại được gửi khi thoát khối.
+    Lần gọi trả UnprocessedItems (bị throttle) được chờ backoff trước lần gửi kế tiếp; sau `max_retries` lần liên tiếp
+    vẫn còn UnprocessedItems thì UnprocessedItemsError.
+    """
+
+    def __init__(self, client, table_name, flush_amount=BATCH_WRITE_SIZE, max_retries=MAX_WRITE_RETRIES):
+        self._client = client
+        self._table_name = table_name
+        self._flush_amount = flush_amount
+        self._max_retries = max_retries
+        self._retries = 0
+        self._buffer = []
+
+    def put_item(self, Item):
+        self._add({'PutRequest': {'Item': serialize_item(Item)}})
+
+    def delete_item(self, Key):
+        self._add({'DeleteRequest': {'Key': serialize_item(Key)}})
+
+    def _add(self, request):
+        self._buffer.append(request)
+        if len(self._buffer) >= self._flush_amount:
+            self._flush()
+
+    def _flush(self):
+        batch, self._buffer = self._buffer[:self._flush_amount], self._buffer[self._flush_amount:]
+        response = self._client.batch_write_item(RequestItems={self._table_name: batch})
+        unprocessed = response.get('UnprocessedItems', {}).get(self._table_name, [])
+        if not unprocessed:
+            self._retries = 0
+            return
+        if self._retries >= self._max_retries:
+            raise UnprocessedItemsError(self._table_name, unprocessed + self._buffer, self._retries)
+        # Request bị throttle được đưa lại vào buffer và gửi ở lần flush sau, sau khi chờ
+        time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** self._retries)))
+        self._retries += 1
+        self._buffer.extend(unprocessed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._buffer:
+            self._flush()
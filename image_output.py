@@ -0,0 +1,167 @@
+from io import BytesIO
+from dataclasses import dataclass
+
+# Module này được đóng gói cả vào Upload Lambda (không có Pillow) nên chỉ import PIL bên trong các hàm encode
+
+# Định dạng ảnh đầu ra: content type và phần mở rộng của key S3
+OUTPUT_FORMATS = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'WEBP': ('image/webp', 'webp'),
+    'PNG': ('image/png', 'png'),
+    'AVIF': ('image/avif', 'avif'),
+}
+DEFAULT_QUALITY = 85
+MAX_THUMBNAILS = 4
+MIN_THUMBNAIL_EDGE = 16
+MAX_THUMBNAIL_EDGE = 2048
+# Mức nén/tốc độ của encoder: WebP method 2 và AVIF speed 8 nhỏ hơn JPEG nhiều nhưng encode nhanh gấp 3-5 lần
+# so với mặc định (method 4, speed 6) mà kích thước file chỉ tăng khoảng 10-15%
+WEBP_METHOD = 2
+AVIF_SPEED = 8
+
+# Content type nhận diện từ các byte đầu của file ảnh upload. Chỉ gồm các định dạng Pillow của Processing Lambda
+# mở được: WebP và AVIF cần Pillow build kèm libwebp/libavif (wheel từ 11.2 có sẵn, xem PIL.features và
+# DECODER_FEATURES); Processing Lambda kiểm tra bằng decodable() và ghi FAILED nếu Pillow của nó thiếu decoder.
+# HEIC vẫn được nhận diện nhưng bị từ chối vì Pillow không có decoder HEIF.
+UPLOAD_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/bmp': 'bmp',
+    'image/tiff': 'tif',
+    'image/avif': 'avif',
+}
+# Feature của PIL.features cần để decode các định dạng không có sẵn trong lõi Pillow
+DECODER_FEATURES = {'image/webp': 'webp', 'image/avif': 'avif'}
+# Rekognition chỉ nhận JPEG và PNG, định dạng khác phải được chuyển sang JPEG trước khi gửi
+REKOGNITION_TYPES = ('image/jpeg', 'image/png')
+
+def sniff_content_type(data: bytes) -> str | None:
+    """Nhận diện content type từ magic bytes (không tin phần mở rộng hay header của client)"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:2] == b'BM':
+        return 'image/bmp'
+    if data[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'image/tiff'
+    if data[4:8] == b'ftyp':
+        brand = data[8:12]
+        if brand in (b'avif', b'avis'):
+            return 'image/avif'
+        if brand in (b'heic', b'heix', b'mif1', b'msf1'):
+            return 'image/heic'
+    return None
+
+def decodable(content_type: str) -> bool:
+    """Pillow đang chạy mở được định dạng này (Processing Lambda kiểm tra trước khi tải ảnh)"""
+    if content_type not in UPLOAD_TYPES:
+        return False
+    if content_type not in DECODER_FEATURES:
+        return True
+    # Chỉ import Pillow cho định dạng cần decoder ngoài lõi
+    from PIL import features
+
+    return features.check(DECODER_FEATURES[content_type])
+
+@dataclass
+class OutputOptions:
+    """
+    Tuỳ chọn ảnh đã vẽ: `format` (auto/JPEG/WEBP/PNG/AVIF), `quality` (1-100, PNG bỏ qua), `progressive` (JPEG)
+    và `thumbnails` (danh sách cạnh dài, mỗi kích thước thêm một ảnh thu nhỏ). "auto" giữ PNG cho ảnh có
+    kênh alpha, còn lại dùng JPEG.
+    """
+    format: str = 'auto'
+    quality: int = DEFAULT_QUALITY
+    progressive: bool = False
+    thumbnails: tuple[int, ...] = ()
+
+    @classmethod
+    def from_dict(cls, value: dict | None) -> 'OutputOptions':
+        """Đọc và kiểm tra tuỳ chọn `output` của request, ValueError nếu không hợp lệ"""
+        if value is None:
+            return cls()
+        if not isinstance(value, dict):
+            raise ValueError('output must be an object')
+        unknown = value.keys() - {'format', 'quality', 'progressive', 'thumbnails'}
+        if unknown:
+            raise ValueError(f"Unknown output options: {', '.join(sorted(unknown))}")
+
+        output_format = str(value.get('format', 'auto')).upper()
+        if output_format != 'AUTO' and output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output.format must be one of: auto, {', '.join(OUTPUT_FORMATS)}")
+
+        quality = value.get('quality', DEFAULT_QUALITY)
+        if not isinstance(quality, int) or isinstance(quality, bool) or not 1 <= quality <= 100:
+            raise ValueError('output.quality must be an integer between 1 and 100')
+
+        progressive = value.get('progressive', False)
+        if not isinstance(progressive, bool):
+            raise ValueError('output.progressive must be a boolean')
+
+        thumbnails = value.get('thumbnails', [])
+        if (not isinstance(thumbnails, list) or len(thumbnails) > MAX_THUMBNAILS
+                or not all(isinstance(size, int) and MIN_THUMBNAIL_EDGE <= size <= MAX_THUMBNAIL_EDGE for size in thumbnails)):
+            raise ValueError(f'output.thumbnails must be a list of at most {MAX_THUMBNAILS} sizes '
+                             f'between {MIN_THUMBNAIL_EDGE} and {MAX_THUMBNAIL_EDGE}')
+
+        return cls('auto' if output_format == 'AUTO' else output_format, quality, progressive,
+                   tuple(sorted(set(thumbnails), reverse=True)))
+
+    def to_dict(self) -> dict:
+        return {'format': self.format, 'quality': self.quality, 'progressive': self.progressive,
+                'thumbnails': list(self.thumbnails)}
+
+    def resolve_format(self, image) -> str:
+        """Định dạng thực sự dùng cho ảnh này (AVIF chuyển sang WebP nếu Pillow không hỗ trợ)"""
+        if self.format == 'auto':
+            return 'PNG' if has_alpha(image) else 'JPEG'
+        if self.format == 'AVIF':
+            from PIL import features
+            if not features.check('avif'):
+                return 'WEBP'
+        return self.format
+
+def has_alpha(image) -> bool:
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+def encode(image, output_format: str, quality: int = DEFAULT_QUALITY, progressive: bool = False) -> bytes:
+    """Encode ảnh theo định dạng đầu ra (không kèm metadata); giữ kênh alpha với PNG/WebP/AVIF"""
+    if output_format == 'JPEG':
+        image = image.convert('RGB') if image.mode != 'RGB' else image
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+
+    buffer = BytesIO()
+    if output_format == 'JPEG':
+        # Progressive JPEG cần optimize để bảng Huffman tối ưu cho từng lượt quét
+        image.save(buffer, format='JPEG', quality=quality, progressive=progressive, optimize=progressive)
+    elif output_format == 'PNG':
+        image.save(buffer, format='PNG', compress_level=6)
+    elif output_format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=quality, method=WEBP_METHOD)
+    else:
+        image.save(buffer, format='AVIF', quality=quality, speed=AVIF_SPEED)
+    return buffer.getvalue()
+
+def thumbnails(image, sizes):
+    """
+    Ảnh thu nhỏ cho từng cạnh dài trong `sizes` (từ lớn tới nhỏ), mỗi ảnh được thu nhỏ từ ảnh trước đó
+    nên không phải resample lại ảnh gốc nhiều lần. Kích thước lớn hơn ảnh gốc bị bỏ qua.
+    """
+    from PIL import Image
+
+    current = image
+    for size in sorted(sizes, reverse=True):
+        scale = size / max(image.size)
+        if scale >= 1:
+            continue
+        target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        current = current.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        yield size, current
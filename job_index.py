@@ -0,0 +1,146 @@
+"""
+Liệt kê job theo trạng thái và thời gian tạo qua GSI (status, created_at) của bảng job, thay cho Scan cả bảng:
+"các job PROCESSING tạo trước 15 phút", "các job FAILED trong một giờ qua".
+
+- `created_at`, `completed_at`, `updated_at` lưu dạng epoch (giây, Number, độ chính xác ms) để sắp xếp được.
+  API vẫn trả chuỗi ISO 8601 (UTC), xem to_iso().
+- GSI: partition key `status` (String), sort key `created_at` (Number), tên trong STATUS_INDEX_NAME.
+
+CLI chuyển item cũ (created_at dạng chuỗi isoformat) sang epoch, chạy trước khi tạo GSI:
+    python job_index.py migrate rekognition-jobs
+"""
+import math
+import os
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+import clients
+from label_index import encode_cursor, decode_cursor
+
+dynamodb = clients.lazy_resource("dynamodb")
+
+TABLE_NAME = os.environ.get('TABLE_NAME')
+STATUS_INDEX_NAME = os.environ.get('STATUS_INDEX_NAME', 'status-created_at-index')
+STATUSES = ('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def epoch(seconds: float) -> Decimal:
+    """Epoch giây dạng Decimal (độ chính xác ms) để ghi vào DynamoDB"""
+    return Decimal(round(seconds * 1000)) / 1000
+
+def now() -> Decimal:
+    return epoch(time.time())
+
+def to_iso(value) -> str | None:
+    """Epoch giây thành chuỗi ISO 8601 UTC; item cũ còn lưu chuỗi thì giữ nguyên"""
+    if value is None or isinstance(value, str):
+        return value
+    return datetime.fromtimestamp(float(value), timezone.utc).isoformat(timespec='milliseconds')
+
+def parse_time(value: str) -> Decimal:
+    """Tham số thời gian của request: epoch giây hoặc ISO 8601 (không có múi giờ thì hiểu là UTC)"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = to_epoch(value)
+        except ValueError:
+            raise ValueError(f'Invalid time: {value} (epoch seconds or ISO 8601)') from None
+    if not math.isfinite(seconds):
+        raise ValueError(f'Invalid time: {value} (epoch seconds or ISO 8601)')
+    return epoch(seconds)
+
+def query(status: str, since=None, until=None, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None,
+          newest_first: bool = True, projection: dict | None = None, table=None) -> tuple[list[dict], str | None]:
+    """
+    Các job có `status`, tạo trong [since, until] (epoch giây, None = không giới hạn), tối đa `limit` item mỗi trang.
+    Trả về (item, cursor của trang kế tiếp hoặc None). `projection` là ProjectionExpression/ExpressionAttributeNames.
+    """
+    if status not in STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(STATUSES)}")
+
+    names = {'#status': 'status', **(projection or {}).get('ExpressionAttributeNames', {})}
+    values = {':status': status}
+    condition = '#status = :status'
+    if since is not None or until is not None:
+        names['#created'] = 'created_at'
+        # Sort key chỉ nhận một điều kiện: khoảng hai đầu dùng BETWEEN
+        if since is not None and until is not None:
+            condition += ' AND #created BETWEEN :since AND :until'
+            values.update({':since': since, ':until': until})
+        elif since is not None:
+            condition += ' AND #created >= :since'
+            values[':since'] = since
+        else:
+            condition += ' AND #created <= :until'
+            values[':until'] = until
+
+    request = {
+        'IndexName': STATUS_INDEX_NAME,
+        'KeyConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ScanIndexForward': not newest_first,
+        'Limit': limit,
+    }
+    if projection:
+        request['ProjectionExpression'] = projection['ProjectionExpression']
+    if cursor:
+        start_key = decode_cursor(cursor)
+        # Cursor phải là LastEvaluatedKey của cùng trạng thái (key của GSI + key của bảng)
+        if not isinstance(start_key, dict) or start_key.get('status') != status \
+                or not isinstance(start_key.get('job_id'), str) or 'created_at' not in start_key:
+            raise ValueError('Invalid cursor')
+        try:
+            created_at = Decimal(str(start_key['created_at']))
+        except ArithmeticError:
+            raise ValueError('Invalid cursor') from None
+        request['ExclusiveStartKey'] = {'status': status, 'created_at': created_at, 'job_id': start_key['job_id']}
+
+    response = (table or dynamodb.Table(TABLE_NAME)).query(**request)
+    last_key = response.get('LastEvaluatedKey')
+    return response.get('Items', []), encode_cursor(last_key) if last_key else None
+
+def to_epoch(value: str) -> float:
+    """Chuỗi ISO 8601 thành epoch giây; không có múi giờ thì hiểu là UTC (giờ của Lambda khi ghi item cũ)"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def migrate(table) -> int:
+    """Chuyển created_at/completed_at dạng chuỗi của mọi item sang epoch, trả về số item đã sửa"""
+    updated = 0
+    request = {
+        'ProjectionExpression': 'job_id, created_at, completed_at',
+        'FilterExpression': 'attribute_type(created_at, :string) OR attribute_type(completed_at, :string)',
+        'ExpressionAttributeValues': {':string': 'S'},
+    }
+    while True:
+        response = table.scan(**request)
+        for item in response.get('Items', []):
+            values = {name: epoch(to_epoch(item[name])) for name in ('created_at', 'completed_at')
+                      if isinstance(item.get(name), str)}
+            table.update_item(
+                Key={'job_id': item['job_id']},
+                UpdateExpression='SET ' + ', '.join(f'{name} = :{name}' for name in values),
+                ExpressionAttributeValues={f':{name}': value for name, value in values.items()},
+            )
+            updated += 1
+        if 'LastEvaluatedKey' not in response:
+            return updated
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Chuyển created_at/completed_at của bảng job sang epoch (trước khi tạo GSI)')
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('table', help='tên bảng job (TABLE_NAME)')
+    args = parser.parse_args()
+
+    print(f'{migrate(dynamodb.Table(args.table))} item đã chuyển sang epoch')
+
+if __name__ == '__main__':
+    main()
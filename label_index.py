@@ -0,0 +1,191 @@
+"""
+Chỉ mục ngược nhãn -> ảnh: tìm "mọi ảnh có Forklift với confidence >= 80" bằng một lần đọc theo khoảng key
+(chi phí tỷ lệ với số kết quả, không phải số job trong bảng).
+
+- DynamoDB (Lambda): bảng LABEL_INDEX_TABLE_NAME, partition key `label` (String, tên nhãn viết thường),
+  sort key `rank` (String, "<confidence x100 5 chữ số>#<job_id>") nên so sánh chuỗi trùng với so sánh confidence.
+- SQLite (chạy offline với main.py/batch_detect.py): SqliteLabelIndex, cùng cách tra.
+
+CLI: python label_index.py image/detected/labels.db Forklift --min-confidence 80
+"""
+import base64
+import json
+import os
+from decimal import Decimal
+import clients
+
+dynamodb = clients.lazy_resource("dynamodb")
+
+# Chỉ mục DynamoDB chỉ bật khi đã cấu hình LABEL_INDEX_TABLE_NAME
+LABEL_INDEX_TABLE_NAME = os.environ.get('LABEL_INDEX_TABLE_NAME')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def is_enabled():
+    return bool(LABEL_INDEX_TABLE_NAME)
+
+def label_key(name: str) -> str:
+    """Key của nhãn: không phân biệt hoa/thường ("forklift" tìm được "Forklift")"""
+    return name.strip().lower()
+
+def confidence_key(confidence) -> str:
+    """Confidence 0-100 thành chuỗi 5 chữ số (độ chính xác 0.01) để sắp xếp theo thứ tự từ điển"""
+    return f'{min(10000, max(0, round(float(confidence) * 100))):05d}'
+
+def summarize(labels) -> dict[str, dict]:
+    """
+    Gộp nhãn của một ảnh theo tên: confidence cao nhất và số instance. Nhận nhãn dạng compact
+    (result_cache.compact_labels, có `instances`), nhãn cả ảnh của batch_detect (`instances` là số instance)
+    hoặc danh sách từng instance (mỗi phần tử là một instance).
+    """
+    summary = {}
+    for label in labels:
+        key = label_key(label['name'])
+        entry = summary.setdefault(key, {'name': label['name'], 'confidence': 0.0, 'instances': 0})
+        entry['confidence'] = max(entry['confidence'], float(label['confidence']))
+        instances = label.get('instances', 1)
+        entry['instances'] += instances if isinstance(instances, int) else len(instances)
+    return summary
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value, separators=(',', ':'), default=str).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    """Giải mã cursor của trang trước, ValueError nếu cursor không hợp lệ"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeEncodeError):
+        raise ValueError('Invalid cursor') from None
+
+def _table(table=None):
+    return table or dynamodb.Table(LABEL_INDEX_TABLE_NAME)
+
+def index_job(job_id: str, labels, completed_at: str | None = None, table=None) -> int:
+    """
+    Ghi một item chỉ mục cho mỗi nhãn (khác tên) của job, trả về số item. Key cố định theo (nhãn, confidence, job)
+    nên ghi lại khi message bị giao lại không tạo item trùng.
+    """
+    summary = summarize(labels)
+    with _table(table).batch_writer() as writer:
+        for key, entry in summary.items():
+            item = {
+                'label': key,
+                'rank': f"{confidence_key(entry['confidence'])}#{job_id}",
+                'job_id': job_id,
+                'name': entry['name'],
+                'confidence': Decimal(str(round(entry['confidence'], 3))),
+                'instances': entry['instances'],
+            }
+            if completed_at:
+                item['completed_at'] = completed_at
+            writer.put_item(Item=item)
+    return len(summary)
+
+def query(label: str, min_confidence: float = 0, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None,
+          table=None) -> tuple[list[dict], str | None]:
+    """
+    Các job có nhãn `label` với confidence >= min_confidence, confidence cao nhất trước, tối đa `limit` kết quả.
+    Trả về (kết quả, cursor của trang kế tiếp hoặc None).
+    """
+    request = {
+        'KeyConditionExpression': '#label = :label AND #rank >= :rank',
+        'ExpressionAttributeNames': {'#label': 'label', '#rank': 'rank'},
+        'ExpressionAttributeValues': {':label': label_key(label), ':rank': confidence_key(min_confidence)},
+        'ScanIndexForward': False,
+        'Limit': limit,
+    }
+    if cursor:
+        start_key = decode_cursor(cursor)
+        # Cursor phải là LastEvaluatedKey của cùng nhãn, không cho client đọc sang partition khác
+        if not isinstance(start_key, dict) or start_key.get('label') != label_key(label) \
+                or not isinstance(start_key.get('rank'), str):
+            raise ValueError('Invalid cursor')
+        request['ExclusiveStartKey'] = {'label': start_key['label'], 'rank': start_key['rank']}
+    response = _table(table).query(**request)
+    matches = [
+        {
+            'job_id': item['job_id'],
+            'name': item['name'],
+            'confidence': float(item['confidence']),
+            'instances': int(item['instances']),
+            **({'completed_at': item['completed_at']} if 'completed_at' in item else {}),
+        }
+        for item in response.get('Items', [])
+    ]
+    last_key = response.get('LastEvaluatedKey')
+    return matches, encode_cursor(last_key) if last_key else None
+
+class SqliteLabelIndex:
+    """
+    Chỉ mục nhãn trong file SQLite cho đường chạy offline. Index (label, confidence DESC, image) phục vụ tra cứu
+    theo khoảng; phân trang bằng keyset (confidence, image) của kết quả cuối nên trang sau không phải đọc lại trang trước.
+    """
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS labels (
+                label TEXT NOT NULL, image TEXT NOT NULL, name TEXT NOT NULL,
+                confidence REAL NOT NULL, instances INTEGER NOT NULL,
+                PRIMARY KEY (label, image)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS labels_by_confidence ON labels (label, confidence DESC, image DESC);
+            CREATE INDEX IF NOT EXISTS labels_by_image ON labels (image);
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, image: str, labels):
+        """Thay toàn bộ nhãn của ảnh (chạy lại một ảnh không để lại nhãn cũ)"""
+        rows = [(key, image, entry['name'], entry['confidence'], entry['instances']) for key, entry in summarize(labels).items()]
+        with self.conn:
+            self.conn.execute('DELETE FROM labels WHERE image = ?', (image,))
+            self.conn.executemany('INSERT INTO labels VALUES (?, ?, ?, ?, ?)', rows)
+
+    def query(self, label: str, min_confidence: float = 0, limit: int = DEFAULT_PAGE_SIZE,
+              cursor: str | None = None) -> tuple[list[dict], str | None]:
+        """Giống query() của DynamoDB: (kết quả, cursor của trang kế tiếp hoặc None)"""
+        sql = 'SELECT image, name, confidence, instances FROM labels WHERE label = ? AND confidence >= ?'
+        params = [label_key(label), float(min_confidence)]
+        if cursor:
+            after = decode_cursor(cursor)
+            if not (isinstance(after, list) and len(after) == 2):
+                raise ValueError('Invalid cursor')
+            sql += ' AND (confidence, image) < (?, ?)'
+            params += [after[0], after[1]]
+        sql += ' ORDER BY confidence DESC, image DESC LIMIT ?'
+        rows = self.conn.execute(sql, [*params, limit + 1]).fetchall()
+        matches = [{'image': image, 'name': name, 'confidence': confidence, 'instances': instances}
+                   for image, name, confidence, instances in rows[:limit]]
+        next_cursor = encode_cursor([rows[limit - 1][2], rows[limit - 1][0]]) if len(rows) > limit else None
+        return matches, next_cursor
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tìm ảnh theo nhãn trong chỉ mục SQLite của batch_detect.py')
+    parser.add_argument('index', help='file SQLite (batch_detect.py --index)')
+    parser.add_argument('label')
+    parser.add_argument('--min-confidence', type=float, default=0)
+    parser.add_argument('--limit', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--cursor', default=None, help='cursor của trang trước')
+    args = parser.parse_args()
+
+    with SqliteLabelIndex(args.index) as index:
+        matches, next_cursor = index.query(args.label, args.min_confidence, args.limit, args.cursor)
+    for match in matches:
+        print(f"{match['confidence']:6.2f}  {match['instances']:>3} instance  {match['image']}")
+    if next_cursor:
+        print(f'--cursor {next_cursor}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import sys
+from array import array
+
+# Mỗi instance lưu 6 số float32: chỉ số tên nhãn, confidence, Left, Top, Width, Height
+FIELDS_PER_INSTANCE = 6
+
+def flatten_labels(compact_labels):
+    """Trải phẳng nhãn dạng compact (result_cache.compact_labels) thành danh sách từng instance có bounding box"""
+    labels = []
+    for label_data in compact_labels:
+        for instance in label_data['instances']:
+            labels.append({
+                'name': label_data['name'],
+                'confidence': label_data['confidence'],
+                'bounding_box': instance['bounding_box'],
+            })
+    return labels
+
+def image_labels(labels):
+    """
+    Nhãn của cả ảnh (mỗi tên một lần, kèm confidence), kể cả nhãn không có box như câu trả lời của model
+    phân loại local hay nhãn cảnh của Rekognition. Nhận nhãn dạng compact hoặc danh sách từng instance.
+    """
+    summary = {}
+    for label in labels:
+        summary.setdefault(label['name'], label['confidence'])
+    return [{'name': name, 'confidence': confidence} for name, confidence in summary.items()]
+
+def encode_labels(labels, names=()):
+    """
+    Nén danh sách instance thành (label_names, label_boxes) để lưu trong item job:
+    tên nhãn không lặp lại, toạ độ và confidence là một attribute Binary float32 little-endian
+    (24 byte/instance thay vì map lồng nhau của Decimal). `names` đứng đầu label_names theo đúng thứ tự.
+    """
+    names = list(dict.fromkeys([*names, *(label['name'] for label in labels)]))
+    index = {name: position for position, name in enumerate(names)}
+    values = array('f')
+    for label in labels:
+        box = label['bounding_box']
+        values.extend((index[label['name']], label['confidence'], box['Left'], box['Top'], box['Width'], box['Height']))
+    return names, _pack(values)
+
+def _pack(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+def _unpack(blob):
+    values = array('f')
+    # Resource của boto3 trả attribute Binary dưới dạng boto3.dynamodb.types.Binary, dynamodb_table trả bytes
+    values.frombytes(bytes(getattr(blob, 'value', blob)))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+def encode_job_labels(compact_labels):
+    """
+    Các attribute nhãn của item job từ nhãn dạng compact: label_names/label_boxes (từng instance có box)
+    và label_scores (float32, confidence của từng nhãn cả ảnh theo thứ tự đầu label_names).
+    """
+    summary = image_labels(compact_labels)
+    names, boxes = encode_labels(flatten_labels(compact_labels), [label['name'] for label in summary])
+    return {
+        'label_names': names,
+        'label_boxes': boxes,
+        'label_scores': _pack(array('f', [label['confidence'] for label in summary])),
+    }
+
+def decode_image_labels(names, blob):
+    """Giải nén label_scores về danh sách nhãn cả ảnh như kết quả của image_labels"""
+    return [{'name': names[position], 'confidence': round(value, 3)} for position, value in enumerate(_unpack(blob))]
+
+def decode_labels(names, blob):
+    """Giải nén (label_names, label_boxes) về danh sách instance như kết quả của flatten_labels"""
+    values = _unpack(blob)
+    return [
+        {
+            'name': names[int(values[start])],
+            'confidence': round(values[start + 1], 3),
+            'bounding_box': {
+                'Left': round(values[start + 2], 6),
+                'Top': round(values[start + 3], 6),
+                'Width': round(values[start + 4], 6),
+                'Height': round(values[start + 5], 6),
+            },
+        }
+        for start in range(0, len(values), FIELDS_PER_INSTANCE)
+    ]
@@ -1,17 +1,95 @@
+import hashlib
 import json
 import os
-import boto3
+import random
+import time
+import clients
+import metrics
+import label_codec
+import signed_urls
+import lanes
+import job_index
 
-dynamodb = boto3.resource('dynamodb')
-s3 = boto3.client('s3')
+dynamodb = clients.lazy_resource('dynamodb')
+
+# URL ảnh đã ký được cache trong container và dùng lại giữa các lần poll (xem signed_urls.py)
+url_cache = signed_urls.from_env()
 
 BUCKET_NAME = os.environ.get('BUCKET_NAME')
 TABLE_NAME = os.environ.get('TABLE_NAME')
 
+# Ảnh gốc do Upload Lambda ghi (base64 và presigned POST), chỉ các key này có original_image_url
+UPLOADED_PREFIXES = ('uploads/', 'incoming/')
+
+# Số job tối đa trong một request ?job_ids=
+MAX_BATCH_JOB_IDS = int(os.environ.get('MAX_BATCH_JOB_IDS', '100'))
+
+# Số lần lấy lại UnprocessedKeys của batch_get_item (exponential backoff có jitter); quá số lần này các job
+# còn lại được trả trong `unprocessed` để client poll lại, thay vì giữ Lambda tới timeout khi bảng bị throttle
+MAX_BATCH_GET_RETRIES = int(os.environ.get('MAX_BATCH_GET_RETRIES', '5'))
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+
+# Item của job COMPLETED không còn thay đổi nên được giữ trong container, poll lại không cần đọc DynamoDB
+# (job FAILED có thể được SQS thử lại nên không cache)
+COMPLETED_CACHE_SIZE = int(os.environ.get('COMPLETED_CACHE_SIZE', '1024'))
+completed_items = signed_urls.LRUCache(COMPLETED_CACHE_SIZE)
+
+# Cache-Control max-age (giây) của response chỉ gồm job COMPLETED; không vượt quá một nửa
+# SIGNED_URL_REFRESH_MARGIN để URL trong response được cache vẫn còn hạn khi client dùng
+STATUS_MAX_AGE = min(int(os.environ.get('STATUS_MAX_AGE', '60')), url_cache.refresh_margin // 2)
+
+# Field client chọn được qua ?fields=a,b và các attribute DynamoDB cần đọc cho từng field
+# (job_id và status luôn có trong response)
+FIELD_ATTRIBUTES = {
+    'status': ['status'],
+    'created_at': ['created_at'],
+    'priority': ['priority'],
+    'completed_at': ['completed_at'],
+    'updated_at': ['updated_at'],
+    'labels': ['label_names', 'label_boxes', 'label_summary'],
+    # Nhãn của cả ảnh (tên + confidence), kể cả nhãn không có box
+    'image_labels': ['label_names', 'label_scores', 'label_boxes'],
+    'overlays': ['overlays'],
+    'original_image_url': ['s3_key'],
+    'processed_image_url': ['processed_s3_key'],
+    'thumbnail_urls': ['thumbnails'],
+    'error_message': ['error_message'],
+    # Job chuỗi khung hình: URL của track nhãn theo thời gian và số frame lấy mẫu/phân tích/bỏ qua
+    'track_url': ['track_s3_key'],
+    'frames': ['frames'],
+}
+
+# Field mặc định khi liệt kê job (?status=): không ký URL hay giải nén nhãn cho cả trang
+LIST_FIELDS = {'status', 'created_at', 'updated_at', 'completed_at', 'priority', 'error_message'}
+
 def lambda_handler(event, context):
     """Lambda function để lấy trạng thái của job phân tích ảnh từ SQS"""
+    # Mỗi request emit một bản ghi metrics (EMF)
+    with metrics.job('status') as request_metrics:
+        response = handle_request(event)
+        request_metrics.set_property('status_code', response['statusCode'])
+        return response
+
+def handle_request(event):
+    """
+    Tra một job (?job_id=), nhiều job (?job_ids=), liệt kê job theo trạng thái (?status=, xem list_jobs)
+    hoặc số message đang chờ của từng làn (?queue_depth=true)
+    """
     try:
-        job_id = event.get('queryStringParameters', {}).get('job_id')
+        params = event.get('queryStringParameters') or {}
+        job_id = params.get('job_id')
+        fields = parse_fields(params.get('fields'))
+
+        if params.get('queue_depth', '').lower() in ('1', 'true'):
+            return queue_depth_response()
+
+        # Tra nhiều job trong một request: ?job_ids=id1,id2,...
+        if params.get('job_ids'):
+            return get_jobs([job_id for job_id in params['job_ids'].split(',') if job_id], fields, event)
+
+        if params.get('status') and not job_id:
+            return list_jobs(params, fields)
 
         if not job_id:
             return {
@@ -25,10 +103,10 @@ def lambda_handler(event, context):
                 })
             }
         
-        table = dynamodb.Table(TABLE_NAME)
-        response = table.get_item(Key={'job_id': job_id})
+        metrics.count('jobs')
+        item = get_job(job_id, fields)
 
-        if 'Item' not in response:
+        if item is None:
             return {
                 'statusCode': 404,
                 'headers': {
@@ -40,33 +118,19 @@ def lambda_handler(event, context):
                 })
             }
 
-        item = response['Item']
-        result = {
-            'job_id': item['job_id'],
-            'status': item['status'],
-            'created_at': item['created_at'],
-        }
-
-        if item['status'] == 'COMPLETED':
-            result['completed_at'] = item.get('completed_at')
-            result['labels'] = item.get('labels', [])
-
-            # Tạo presigned URL để tải ảnh về
-            result['original_image_url'] = s3.generate_presigned_url('get_object', Params={'Bucket': BUCKET_NAME, 'Key': item['s3_key']}, ExpiresIn=3600)
+        result = build_result(item, fields)
+        return cached_response(event, result, result['status'] == 'COMPLETED')
 
-            if item.get('processed_s3_key'):
-                result['processed_image_url'] = s3.generate_presigned_url('get_object', Params={'Bucket': BUCKET_NAME, 'Key': item['processed_s3_key']}, ExpiresIn=3600)
-        
-        elif item['status'] == 'FAILED':
-            result['error_message'] = item.get('error_message', 'Unknown error')
-        
+    except ValueError as e:
         return {
-            'statusCode': 200,
+            'statusCode': 400,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
             },
-            'body': json.dumps(result)
+            'body': json.dumps({
+                'error': str(e)
+            })
         }
 
     except Exception as e:
@@ -80,4 +144,221 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'error': str(e)
             })
-        }
\ No newline at end of file
+        }
+
+def parse_fields(value):
+    """Tập field từ ?fields=a,b (None = trả đầy đủ)"""
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - FIELD_ATTRIBUTES.keys() - {'job_id'}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))} (allowed: {', '.join(FIELD_ATTRIBUTES)})")
+    return fields
+
+def projection(fields):
+    """ProjectionExpression chỉ đọc các attribute cần cho các field được chọn"""
+    if fields is None:
+        return {}
+    attributes = ['job_id', 'status'] + [attribute for field in sorted(fields - {'job_id'}) for attribute in FIELD_ATTRIBUTES[field]]
+    names = {f'#a{index}': attribute for index, attribute in enumerate(dict.fromkeys(attributes))}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+def get_job(job_id, fields=None):
+    """Item của job (từ cache nếu job đã COMPLETED), None nếu không có"""
+    item = completed_items.get(job_id)
+    if item is not None:
+        metrics.count('completed_cache_hit')
+        return item
+
+    with metrics.timer('dynamodb_get'):
+        item = dynamodb.Table(TABLE_NAME).get_item(Key={'job_id': job_id}, **projection(fields)).get('Item')
+    remember_completed(item, fields)
+    return item
+
+def remember_completed(item, fields):
+    # Chỉ cache item đầy đủ (đọc không có projection) để dùng được cho mọi ?fields=
+    if item and fields is None and item['status'] == 'COMPLETED':
+        completed_items.put(item['job_id'], item)
+
+def if_none_match(event):
+    """Các ETag trong header If-None-Match (API Gateway có thể giữ nguyên hoa/thường của tên header)"""
+    headers = event.get('headers') or {}
+    value = next((value for name, value in headers.items() if name.lower() == 'if-none-match'), None) or ''
+    return {tag.strip().removeprefix('W/') for tag in value.split(',') if tag.strip()}
+
+def cached_response(event, result, completed):
+    """
+    Response 200 có ETag; trả 304 nếu client gửi lại đúng ETag đó. Response chỉ gồm job COMPLETED không đổi
+    (URL đã ký được dùng lại) nên được phép cache STATUS_MAX_AGE giây, còn lại client phải kiểm tra lại mỗi lần.
+    """
+    body = json.dumps(result)
+    etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Cache-Control': f'private, max-age={STATUS_MAX_AGE}' if completed and STATUS_MAX_AGE > 0 else 'no-cache',
+    }
+    tags = if_none_match(event)
+    if etag in tags or '*' in tags:
+        metrics.count('not_modified')
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'body': body}
+
+@metrics.timed('build_result')
+def build_result(item, fields=None):
+    """Chuyển item job trong DynamoDB thành response trả cho client (chỉ các field được chọn nếu có `fields`)"""
+    def wanted(field):
+        return fields is None or field in fields
+
+    result = {
+        'job_id': item['job_id'],
+        'status': item['status'],
+    }
+    if wanted('created_at'):
+        result['created_at'] = job_index.to_iso(item.get('created_at'))
+    if wanted('updated_at'):
+        result['updated_at'] = job_index.to_iso(item.get('updated_at'))
+    if wanted('priority'):
+        result['priority'] = item.get('priority', lanes.DEFAULT_LANE)
+
+    if item['status'] == 'COMPLETED':
+        if wanted('completed_at'):
+            result['completed_at'] = job_index.to_iso(item.get('completed_at'))
+        if wanted('labels') and 'label_summary' in item:
+            # Job chuỗi khung hình: mỗi nhãn kèm lần đầu/cuối xuất hiện (giây), box theo frame nằm trong track
+            result['labels'] = json.loads(item['label_summary'])
+        elif wanted('labels'):
+            result['labels'] = label_codec.decode_labels(item['label_names'], item['label_boxes']) if 'label_boxes' in item else []
+        if wanted('image_labels') and 'label_scores' in item:
+            result['image_labels'] = label_codec.decode_image_labels(item['label_names'], item['label_scores'])
+        elif wanted('image_labels') and 'label_boxes' in item:
+            # Job hoàn thành trước khi có label_scores: chỉ còn các nhãn có box
+            result['image_labels'] = label_codec.image_labels(label_codec.decode_labels(item['label_names'], item['label_boxes']))
+        if wanted('track_url') and item.get('track_s3_key'):
+            result['track_url'] = url_cache.url(BUCKET_NAME, item['track_s3_key'])
+        if wanted('frames') and item.get('frames'):
+            result['frames'] = {name: float(value) if name == 'duration' else int(value) for name, value in item['frames'].items()}
+        if wanted('overlays') and item.get('overlays'):
+            result['overlays'] = json.loads(item['overlays'])
+
+        # URL đã ký để tải ảnh về (dùng lại URL trong cache nếu còn hạn). Ảnh gốc chỉ được ký khi do API tự upload:
+        # key do client đưa vào (phần tử batch `s3_key`) không bao giờ được ký lại
+        if wanted('original_image_url') and item['s3_key'].startswith(UPLOADED_PREFIXES):
+            result['original_image_url'] = url_cache.url(BUCKET_NAME, item['s3_key'])
+
+        if wanted('processed_image_url') and item.get('processed_s3_key'):
+            result['processed_image_url'] = url_cache.url(BUCKET_NAME, item['processed_s3_key'])
+
+        if wanted('thumbnail_urls') and item.get('thumbnails'):
+            result['thumbnail_urls'] = {size: url_cache.url(BUCKET_NAME, key) for size, key in item['thumbnails'].items()}
+
+    elif item['status'] == 'FAILED' and wanted('error_message'):
+        result['error_message'] = item.get('error_message', 'Unknown error')
+
+    return result
+
+def queue_depth_response():
+    """Số message đang chờ/đang xử lý của từng làn (số gần đúng của SQS, không cache)"""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-cache',
+        },
+        'body': json.dumps({
+            'lanes': lanes.queue_depths(),
+        })
+    }
+
+def get_jobs(job_ids, fields=None, event=None):
+    """Lấy trạng thái nhiều job bằng batch_get_item (tối đa MAX_BATCH_JOB_IDS job mỗi request)"""
+    job_ids = list(dict.fromkeys(job_ids))
+    if len(job_ids) > MAX_BATCH_JOB_IDS:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': f'Too many job_ids (max {MAX_BATCH_JOB_IDS})'
+            })
+        }
+
+    metrics.count('jobs', len(job_ids))
+    items = {job_id: item for job_id, item in ((job_id, completed_items.get(job_id)) for job_id in job_ids) if item is not None}
+    metrics.count('completed_cache_hit', len(items))
+    missing = [job_id for job_id in job_ids if job_id not in items]
+    unprocessed = set()
+    # batch_get_item nhận tối đa 100 key mỗi lần gọi
+    for start in range(0, len(missing), 100):
+        request = {TABLE_NAME: {'Keys': [{'job_id': job_id} for job_id in missing[start:start + 100]], **projection(fields)}}
+        retries = 0
+        while True:
+            with metrics.timer('dynamodb_get'):
+                response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(TABLE_NAME, []):
+                items[item['job_id']] = item
+                remember_completed(item, fields)
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+            if retries == MAX_BATCH_GET_RETRIES:
+                unprocessed.update(key['job_id'] for key in request[TABLE_NAME]['Keys'])
+                break
+            # Bị throttle: chờ rồi lấy lại các key chưa xử lý
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** retries)))
+            retries += 1
+        metrics.count('dynamodb_retries', retries)
+    metrics.count('unprocessed', len(unprocessed))
+
+    result = {
+        'jobs': [build_result(items[job_id], fields) for job_id in job_ids if job_id in items],
+        'not_found': [job_id for job_id in job_ids if job_id not in items and job_id not in unprocessed],
+    }
+    if unprocessed:
+        # Chưa đọc được (không phải không tồn tại): client poll lại các job này
+        result['unprocessed'] = [job_id for job_id in job_ids if job_id in unprocessed]
+    completed = not unprocessed and not result['not_found'] and all(job['status'] == 'COMPLETED' for job in result['jobs'])
+    return cached_response(event or {}, result, completed)
+
+def list_jobs(params, fields=None):
+    """
+    Liệt kê job theo trạng thái qua GSI (status, created_at), mới nhất trước:
+    ?status=FAILED&since=<epoch|ISO 8601>&until=...&order=asc&limit=50&cursor=<next_cursor>
+    """
+    since = job_index.parse_time(params['since']) if params.get('since') else None
+    until = job_index.parse_time(params['until']) if params.get('until') else None
+    if since is not None and until is not None and since > until:
+        raise ValueError('since must not be after until')
+    limit = int(params.get('limit', job_index.DEFAULT_PAGE_SIZE))
+    if not 1 <= limit <= job_index.MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {job_index.MAX_PAGE_SIZE}')
+    order = params.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+
+    fields = fields or LIST_FIELDS
+    with metrics.timer('dynamodb_query'):
+        items, next_cursor = job_index.query(
+            params['status'].upper(), since, until, limit, params.get('cursor'),
+            newest_first=order == 'desc', projection=projection(fields),
+        )
+    metrics.count('jobs', len(items))
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-cache',
+        },
+        'body': json.dumps({
+            'jobs': [build_result(item, fields) for item in items],
+            'next_cursor': next_cursor,
+        })
+    }
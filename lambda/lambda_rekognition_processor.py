@@ -1,164 +1,608 @@
 import json
+import math
 import os
-import boto3
+import shutil
+import tempfile
+import time
+import uuid
+import clients
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
 from io import BytesIO
-from PIL import Image, ImageDraw
-from datetime import datetime
+import result_cache
+import rendering
+import preprocessing
+import tiling
+from ratelimit import AdaptiveRateLimiter, DynamoDBRateLimiter, ThrottlingRetry
+import notifier
+import metrics
+import label_codec
+import image_output
+import lanes
+import label_index
+import job_index
+import detection
+import sequence
 
-s3 = boto3.client("s3")
-rekognition = boto3.client("rekognition")
-dynamodb = boto3.resource("dynamodb")
+s3 = clients.lazy_client("s3")
+# botocore không tự retry DetectLabels: ThrottlingRetry cần thấy từng lần bị throttle để giảm tốc độ
+rekognition = clients.lazy_client("rekognition", max_attempts=1)
+dynamodb = clients.lazy_resource("dynamodb")
 
 TABLE_NAME = os.environ.get('TABLE_NAME')
 
+# Số record xử lý song song trong một lần gọi Lambda
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+# Ngưỡng IoU để gộp các box trùng nhau khi vẽ
+RENDER_IOU_THRESHOLD = float(os.environ.get('RENDER_IOU_THRESHOLD', str(rendering.IOU_THRESHOLD)))
+
+# Thu nhỏ ảnh trước khi gửi Rekognition (0 = gửi thẳng object trên S3)
+PREPROCESS_MAX_EDGE = int(os.environ.get('PREPROCESS_MAX_EDGE', '0'))
+PREPROCESS_QUALITY = int(os.environ.get('PREPROCESS_QUALITY', str(preprocessing.JPEG_QUALITY)))
+
+# Chế độ tile cho ảnh rất lớn
+TILE_SIZE = int(os.environ.get('TILE_SIZE', str(tiling.TILE_SIZE)))
+TILE_OVERLAP = float(os.environ.get('TILE_OVERLAP', str(tiling.TILE_OVERLAP)))
+TILE_CONCURRENCY = int(os.environ.get('TILE_CONCURRENCY', str(tiling.TILE_CONCURRENCY)))
+
+# Giới hạn số lời gọi DetectLabels mỗi giây (0 = không giới hạn). Tốc độ trong container tự giảm khi bị
+# throttle và tăng dần lại tới REKOGNITION_TPS; có RATE_LIMIT_TABLE_NAME thì giới hạn chung cho mọi container.
+REKOGNITION_TPS = float(os.environ.get('REKOGNITION_TPS', '0'))
+REKOGNITION_MAX_RETRIES = int(os.environ.get('REKOGNITION_MAX_RETRIES', '5'))
+RATE_LIMIT_TABLE_NAME = os.environ.get('RATE_LIMIT_TABLE_NAME')
+rekognition_limiter = AdaptiveRateLimiter(
+    REKOGNITION_TPS,
+    shared=DynamoDBRateLimiter(RATE_LIMIT_TABLE_NAME, 'rekognition', REKOGNITION_TPS) if RATE_LIMIT_TABLE_NAME else None,
+) if REKOGNITION_TPS else None
+rekognition_retry = ThrottlingRetry(rekognition_limiter, max_retries=REKOGNITION_MAX_RETRIES)
+
+# Backend phát hiện nhãn (DETECTION_BACKEND, xem detection.py). Chế độ cascade trả lời ảnh một màu/ảnh dễ bằng
+# model local trên CPU và chỉ gọi Rekognition cho ảnh chưa chắc chắn; chế độ tile luôn gọi Rekognition.
+detector = detection.create_backend(
+    detection.DETECTION_BACKEND,
+    detection.RekognitionBackend(lambda: rekognition, rekognition_retry),
+)
+
+# Tải và decode ảnh chạy song song với lời gọi Rekognition
+download_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+# Pillow/numpy (~100 ms) chỉ được import khi job cần decode/vẽ ảnh, job lấy từ cache không phải chờ.
+# Với SnapStart hoặc provisioned concurrency, PRELOAD_IMAGING=true import sẵn trong lúc init.
+if os.environ.get('PRELOAD_IMAGING', 'false').lower() in ('1', 'true', 'yes'):
+    # Chỉ import để nạp sẵn module, không dùng tên ở đây
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import PIL.ImageDraw  # noqa: F401
+
+# Thời gian (giây) một lần xử lý giữ quyền với job; message gửi lại sau thời gian này được xử lý lại
+# (worker trước coi như đã chết). Không đặt thì lấy thời gian còn lại của lần gọi Lambda (= timeout của function),
+# DEFAULT_LEASE_SECONDS khi không có context (chạy local).
+PROCESSING_LEASE_SECONDS = int(os.environ.get('PROCESSING_LEASE_SECONDS') or 0) or None
+DEFAULT_LEASE_SECONDS = 300
+
+# maxReceiveCount của redrive policy (DLQ): lỗi ở lần nhận cuối mới gửi thông báo FAILED, các lần trước message
+# còn được thử lại và có thể COMPLETED. 0 = không biết, không gửi FAILED cho lỗi sẽ được thử lại.
+MAX_RECEIVE_COUNT = int(os.environ.get('MAX_RECEIVE_COUNT') or 0)
+
+class DuplicateDelivery(Exception):
+    """Message gửi lại cho job đã hoàn thành (hoặc đã được lần xử lý khác hoàn thành): bỏ qua, xoá message"""
+
+class JobInProgress(Exception):
+    """Một lần xử lý khác đang giữ job: trả message về SQS để thử lại sau"""
+
+class UnsupportedImage(Exception):
+    """Pillow của Lambda này không decode được định dạng ảnh: job FAILED, không thử lại"""
+
 def lambda_handler(event, context):
     """
-    Lambda function để xử lý job phân tích ảnh từ SQS
+    Lambda function để xử lý job phân tích ảnh từ SQS.
+    Các record trong batch được xử lý song song (tối đa BATCH_WORKERS luồng),
+    record lỗi được trả về trong `batchItemFailures` để SQS chỉ gửi lại các record đó.
+    Mỗi làn (interactive/bulk) thường có hàng đợi và event source mapping riêng; khi hai làn dùng chung
+    một hàng đợi, job interactive trong batch được bắt đầu trước.
     """
+    records = sorted(event["Records"], key=lambda record: record_lane(record) != 'interactive')
+    failures = []
+    lease = lease_seconds(context)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_WORKERS, len(records)))) as executor:
+        futures = {executor.submit(process_record, record, lease): record for record in records}
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                failures.append({'itemIdentifier': futures[future]["messageId"]})
+
+    print(f"Processed {len(records) - len(failures)}/{len(records)} records.")
+    return {'batchItemFailures': failures}
+
+def lease_seconds(context):
+    """
+    Lease của các job trong lần gọi này: PROCESSING_LEASE_SECONDS nếu đặt, còn lại là thời gian còn lại của lần gọi,
+    để job của lần gọi bị timeout được nhận lại ngay khi SQS giao lại message.
+    """
+    if PROCESSING_LEASE_SECONDS:
+        return PROCESSING_LEASE_SECONDS
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        return max(1, math.ceil(context.get_remaining_time_in_millis() / 1000))
+    return DEFAULT_LEASE_SECONDS
+
+def record_lane(record):
+    """Làn của message (message cũ không có `priority` thuộc làn mặc định)"""
     try:
-        # Parse message from SQS
-        for record in event["Records"]:
-            message = json.loads(record["body"])
+        return json.loads(record["body"]).get("priority", lanes.DEFAULT_LANE)
+    except (ValueError, AttributeError):
+        return lanes.DEFAULT_LANE
 
-            job_id = message["job_id"]
+def process_record(record, lease=DEFAULT_LEASE_SECONDS):
+    """Xử lý một message SQS: phân tích ảnh, vẽ bounding boxes và cập nhật job (giữ job trong `lease` giây)"""
+    message = json.loads(record["body"])
+    job_id = message["job_id"]
+
+    # Mỗi job emit một bản ghi metrics (EMF) khi kết thúc, kể cả khi lỗi; queue_wait/total có thêm dimension Lane
+    lane = message.get("priority", lanes.DEFAULT_LANE)
+    with metrics.job('processor', dimensions={'Lane': lane}, job_id=job_id) as job_metrics:
+        attributes = record.get('attributes') or {}
+        if attributes.get('SentTimestamp'):
+            # Thời gian message nằm trong SQS trước khi được xử lý
+            job_metrics.add_time('queue_wait', max(0.0, time.time() - int(attributes['SentTimestamp']) / 1000))
+        job_metrics.set_property('receive_count', int(attributes.get('ApproximateReceiveCount', 1)))
+
+        claim_id = None
+        try:
             s3_key = message["s3_key"]
             bucket = message["bucket"]
             max_labels = message["max_labels"]
             min_confidence = message["min_confidence"]
+            content_hash = message.get("content_hash")
+            render = message.get("render", True)
+            tiled = message.get("tiled", False)
+            content_type = message.get("content_type")
+            output = image_output.OutputOptions.from_dict(message.get("output"))
+            # Kết quả chế độ tile khác với một lần gọi nên không dùng chung cache
+            use_cache = bool(content_hash) and result_cache.is_enabled() and not tiled
+            job_metrics.set_property('render', render)
+            job_metrics.set_property('tiled', tiled)
 
             print(f"Processing job {job_id}...")
 
-            # Update status to PROCESSING
-            update_job_status(job_id, 'PROCESSING')
-
-            # Call Rekognition API
-            response = rekognition.detect_labels(
-                Image={
-                    'S3Object': {
-                        'Bucket': bucket,
-                        'Name': s3_key,
-                    },
-                },
-                MaxLabels=max_labels,
-                MinConfidence=min_confidence,
-            )
-            
+            # Chuyển sang PROCESSING có điều kiện trước mọi bước tốn kém: SQS có thể gửi một message nhiều lần
+            claim_id = claim_job(job_id, lease)
+
+            if message.get("sequence"):
+                process_sequence(message, claim_id)
+                return
+
+            # Upload handler đã đếm hit/miss, ở đây chỉ tra lại để bắt các ảnh trùng được xử lý song song
+            with metrics.timer('cache_lookup'):
+                cached = result_cache.lookup(content_hash, max_labels, min_confidence, record=False) if use_cache else None
+            if cached and cached[2] and render and not message.get('output') and cached[0].get('processed_s3_key'):
+                complete_job(job_id, claim_id, cached[0]['processed_s3_key'], labels=cached[1])
+                index_labels(job_id, cached[1])
+                after_completion(job_id, notify_completed, message, cached[0]['processed_s3_key'], cached[1])
+                print(f"Job {job_id} completed from cache.")
+                return
+
+            # Upload Lambda không biết Pillow ở đây được build kèm decoder nào (AVIF, WebP)
+            if content_type and not image_output.decodable(content_type):
+                raise UnsupportedImage(f"Unsupported image format {content_type}: this processor cannot decode it")
+
+            # Bắt đầu tải ảnh từ S3 trong lúc chờ Rekognition (không cần khi client chỉ lấy overlay JSON)
+            download = download_executor.submit(load_image, bucket, s3_key) if render or tiled else None
+            cacheable = use_cache
+
+            if cached:
+                # Lọc lại kết quả của một lần chạy có ngưỡng thấp hơn, không cần gọi Rekognition
+                compact = cached[1]
+            elif tiled:
+                img = wait_for_image(download)
+                with metrics.timer('detect'):
+                    compact = result_cache.compact_labels(detect_tiled(img, max_labels, min_confidence))
+            else:
+                # Call Rekognition API (hoặc model local nếu bật cascade)
+                detected = detector.detect(detection_image(bucket, s3_key, download, content_type), max_labels, min_confidence)
+                job_metrics.set_property('detector', detected.source)
+                compact = result_cache.compact_labels(detected.labels)
+                # Cache chỉ giữ kết quả của Rekognition, không giữ câu trả lời của model local
+                cacheable = use_cache and detected.source == 'rekognition'
+
             # Parse labels
-            labels = []
-            for label_data in response["Labels"]:
-                if label_data.get("Instances"):
-                    for instance in label_data["Instances"]:
-                        if instance.get("BoundingBox"):
-                            labels.append({
-                                'name': label_data["Name"],
-                                'confidence': label_data["Confidence"],
-                                'bounding_box': instance["BoundingBox"],
-                            })
-            
-            # Tải ảnh từ S3
-            img_obj = s3.get_object(Bucket=bucket, Key=s3_key)
-            img_bytes = img_obj["Body"].read()
-            img = Image.open(BytesIO(img_bytes))
+            labels = parse_labels(compact)
+            job_metrics.count('labels', len(compact))
+            job_metrics.count('instances', len(labels))
+
+            if not render:
+                # Fast path: chỉ trả box đã gộp dạng JSON, bỏ qua tải/decode/vẽ/encode ảnh
+                with metrics.timer('overlays'):
+                    overlays = rendering.build_overlays(labels, RENDER_IOU_THRESHOLD)
+                complete_job(job_id, claim_id, None, overlays, compact)
+                index_labels(job_id, compact)
+                if cacheable and not cached:
+                    after_completion(job_id, store_result, content_hash, s3_key, max_labels, min_confidence, compact, None)
+                after_completion(job_id, notify_completed, message, None, compact, overlays=overlays)
+
+                print(f"Job {job_id} completed (overlays only).")
+                return
+
+            # Chờ ảnh tải xong (thường đã xong khi Rekognition trả về)
+            with metrics.timer('download_wait'):
+                img = wait_for_image(download)
 
             # Vẽ bounding boxes lên ảnh
-            img_with_boxes = draw_bounding_boxes(img, labels)
+            with metrics.timer('draw'):
+                img_with_boxes = draw_bounding_boxes(img, labels)
+
+            # Upload ảnh với bounding boxes (và các thumbnail) lên S3 theo định dạng client chọn
+            output_format = output.resolve_format(img_with_boxes)
+            output_type, extension = image_output.OUTPUT_FORMATS[output_format]
+            job_metrics.set_property('output_format', output_format)
+            new_s3_key = f"processed/{job_id}.{extension}"
+            with metrics.timer('encode'):
+                data = image_output.encode(img_with_boxes, output_format, output.quality, output.progressive)
+            job_metrics.set_property('output_bytes', len(data))
 
-            # Upload ảnh với bounding boxes lên S3
-            new_s3_key = f"processed/{job_id}.jpg"
-            buffer = BytesIO()
-            img_with_boxes.save(buffer, format='JPEG')
-            buffer.seek(0)
+            with metrics.timer('s3_put'):
+                s3.put_object(
+                    Bucket=bucket,
+                    Key=new_s3_key,
+                    Body=data,
+                    ContentType=output_type,
+                )
 
-            s3.put_object(
-                Bucket=bucket,
-                Key=new_s3_key,
-                Body=buffer,
-                ContentType='image/jpeg',
-            )
+            thumbnail_keys = {}
+            for size, thumbnail in image_output.thumbnails(img_with_boxes, output.thumbnails):
+                thumbnail_keys[str(size)] = f"processed/{job_id}_{size}.{extension}"
+                with metrics.timer('thumbnails'):
+                    s3.put_object(
+                        Bucket=bucket,
+                        Key=thumbnail_keys[str(size)],
+                        Body=image_output.encode(thumbnail, output_format, output.quality, output.progressive),
+                        ContentType=output_type,
+                    )
 
             # Update job status to COMPLETED
-            table = dynamodb.Table(TABLE_NAME)
-            table.update_item(
-                Key={'job_id': job_id},
-                UpdateExpression='SET #status = :status, processed_s3_key = :key, completed_at = :time',
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues={':status': 'COMPLETED', ':key': new_s3_key, ':time': datetime.now().isoformat()},
-            )
+            complete_job(job_id, claim_id, new_s3_key, labels=compact, thumbnails=thumbnail_keys)
+            index_labels(job_id, compact)
+            after_completion(job_id, notify_completed, message, new_s3_key, compact)
+
+            # Cache chỉ giữ ảnh đã vẽ theo định dạng mặc định
+            if cacheable and not message.get('output'):
+                after_completion(job_id, store_result, content_hash, s3_key, max_labels, min_confidence, compact, new_s3_key)
+            elif cacheable and not cached:
+                after_completion(job_id, store_result, content_hash, s3_key, max_labels, min_confidence, compact, None)
 
             print(f"Job {job_id} completed successfully.")
 
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Processing completed successfully.'
-            })
-        }
-    
-    except Exception as e:
-        print(f"❌ Lỗi: {str(e)}")
+        except DuplicateDelivery:
+            print(f"Job {job_id} already completed, skipping duplicate message.")
+            job_metrics.count('duplicates')
 
-        if 'job_id' in locals():
-            update_job_status(job_id, 'FAILED', str(e))
-        raise
+        except JobInProgress:
+            print(f"Job {job_id} is being processed by another invocation, retrying later.")
+            job_metrics.count('duplicates')
+            raise
 
-def draw_bounding_boxes(image, labels):
-    """Vẽ bounding boxes lên ảnh"""
-    draw = ImageDraw.Draw(image)
-    img_width, img_height = image.size
-    
-    # Để tránh trùng lặp bounding box
-    drawn_boxes = set()
-    
-    for label in labels:
-        bbox = label['bounding_box']
-        bbox_key = (
-            round(bbox['Left'], 2),
-            round(bbox['Top'], 2),
-            round(bbox['Width'], 2),
-            round(bbox['Height'], 2)
+        except UnsupportedImage as e:
+            # Gửi lại message cũng không decode được: ghi FAILED và xoá message
+            print(f"❌ Lỗi job {job_id}: {str(e)}")
+            job_metrics.count('failed')
+            job_metrics.set_property('error', str(e))
+            if update_job_status(job_id, 'FAILED', str(e), claim_id):
+                notifier.notify_job(job_id, 'FAILED', message.get('callback_url'), error_message=str(e))
+
+        except Exception as e:
+            print(f"❌ Lỗi job {job_id}: {str(e)}")
+            job_metrics.count('failed')
+            job_metrics.set_property('error', str(e))
+            # Chỉ lần xử lý đang giữ job mới được đánh dấu FAILED. Message được SQS gửi lại nên FAILED chưa phải
+            # trạng thái cuối: chỉ thông báo ở lần nhận cuối cùng trước khi message vào DLQ.
+            last_attempt = MAX_RECEIVE_COUNT and int(attributes.get('ApproximateReceiveCount', 1)) >= MAX_RECEIVE_COUNT
+            if update_job_status(job_id, 'FAILED', str(e), claim_id) and last_attempt:
+                notifier.notify_job(job_id, 'FAILED', message.get('callback_url'), error_message=str(e))
+            raise
+
+def load_image(bucket, s3_key):
+    """Tải và decode ảnh từ S3 (chạy trong download_executor), trả về (ảnh, thời gian từng bước)"""
+    from PIL import Image
+
+    timings = {}
+    start = time.perf_counter()
+    img_obj = s3.get_object(Bucket=bucket, Key=s3_key)
+    data = img_obj["Body"].read()
+    timings['s3_get'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    img = Image.open(BytesIO(data))
+    img.load()
+    timings['decode'] = time.perf_counter() - start
+    return img, timings
+
+def wait_for_image(download):
+    """Chờ ảnh tải xong; thời gian tải/decode chỉ được ghi vào metrics của job ở lần gọi đầu tiên"""
+    img, timings = download.result()
+    job_metrics = metrics.current()
+    while timings:
+        stage, seconds = timings.popitem()
+        if job_metrics:
+            job_metrics.add_time(stage, seconds)
+    return img
+
+def detection_input(bucket, s3_key, download, content_type=None):
+    """
+    Ảnh gửi cho Rekognition: tham chiếu S3Object, hoặc bytes đã thu nhỏ khi bật PREPROCESS_MAX_EDGE.
+    Ảnh không phải JPEG/PNG (WebP, GIF...) luôn được chuyển sang JPEG vì Rekognition không đọc được.
+    Toạ độ tỷ lệ trên ảnh thu nhỏ trùng với ảnh gốc nên không cần đổi lại khi vẽ.
+    """
+    convert = content_type is not None and content_type not in image_output.REKOGNITION_TYPES
+    if not PREPROCESS_MAX_EDGE and not convert:
+        return {'S3Object': {'Bucket': bucket, 'Name': s3_key}}
+    max_edge = PREPROCESS_MAX_EDGE or preprocessing.MAX_EDGE
+
+    if download:
+        # Dùng lại ảnh đã decode cho bước vẽ
+        img = wait_for_image(download)
+        with metrics.timer('preprocess'):
+            prepared = preprocessing.prepare_image(img, max_edge, PREPROCESS_QUALITY)
+    else:
+        with metrics.timer('s3_get'):
+            img_bytes = s3.get_object(Bucket=bucket, Key=s3_key)["Body"].read()
+        with metrics.timer('preprocess'):
+            prepared = preprocessing.prepare_bytes(img_bytes, max_edge, PREPROCESS_QUALITY)
+    return {'Bytes': prepared.data}
+
+def detection_image(bucket, s3_key, download, content_type=None):
+    """
+    Ảnh cho detector: Rekognition nhận S3Object/bytes (detection_input), model local cần ảnh đã decode.
+    Khi chưa có lượt tải nào (job chỉ lấy overlay), ảnh được tải lúc model local cần và dùng lại cho Rekognition.
+    """
+    downloads = [download] if download else []
+
+    def pixels():
+        if not downloads:
+            downloads.append(download_executor.submit(load_image, bucket, s3_key))
+        return wait_for_image(downloads[0])
+
+    return detection.DetectionImage(
+        lambda: detection_input(bucket, s3_key, downloads[0] if downloads else None, content_type),
+        pixels,
+    )
+
+def process_sequence(message, claim_id):
+    """
+    Job chuỗi khung hình (video/zip/ảnh động): lấy mẫu frame, bỏ frame gần giống frame vừa phân tích, phát hiện nhãn
+    song song trên các frame còn lại. Track nhãn theo thời gian được ghi ra S3 (processed/<job_id>.track.json),
+    item job chỉ giữ số frame và tóm tắt nhãn.
+    """
+    job_id, max_labels, min_confidence = message["job_id"], message["max_labels"], message["min_confidence"]
+    options = sequence.SequenceOptions.from_dict(message["sequence"])
+    content_type = message.get("content_type")
+
+    def detect(image):
+        # Giống ảnh đơn: thu nhỏ trước khi gửi, ảnh một màu/ảnh dễ do cascade trả lời nếu bật
+        data = preprocessing.prepare_image(image, PREPROCESS_MAX_EDGE or preprocessing.MAX_EDGE, PREPROCESS_QUALITY).data
+        detected = detector.detect(detection.DetectionImage(lambda: {'Bytes': data}, lambda: image), max_labels, min_confidence)
+        return result_cache.compact_labels(detected.labels)
+
+    # Video cần đường dẫn file cho ffmpeg: object được tải về /tmp theo từng khối, không đọc hết vào bộ nhớ
+    extension = sequence.SEQUENCE_TYPES.get(content_type, 'bin')
+    with tempfile.NamedTemporaryFile(suffix=f'.{extension}') as source:
+        with metrics.timer('s3_get'):
+            body = s3.get_object(Bucket=message["bucket"], Key=message["s3_key"])["Body"]
+            shutil.copyfileobj(body, source, 1024 * 1024)
+            source.flush()
+        if content_type not in sequence.SEQUENCE_TYPES:
+            # Object có sẵn trong bucket (batch `s3_key`) không có content type đã nhận diện lúc upload
+            source.seek(0)
+            content_type = sequence.sniff_content_type(source.read(64))
+        with metrics.timer('sequence'):
+            track = sequence.analyze(sequence.frames(source.name, content_type, options), detect, options.diff_threshold)
+
+    for name, value in track.frames.items():
+        metrics.count(f'frames_{name}', value)
+
+    track_key = f"processed/{job_id}.track.json"
+    with metrics.timer('s3_put'):
+        s3.put_object(
+            Bucket=message["bucket"],
+            Key=track_key,
+            Body=json.dumps({'job_id': job_id, **options.to_dict(), **track.to_dict()}).encode('utf-8'),
+            ContentType='application/json',
         )
-        
-        if bbox_key in drawn_boxes:
-            continue
-        drawn_boxes.add(bbox_key)
-        
-        # Chuyển đổi từ tỷ lệ sang pixel
-        left = bbox['Left'] * img_width
-        top = bbox['Top'] * img_height
-        width = bbox['Width'] * img_width
-        height = bbox['Height'] * img_height
-        
-        # Vẽ rectangle
-        draw.rectangle(
-            [left, top, left + width, top + height],
-            outline='red',
-            width=3
+
+    summary = track.summary()
+    complete_job(job_id, claim_id, None, attributes={
+        'track_s3_key': track_key,
+        'frames': {**track.frames, 'duration': Decimal(str(round(track.duration, 3)))},
+        'label_summary': json.dumps(summary),
+    })
+    index_labels(job_id, track.all_labels())
+    with metrics.timer('notify'):
+        after_completion(job_id, notifier.notify_job, job_id, 'COMPLETED', message.get('callback_url'),
+                         labels=summary, frames=track.frames)
+    print(f"Job {job_id} completed: {track.analyzed}/{track.sampled} frames analyzed.")
+
+def detect_tiled(img, max_labels, min_confidence):
+    """Chia ảnh thành tile chồng lấn, gọi DetectLabels song song và gộp kết quả về toạ độ toàn ảnh"""
+    def detect_tile(tile, box):
+        # Lượt toàn ảnh nhận cả ảnh gốc (24MP có thể quá giới hạn 5 MB bytes của Rekognition) nên được thu nhỏ như
+        # ảnh thường; tile không lớn hơn TILE_SIZE nên thường giữ nguyên kích thước. Toạ độ tỷ lệ không đổi khi thu nhỏ.
+        # Tile cắt từ ảnh không có EXIF: lượt toàn ảnh cũng bỏ tag Orientation để mọi box cùng theo pixel gốc khi gộp.
+        data = preprocessing.prepare_image(tile, PREPROCESS_MAX_EDGE or preprocessing.MAX_EDGE, PREPROCESS_QUALITY,
+                                           keep_orientation=False).data
+        # Limiter được lấy trong rekognition_retry (mỗi lần thử), nên không truyền rate_limiter cho tiling
+        response, _ = rekognition_retry.call(
+            rekognition.detect_labels,
+            Image={'Bytes': data},
+            MaxLabels=max_labels,
+            MinConfidence=min_confidence,
         )
-        
-        # Vẽ nhãn
-        text = f"{label['name']} ({label['confidence']:.1f}%)"
-        draw.text(
-            (left, max(0, top - 15)),
-            text,
-            fill='white'
+        return response["Labels"]
+
+    return tiling.detect_tiled(
+        img,
+        detect_tile,
+        max_labels,
+        tile_size=TILE_SIZE,
+        overlap=TILE_OVERLAP,
+        concurrency=TILE_CONCURRENCY,
+    )
+
+def parse_labels(compact_labels):
+    """Trải phẳng nhãn thành danh sách từng instance có bounding box"""
+    return label_codec.flatten_labels(compact_labels)
+
+def draw_bounding_boxes(image, labels):
+    """Vẽ bounding boxes lên ảnh (các box trùng nhau theo IoU được gộp nhãn)"""
+    return rendering.render_labels(image, *rendering.from_instances(labels), iou_threshold=RENDER_IOU_THRESHOLD)
+
+def is_conditional_check_failed(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+@metrics.timed('status_update')
+def claim_job(job_id, lease=DEFAULT_LEASE_SECONDS):
+    """
+    Chuyển job sang PROCESSING nếu job chưa COMPLETED và không có lần xử lý nào khác đang giữ (lease còn hạn).
+    Lease hết hạn sau `lease` giây. Trả về claim_id để các lần ghi sau chỉ thành công khi job vẫn thuộc về lần
+    xử lý này; `attempts` tăng sau mỗi lần nhận job. DuplicateDelivery nếu job đã xong, JobInProgress nếu lần xử lý khác đang chạy.
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    claim_id = str(uuid.uuid4())
+    now = int(time.time())
+    try:
+        table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET #status = :processing, claim_id = :claim, lease_until = :lease, updated_at = :time '
+                             'ADD attempts :one',
+            ConditionExpression='attribute_not_exists(#status) OR (#status <> :completed AND '
+                                '(#status <> :processing OR attribute_not_exists(lease_until) OR lease_until < :now))',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':processing': 'PROCESSING',
+                ':completed': 'COMPLETED',
+                ':claim': claim_id,
+                ':lease': now + lease,
+                ':now': now,
+                ':time': job_index.now(),
+                ':one': 1,
+            },
         )
-    
-    return image
+    except ClientError as e:
+        if not is_conditional_check_failed(e):
+            raise
+        item = table.get_item(Key={'job_id': job_id}, ConsistentRead=True).get('Item', {})
+        if item.get('status') == 'COMPLETED':
+            raise DuplicateDelivery(job_id) from None
+        raise JobInProgress(job_id) from None
+    return claim_id
 
-def update_job_status(job_id, status, error=None):
-    """Update job status trong DynamoDB"""
+@metrics.timed('complete')
+def complete_job(job_id, claim_id, processed_s3_key, overlays=None, labels=None, thumbnails=None, attributes=None):
+    """
+    Đánh dấu job COMPLETED cùng với key của ảnh đã vẽ (hoặc overlay JSON khi không vẽ ảnh)
+    và nhãn dạng compact đã nén (label_names + label_boxes + label_scores, xem label_codec). `attributes` ghi thêm các attribute khác
+    (track của job chuỗi khung hình).
+    DuplicateDelivery nếu job không còn thuộc lần xử lý này (lease hết hạn và lần khác đã nhận job).
+    """
     table = dynamodb.Table(TABLE_NAME)
-    update_expr = 'SET #status = :status'
-    expr_values = {':status': status}
+    update_expr = 'SET #status = :status, completed_at = :time, updated_at = :time'
+    expr_values = {':status': 'COMPLETED', ':time': job_index.now(), ':claim': claim_id}
+    expr_names = {'#status': 'status'}
+
+    if processed_s3_key:
+        update_expr += ', processed_s3_key = :key'
+        expr_values[':key'] = processed_s3_key
+    if thumbnails:
+        update_expr += ', thumbnails = :thumbnails'
+        expr_values[':thumbnails'] = thumbnails
+    if overlays is not None:
+        update_expr += ', overlays = :overlays'
+        expr_values[':overlays'] = json.dumps(overlays)
+    attributes = {**(label_codec.encode_job_labels(labels) if labels is not None else {}), **(attributes or {})}
+    for name, value in attributes.items():
+        update_expr += f', #{name} = :{name}'
+        expr_names[f'#{name}'] = name
+        expr_values[f':{name}'] = value
+
+    try:
+        table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression=update_expr,
+            ConditionExpression='claim_id = :claim',
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values,
+        )
+    except ClientError as e:
+        if not is_conditional_check_failed(e):
+            raise
+        raise DuplicateDelivery(job_id) from None
+
+def after_completion(job_id, step, *args, **kwargs):
+    """
+    Chạy một bước phụ sau khi job đã COMPLETED (thông báo, ghi cache). Lỗi chỉ được ghi log: để lỗi lan ra
+    process_record sẽ ghi FAILED đè lên job đã xong và SQS gửi lại message.
+    """
+    try:
+        step(*args, **kwargs)
+    except Exception as e:
+        metrics.count('after_completion_errors')
+        print(f"Job {job_id} completed but {getattr(step, '__name__', step)} failed: {e}")
+
+@metrics.timed('cache_store')
+def store_result(content_hash, s3_key, max_labels, min_confidence, compact_labels, processed_s3_key):
+    result_cache.store(content_hash, s3_key, max_labels, min_confidence, compact_labels, processed_s3_key)
+
+@metrics.timed('label_index')
+def index_labels(job_id, compact_labels):
+    """
+    Thêm job vào chỉ mục nhãn -> job (nếu bật LABEL_INDEX_TABLE_NAME). Job đã COMPLETED nên lỗi ở đây chỉ được
+    ghi log, không làm hỏng job.
+    """
+    if not label_index.is_enabled():
+        return
+    try:
+        metrics.count('label_index_items', label_index.index_job(job_id, compact_labels, job_index.to_iso(job_index.now())))
+    except Exception as e:
+        metrics.count('label_index_errors')
+        print(f"Failed to index labels of job {job_id}: {e}")
+
+@metrics.timed('notify')
+def notify_completed(message, processed_s3_key, compact_labels, **fields):
+    """Đẩy kết quả tới client (webhook/SNS) ngay khi job hoàn thành"""
+    notifier.notify_completed(message['job_id'], message.get('callback_url'), compact_labels, message['bucket'],
+                              processed_s3_key, **fields)
+
+@metrics.timed('status_update')
+def update_job_status(job_id, status, error=None, claim_id=None):
+    """
+    Update job status trong DynamoDB nếu job chưa COMPLETED và (khi có `claim_id`) vẫn thuộc lần xử lý đó.
+    Trả về False khi điều kiện không thoả và không ghi gì.
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    update_expr = 'SET #status = :status, updated_at = :time'
+    expr_values = {':status': status, ':time': job_index.now()}
     expr_names = {'#status': 'status'}
     
     if error:
         update_expr += ', error_message = :error'
         expr_values[':error'] = error
-    
-    table.update_item(
-        Key={'job_id': job_id},
-        UpdateExpression=update_expr,
-        ExpressionAttributeNames=expr_names,
-        ExpressionAttributeValues=expr_values
-    )
\ No newline at end of file
+
+    # complete_job giữ nguyên claim_id nên điều kiện claim thôi không đủ: job đã COMPLETED không bao giờ bị ghi đè
+    condition = 'attribute_not_exists(#status) OR #status <> :completed'
+    expr_values[':completed'] = 'COMPLETED'
+    if claim_id:
+        condition = f'claim_id = :claim AND ({condition})'
+        expr_values[':claim'] = claim_id
+
+    try:
+        table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression=update_expr,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values
+        )
+    except ClientError as e:
+        if not is_conditional_check_failed(e):
+            raise
+        return False
+    return True
\ No newline at end of file
@@ -0,0 +1,93 @@
+import json
+import metrics
+import label_index
+
+def lambda_handler(event, context):
+    """
+    Lambda function để tìm các job có một nhãn: GET /labels?label=Forklift&min_confidence=80&limit=50&cursor=...
+    Kết quả sắp xếp theo confidence giảm dần; trang kế tiếp lấy bằng `next_cursor`.
+    """
+    # Mỗi request emit một bản ghi metrics (EMF)
+    with metrics.job('search') as request_metrics:
+        response = handle_request(event)
+        request_metrics.set_property('status_code', response['statusCode'])
+        return response
+
+def handle_request(event):
+    if not label_index.is_enabled():
+        # Chưa cấu hình LABEL_INDEX_TABLE_NAME: không có bảng để tra
+        return {
+            'statusCode': 503,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': 'Label search is not configured (LABEL_INDEX_TABLE_NAME is not set)'
+            })
+        }
+
+    try:
+        params = event.get('queryStringParameters') or {}
+        label = (params.get('label') or '').strip()
+        if not label:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                },
+                'body': json.dumps({
+                    'error': 'Missing label'
+                })
+            }
+
+        min_confidence = float(params.get('min_confidence', 0))
+        if not 0 <= min_confidence <= 100:
+            raise ValueError('min_confidence must be between 0 and 100')
+        limit = int(params.get('limit', label_index.DEFAULT_PAGE_SIZE))
+        if not 1 <= limit <= label_index.MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {label_index.MAX_PAGE_SIZE}')
+
+        with metrics.timer('dynamodb_query'):
+            matches, next_cursor = label_index.query(label, min_confidence, limit, params.get('cursor'))
+        metrics.count('matches', len(matches))
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'label': label,
+                'min_confidence': min_confidence,
+                'matches': matches,
+                'next_cursor': next_cursor,
+            })
+        }
+
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': str(e)
+            })
+        }
+
+    except Exception as e:
+        print(f"❌ Lỗi: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': str(e)
+            })
+        }
@@ -1,30 +1,91 @@
 import json
-import boto3
+import clients
 import base64
+import contextvars
+import hashlib
 import uuid
 import os
-from datetime import datetime
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import unquote_plus
+import result_cache
+import notifier
+import metrics
+import label_codec
+import image_output
+import lanes
+import label_index
+import job_index
+import sequence
 
-s3 = boto3.client("s3")
-sqs = boto3.client("sqs")
-dynamodb = boto3.resource("dynamodb")
+s3 = clients.lazy_client("s3")
+sqs = clients.lazy_client("sqs")
+dynamodb = clients.lazy_resource("dynamodb")
 
 # Lấy từ environment variables
 BUCKET_NAME = os.environ.get('BUCKET_NAME')
-QUEUE_URL = os.environ.get('QUEUE_URL')
 TABLE_NAME = os.environ.get('TABLE_NAME')
 
+# Upload trực tiếp qua presigned POST
+PRESIGNED_PREFIX = 'incoming/'
+PRESIGNED_EXPIRES = int(os.environ.get('PRESIGNED_EXPIRES', '900'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(15 * 1024 * 1024)))
+# Số byte đầu của object upload bằng presigned POST được đọc để nhận diện định dạng
+SNIFF_BYTES = 64
+# Giới hạn riêng cho video/file zip của job chuỗi khung hình
+MAX_SEQUENCE_BYTES = int(os.environ.get('MAX_SEQUENCE_BYTES', str(500 * 1024 * 1024)))
+
+# Phần tử batch `s3_key` chỉ được trỏ tới object dưới prefix này (chỗ client tự đặt file, "" = tắt), không bao giờ
+# tới ảnh/kết quả của job khác: status trả URL đã ký cho ảnh gốc nên đó sẽ là đường đọc ảnh của người khác
+BATCH_SOURCE_PREFIX = os.environ.get('BATCH_SOURCE_PREFIX', 'sources/')
+RESERVED_PREFIXES = ('uploads/', 'processed/', PRESIGNED_PREFIX)
+
+# Upload nhiều ảnh trong một request
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '100'))
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '8'))
+
+# Giới hạn tham số DetectLabels: MaxLabels là số nguyên >= 1, MinConfidence trong khoảng 0-100
+MAX_LABELS_LIMIT = 1000
+
+# Job gửi kèm Idempotency-Key có job_id cố định theo key, client gửi lại request nhận về đúng job cũ
+IDEMPOTENCY_NAMESPACE = uuid.UUID(os.environ.get('IDEMPOTENCY_NAMESPACE', '6f1c9a52-2d7e-4b8e-9a53-0c2f4e1d7b31'))
+
+class IdempotencyConflict(Exception):
+    """Idempotency-Key đã được dùng cho một request khác"""
+
 def lambda_handler(event, context):
     """
-    Lambda function để nhận ảnh từ API Gateway và upload lên S3, sau đó gửi message vào SQS
+    Lambda function để nhận ảnh từ API Gateway và upload lên S3, sau đó gửi message vào SQS.
+    Cũng nhận S3 event khi client upload trực tiếp bằng presigned POST.
     """
+    # Mỗi request emit một bản ghi metrics (EMF)
+    with metrics.job('upload') as request_metrics:
+        response = handle_request(event)
+        request_metrics.set_property('status_code', response['statusCode'])
+        return response
+
+def handle_request(event):
+    """Định tuyến request: S3 event, presigned POST, nhiều ảnh hoặc một ảnh base64"""
+    if event.get("Records") and event["Records"][0].get("eventSource") == "aws:s3":
+        return handle_s3_event(event)
+
     try:
         body = json.loads(event["body"]) if isinstance(event["body"], str) else event.get("body", {})
 
+        options = parse_options(body)
+        key = idempotency_key(event, body)
+
+        # Client tự upload ảnh lên S3, API chỉ cấp presigned POST
+        if body.get("mode") == "presigned":
+            return create_presigned_upload(options, body.get("content_type", "image/jpeg"), key)
+
+        # Nhiều ảnh trong một request
+        if "images" in body:
+            return handle_batch(body["images"], options, key)
+
         # Lấy ảnh từ base64
         image_base64 = body.get("image")
-        max_labels = body.get("max_labels", 10)
-        min_confidence = body.get("min_confidence", 40)
 
         if not image_base64:
             return {
@@ -39,45 +100,36 @@ def lambda_handler(event, context):
             }
         
         # Decode base64
-        image_data = base64.b64decode(image_base64)
-
-        # Tạo UUID cho job
-        job_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
-
-        # Upload ảnh lên S3
-        s3_key = f"uploads/{job_id}.jpg"
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=image_data,
-            ContentType='image/jpeg',
-        )
-
-        # Lưu thông tin job vào DynamoDB
-        table = dynamodb.Table(TABLE_NAME)
-        table.put_item(
-            Item={
-                'job_id': job_id,
-                's3_key': s3_key,
-                'status': 'PENDING',
-                'created_at': timestamp,
-                'max_labels': max_labels,
-                'min_confidence': min_confidence,
-            }
-        )
-
-        # Gửi message vào SQS
-        sqs.send_message(
-            QueueUrl=QUEUE_URL,
-            MessageBody=json.dumps({
-                'job_id': job_id,
-                's3_key': s3_key,
-                'bucket': BUCKET_NAME,
-                'max_labels': max_labels,
-                'min_confidence': min_confidence,
-            })
-        )
+        with metrics.timer('decode_base64'):
+            image_data = base64.b64decode(image_base64)
+        metrics.count('images')
+
+        # Request gửi lại với cùng Idempotency-Key: trả về job đã tạo, không upload/xử lý lại
+        job_id = fingerprint = None
+        if key:
+            job_id, fingerprint = idempotent_job_id(key), request_fingerprint(image_data, options)
+            existing = find_existing_job(job_id, fingerprint)
+            if existing:
+                return replayed_response(resend_pending(existing))
+
+        # Upload ảnh (hoặc dùng lại kết quả từ cache), lưu job và gửi message vào SQS
+        job, message, cached_labels = prepare_image(image_data, options, job_index.now(), job_id)
+        if fingerprint:
+            job['request_hash'] = fingerprint
+            keep_pending_message(job, message)
+        existing = put_job(job, conditional=bool(key))
+        if existing:
+            return replayed_response(resend_pending(existing))
+        if message:
+            with metrics.timer('sqs_send'):
+                sqs.send_message(
+                    QueueUrl=lanes.queue_url(message['priority']),
+                    MessageBody=json.dumps(message)
+                )
+            if key:
+                mark_enqueued(job['job_id'])
+        else:
+            complete_from_cache(job, cached_labels)
 
         return {
             'statusCode': 200,
@@ -86,12 +138,37 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Origin': '*',
             },
             'body': json.dumps({
-                'job_id': job_id,
-                'status': 'PENDING',
-                'message': 'Ảnh đã được upload thành công. Tiến hành phân tích...'
+                'job_id': job['job_id'],
+                'status': job['status'],
+                'message': 'Ảnh đã được upload thành công. Tiến hành phân tích...' if message
+                           else 'Ảnh đã được phân tích trước đó. Trả kết quả từ cache.'
             })
         }
-        
+
+    except IdempotencyConflict as e:
+        return {
+            'statusCode': 422,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': str(e)
+            })
+        }
+
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': str(e)
+            })
+        }
+
     except Exception as e:
         print(f"❌ Lỗi: {str(e)}")
         return {
@@ -103,4 +180,574 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'error': str(e)
             })
-        }
\ No newline at end of file
+        }
+
+def parse_options(body, defaults=None):
+    """Đọc tham số phân tích từ request (phần tử trong batch kế thừa tham số chung qua `defaults`)"""
+    options = dict(defaults or {'max_labels': 10, 'min_confidence': 40})
+    for key in ('max_labels', 'min_confidence', 'callback_url', 'render', 'tiled', 'priority'):
+        if key in body:
+            options[key] = body[key]
+
+    # Làn xử lý: job "bulk" đi hàng đợi riêng, không chắn job "interactive" (xem lanes.py)
+    options['priority'] = lanes.parse_priority(options.get('priority'))
+
+    for key in ('render', 'tiled'):
+        if not isinstance(options.get(key, False), bool):
+            raise ValueError(f'{key} must be a boolean')
+
+    # Kiểm tra ở đây để giá trị sai là lỗi 400, không phải decimal.InvalidOperation khi ghi job hay lỗi của Rekognition
+    max_labels = options['max_labels']
+    if not isinstance(max_labels, int) or isinstance(max_labels, bool) or not 1 <= max_labels <= MAX_LABELS_LIMIT:
+        raise ValueError(f'max_labels must be an integer between 1 and {MAX_LABELS_LIMIT}')
+    min_confidence = options['min_confidence']
+    if not isinstance(min_confidence, (int, float)) or isinstance(min_confidence, bool) or not 0 <= min_confidence <= 100:
+        raise ValueError('min_confidence must be a number between 0 and 100')
+
+    # Định dạng/chất lượng ảnh đã vẽ và thumbnail (xem image_output.OutputOptions)
+    if 'output' in body:
+        options['output'] = image_output.OutputOptions.from_dict(body['output']).to_dict()
+
+    # Job chuỗi khung hình (video, zip các frame, GIF/WebP động), xem sequence.SequenceOptions
+    if body.get('sequence') not in (None, False):
+        options['sequence'] = sequence.SequenceOptions.from_dict(body['sequence']).to_dict()
+        if options.get('tiled') or 'output' in options:
+            raise ValueError('sequence jobs do not support tiled or output')
+
+    if 'callback_url' in options and not notifier.is_valid_callback_url(options['callback_url']):
+        raise ValueError('callback_url must be an https:// URL on a public host')
+    return options
+
+def idempotency_key(event, body):
+    """Idempotency-Key từ header (tên header không phân biệt hoa/thường) hoặc `idempotency_key` trong body"""
+    headers = event.get('headers') or {}
+    key = next((value for name, value in headers.items() if name.lower() == 'idempotency-key'), None)
+    key = key or body.get('idempotency_key')
+    if key is not None and (not isinstance(key, str) or not 1 <= len(key) <= 255):
+        raise ValueError('Idempotency-Key must be a string of 1-255 characters')
+    return key
+
+def idempotent_job_id(key):
+    return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, key))
+
+def request_fingerprint(image_data, options):
+    """Hash của nội dung ảnh và tham số, để nhận ra Idempotency-Key bị dùng lại cho request khác"""
+    digest = hashlib.sha256(image_data)
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+def find_existing_job(job_id, fingerprint):
+    """Job đã tạo với cùng Idempotency-Key (None nếu chưa có); IdempotencyConflict nếu khác request"""
+    with metrics.timer('idempotency_lookup'):
+        item = dynamodb.Table(TABLE_NAME).get_item(Key={'job_id': job_id}, ConsistentRead=True).get('Item')
+    if item and item.get('request_hash') != fingerprint:
+        raise IdempotencyConflict('Idempotency-Key was already used for a different request')
+    return item
+
+def put_job(job, conditional=False):
+    """
+    Lưu job. Với `conditional`, chỉ ghi khi job_id chưa tồn tại (hai request cùng key đến đồng thời):
+    trả về job đã có thay vì ghi đè, None nếu ghi thành công.
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    if not conditional:
+        with metrics.timer('dynamodb_put'):
+            table.put_item(Item=job)
+        return None
+    try:
+        with metrics.timer('dynamodb_put'):
+            table.put_item(Item=job, ConditionExpression='attribute_not_exists(job_id)')
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return find_existing_job(job['job_id'], job.get('request_hash'))
+    return None
+
+def keep_pending_message(job, message):
+    """
+    Lưu message SQS trong item job cho tới khi gửi được (job có Idempotency-Key và job từ S3 event). Request/event
+    gửi lại sau khi lần trước lỗi giữa lúc ghi job và lúc gửi SQS sẽ thấy message này và gửi lại, thay vì trả về
+    một job PENDING không bao giờ được xử lý.
+    """
+    if message:
+        job['pending_message'] = json.dumps(message)
+    return job
+
+def mark_enqueued(job_id, requeued=False):
+    """
+    Xoá message đã lưu sau khi gửi SQS thành công. `requeued`: message được gửi lại cho job đã có, job bị đánh dấu
+    FAILED vì lỗi gửi trước đó trở về PENDING (job đã được Processing Lambda nhận thì giữ nguyên).
+    """
+    table = dynamodb.Table(TABLE_NAME)
+    try:
+        with metrics.timer('dynamodb_update'):
+            if not requeued:
+                table.update_item(Key={'job_id': job_id}, UpdateExpression='REMOVE pending_message')
+                return
+            table.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET #status = :pending, updated_at = :time REMOVE pending_message, error_message',
+                ConditionExpression='attribute_exists(pending_message) AND (#status = :pending OR #status = :failed)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':pending': 'PENDING', ':failed': 'FAILED', ':time': job_index.now()},
+            )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def resend_pending(job):
+    """Gửi lại message của job chưa từng vào được SQS (nếu có), trả về job với trạng thái hiện tại"""
+    if not job.get('pending_message'):
+        return job
+    message = json.loads(job['pending_message'])
+    with metrics.timer('sqs_send'):
+        sqs.send_message(QueueUrl=lanes.queue_url(message['priority']), MessageBody=job['pending_message'])
+    mark_enqueued(job['job_id'], requeued=True)
+    metrics.count('requeued')
+    return {**job, 'status': 'PENDING'} if job['status'] == 'FAILED' else job
+
+def replayed_response(job):
+    """Response cho request gửi lại: cùng job_id, trạng thái hiện tại của job"""
+    metrics.count('duplicates')
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Idempotent-Replayed': 'true',
+        },
+        'body': json.dumps({
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'message': 'Job đã được tạo trước đó với Idempotency-Key này.'
+        })
+    }
+
+def create_presigned_upload(options, content_type='image/jpeg', key=None):
+    """
+    Cấp presigned POST để client upload ảnh thẳng lên S3 (không qua Lambda/API Gateway).
+    Job chuỗi khung hình (video/zip) thường quá lớn cho API Gateway nên luôn đi đường này.
+    """
+    upload_types = sequence.SEQUENCE_TYPES if options.get('sequence') else image_output.UPLOAD_TYPES
+    if content_type not in upload_types:
+        raise ValueError(f"content_type must be one of: {', '.join(upload_types)}")
+    # Cùng Idempotency-Key thì cùng job_id và cùng key S3: upload lại chỉ ghi đè object, job chỉ được tạo một lần
+    job_id = idempotent_job_id(key) if key else str(uuid.uuid4())
+    s3_key = f"{PRESIGNED_PREFIX}{job_id}.{upload_types[content_type]}"
+
+    # Tham số phân tích đi kèm object dưới dạng metadata, được ký trong policy nên client không sửa được
+    fields = {
+        'Content-Type': content_type,
+        'x-amz-meta-max-labels': str(options['max_labels']),
+        'x-amz-meta-min-confidence': str(options['min_confidence']),
+        'x-amz-meta-priority': options['priority'],
+    }
+    if options.get('callback_url'):
+        fields['x-amz-meta-callback-url'] = options['callback_url']
+    if options.get('render') is False:
+        fields['x-amz-meta-render'] = 'false'
+    if options.get('tiled'):
+        fields['x-amz-meta-tiled'] = 'true'
+    if options.get('output'):
+        fields['x-amz-meta-output'] = json.dumps(options['output'], separators=(',', ':'))
+    if options.get('sequence'):
+        fields['x-amz-meta-sequence'] = json.dumps(options['sequence'], separators=(',', ':'))
+    conditions = [{key: value} for key, value in fields.items()]
+    conditions.append(['content-length-range', 1, MAX_SEQUENCE_BYTES if options.get('sequence') else MAX_UPLOAD_BYTES])
+
+    presigned = s3.generate_presigned_post(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=PRESIGNED_EXPIRES,
+    )
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps({
+            'job_id': job_id,
+            'status': 'WAITING_UPLOAD',
+            'upload': presigned,
+            'message': 'Upload ảnh bằng multipart POST tới upload.url kèm upload.fields (field file đặt cuối cùng).'
+        })
+    }
+
+def handle_s3_event(event):
+    """Tạo job và gửi vào SQS khi ảnh upload bằng presigned POST xuất hiện trên S3"""
+    for record in event["Records"]:
+        bucket = record["s3"]["bucket"]["name"]
+        s3_key = unquote_plus(record["s3"]["object"]["key"])
+        if not s3_key.startswith(PRESIGNED_PREFIX):
+            continue
+
+        job_id = s3_key[len(PRESIGNED_PREFIX):].rsplit('.', 1)[0]
+        metrics.count('images')
+        # Đọc metadata cùng các byte đầu của object: content type lấy từ nội dung, không tin Content-Type client khai báo
+        with metrics.timer('s3_get'):
+            head = s3.get_object(Bucket=bucket, Key=s3_key, Range=f'bytes=0-{SNIFF_BYTES - 1}')
+            prefix = head["Body"].read()
+        metadata = head["Metadata"]
+        options = {
+            'max_labels': int(metadata.get('max-labels', 10)),
+            'min_confidence': json.loads(metadata.get('min-confidence', '40')),
+            'priority': lanes.parse_priority(metadata.get('priority')),
+        }
+        if metadata.get('callback-url'):
+            options['callback_url'] = metadata['callback-url']
+        if metadata.get('render') == 'false':
+            options['render'] = False
+        if metadata.get('tiled') == 'true':
+            options['tiled'] = True
+        if metadata.get('output'):
+            options['output'] = json.loads(metadata['output'])
+        if metadata.get('sequence'):
+            options['sequence'] = json.loads(metadata['sequence'])
+
+        if options.get('sequence'):
+            content_type = sequence.sniff_content_type(prefix)
+            supported = content_type in sequence.SEQUENCE_TYPES
+        else:
+            content_type = image_output.sniff_content_type(prefix)
+            supported = content_type in image_output.UPLOAD_TYPES
+        if not supported:
+            # Client đã có job_id từ presigned POST: ghi job FAILED để /status trả lỗi thay vì không bao giờ có job
+            job = {**new_job(job_id, s3_key, options, job_index.now()), 'status': 'FAILED',
+                   'error_message': f"Unsupported {'sequence' if options.get('sequence') else 'image'} format"}
+            put_job(job, conditional=True)
+            metrics.count('errors')
+            print(f"Job {job_id} rejected: {s3_key} is not a supported format ({content_type}).")
+            continue
+
+        # S3 có thể gửi một event nhiều lần (hoặc client upload lại cùng key): chỉ tạo job ở lần đầu.
+        # Job mà lần trước chưa gửi được vào SQS thì được gửi lại thay vì bỏ qua.
+        message = new_message(job_id, s3_key, bucket, options, content_type=content_type)
+        existing = put_job(keep_pending_message(new_job(job_id, s3_key, options, job_index.now(), content_type=content_type), message),
+                           conditional=True)
+        if existing:
+            metrics.count('duplicates')
+            if existing.get('pending_message'):
+                resend_pending(existing)
+                print(f"Job {job_id} was never enqueued, sent it again.")
+            else:
+                print(f"Job {job_id} already exists, skipping duplicate S3 event.")
+            continue
+        with metrics.timer('sqs_send'):
+            sqs.send_message(
+                QueueUrl=lanes.queue_url(options['priority']),
+                MessageBody=json.dumps(message)
+            )
+        mark_enqueued(job_id)
+        print(f"Job {job_id} created from S3 upload {s3_key}.")
+
+    return {'statusCode': 200}
+
+def prepare_image(image_data, options, timestamp, job_id=None):
+    """
+    Upload ảnh lên S3 và tạo job + message SQS tương ứng (job_id mới nếu không truyền vào).
+    Trả về (job, message, labels); khi job đã hoàn thành ngay từ cache thì message là None
+    và labels là nhãn dạng compact lấy từ cache (None trong các trường hợp khác).
+    """
+    if options.get('sequence'):
+        return prepare_sequence(image_data, options, timestamp, job_id)
+
+    # Content type lấy từ nội dung file, không tin client
+    content_type = image_output.sniff_content_type(image_data)
+    if content_type not in image_output.UPLOAD_TYPES:
+        raise ValueError(f"Unsupported image format{f' ({content_type})' if content_type else ''}")
+    extension = image_output.UPLOAD_TYPES[content_type]
+
+    job_id = job_id or str(uuid.uuid4())
+    s3_key = f"uploads/{job_id}.{extension}"
+    content_hash = None
+    existing_key = None
+
+    if result_cache.is_enabled():
+        # Ảnh giống nhau dùng chung một object trên S3
+        with metrics.timer('hash'):
+            content_hash = result_cache.content_hash(image_data)
+        s3_key = f"uploads/{content_hash}.{extension}"
+
+        # Kết quả chế độ tile không dùng chung cache với một lần gọi
+        with metrics.timer('cache_lookup'):
+            cached = None if options.get('tiled') else result_cache.lookup(content_hash, options['max_labels'], options['min_confidence'])
+        # Ảnh đã vẽ trong cache luôn theo định dạng mặc định nên chỉ dùng lại khi request không chọn `output`
+        if cached and cached[2] and options.get('render', True) and not options.get('output') and cached[0].get('processed_s3_key'):
+            # Trùng cả ảnh lẫn tham số: hoàn thành job ngay từ cache, không cần xử lý lại
+            entry = cached[0]
+            job = new_job(job_id, entry['s3_key'], options, timestamp, content_hash, content_type)
+            job.update({
+                'status': 'COMPLETED',
+                'completed_at': job_index.now(),
+                'processed_s3_key': entry['processed_s3_key'],
+                **label_codec.encode_job_labels(cached[1]),
+                'cache_hit': True,
+            })
+            return job, None, cached[1]
+        # Dùng lại object đã có (key cũ có thể khác phần mở rộng)
+        with metrics.timer('cache_lookup'):
+            existing_key = cached[0]['s3_key'] if cached else result_cache.find_image(content_hash)
+
+    # Upload ảnh lên S3 (bỏ qua nếu ảnh đã có sẵn)
+    if existing_key:
+        s3_key = existing_key
+    else:
+        with metrics.timer('s3_put'):
+            s3.put_object(
+                Bucket=BUCKET_NAME,
+                Key=s3_key,
+                Body=image_data,
+                ContentType=content_type,
+            )
+
+    job = new_job(job_id, s3_key, options, timestamp, content_hash, content_type)
+    return job, new_message(job_id, s3_key, BUCKET_NAME, options, content_hash, content_type), None
+
+def prepare_sequence(data, options, timestamp, job_id=None):
+    """Upload video/zip/ảnh động của job chuỗi khung hình (không dùng cache kết quả theo nội dung)"""
+    content_type = sequence.sniff_content_type(data)
+    if content_type is None:
+        raise ValueError(f"Unsupported sequence format (allowed: {', '.join(sequence.SEQUENCE_TYPES)})")
+    job_id = job_id or str(uuid.uuid4())
+    s3_key = f"uploads/{job_id}.{sequence.SEQUENCE_TYPES[content_type]}"
+    with metrics.timer('s3_put'):
+        s3.put_object(Bucket=BUCKET_NAME, Key=s3_key, Body=data, ContentType=content_type)
+    job = new_job(job_id, s3_key, options, timestamp, content_type=content_type)
+    return job, new_message(job_id, s3_key, BUCKET_NAME, options, content_type=content_type), None
+
+def handle_batch(entries, options, key=None):
+    """
+    Nhận nhiều ảnh (base64 trong `image` hoặc object có sẵn trong bucket qua `s3_key`) trong một request.
+    Job được ghi bằng batch_write_item, message được gửi bằng send_message_batch theo nhóm 10.
+    Mỗi phần tử có thể có `idempotency_key` riêng; Idempotency-Key của request áp dụng cho phần tử thứ i
+    dưới dạng "<key>:<i>". Job có key được ghi có điều kiện từng cái một.
+    """
+    if not isinstance(entries, list) or not entries or len(entries) > MAX_BATCH_SIZE:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+            },
+            'body': json.dumps({
+                'error': f'images must be a list of 1-{MAX_BATCH_SIZE} items'
+            })
+        }
+
+    timestamp = job_index.now()
+
+    def prepare_entry(index, entry):
+        """Trả về (job, message, nhãn từ cache, replayed)"""
+        entry_options = parse_options(entry, options)
+        entry_key = idempotency_key({}, entry) or (f"{key}:{index}" if key else None)
+        if entry.get("image"):
+            image_data = base64.b64decode(entry["image"])
+        elif entry.get("s3_key"):
+            image_data = source_key(entry["s3_key"]).encode('utf-8')
+        else:
+            raise ValueError('Missing image data')
+
+        job_id = fingerprint = None
+        if entry_key:
+            job_id, fingerprint = idempotent_job_id(entry_key), request_fingerprint(image_data, entry_options)
+            existing = find_existing_job(job_id, fingerprint)
+            if existing:
+                return existing, None, None, True
+
+        if entry.get("image"):
+            job, message, cached_labels = prepare_image(image_data, entry_options, timestamp, job_id)
+        else:
+            cached_labels = None
+            job_id = job_id or str(uuid.uuid4())
+            job = new_job(job_id, entry["s3_key"], entry_options, timestamp)
+            message = new_message(job_id, entry["s3_key"], BUCKET_NAME, entry_options)
+        if fingerprint:
+            job['request_hash'] = fingerprint
+            keep_pending_message(job, message)
+        return job, message, cached_labels, False
+
+    # Upload các ảnh lên S3 song song. Mỗi luồng chạy trong context của request nên hit/miss cache và thời gian
+    # các bước của từng ảnh được cộng dồn vào metrics của request (`prepare` là thời gian của cả bước)
+    metrics.count('images', len(entries))
+    jobs, messages, errors, replayed, cached_labels = [], {}, [], set(), {}
+    with metrics.timer('prepare'), ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, prepare_entry, index, entry) for index, entry in enumerate(entries)]
+        for index, future in enumerate(futures):
+            try:
+                job, message, labels, is_replay = future.result()
+            except Exception as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            jobs.append(job)
+            if is_replay:
+                replayed.add(job['job_id'])
+                # Lần trước lỗi sau khi ghi job nhưng trước khi gửi SQS: gửi lại message đã lưu
+                if job.get('pending_message'):
+                    messages[job['job_id']] = json.loads(job['pending_message'])
+            elif message:
+                messages[job['job_id']] = message
+            elif labels is not None:
+                cached_labels[job['job_id']] = labels
+
+    # batch_writer gom put_item thành batch_write_item (25 item/lần) và tự gửi lại UnprocessedItems
+    metrics.count('errors', len(errors))
+    new_jobs = [job for job in jobs if job['job_id'] not in replayed]
+    table = dynamodb.Table(TABLE_NAME)
+    with metrics.timer('dynamodb_put'), table.batch_writer() as writer:
+        for job in new_jobs:
+            if 'request_hash' not in job:
+                writer.put_item(Item=job)
+
+    # Job có Idempotency-Key: ghi có điều kiện, job đã có (request trùng đến đồng thời) thay cho job mới
+    keyed = [job for job in new_jobs if 'request_hash' in job]
+    if keyed:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            for job, existing in zip(keyed, executor.map(lambda job: put_job(job, conditional=True), keyed)):
+                if existing:
+                    replayed.add(job['job_id'])
+                    messages.pop(job['job_id'], None)
+                    job.update(status=existing['status'])
+    metrics.count('duplicates', len(replayed))
+
+    for job in jobs:
+        if job['status'] == 'COMPLETED' and job['job_id'] not in replayed:
+            complete_from_cache(job, cached_labels.get(job['job_id']))
+
+    with metrics.timer('sqs_send'):
+        failed_job_ids = send_messages(list(messages.values()))
+    for job_id in failed_job_ids:
+        update_job_status(job_id, 'FAILED', 'Failed to enqueue job')
+    # Job có Idempotency-Key: xoá message đã lưu khi đã gửi được (job gửi lại từ request trước trở về PENDING)
+    enqueued = [job for job in jobs if job['job_id'] in messages and job['job_id'] not in failed_job_ids
+                and 'request_hash' in job]
+    if enqueued:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            list(executor.map(lambda job: mark_enqueued(job['job_id'], requeued=job['job_id'] in replayed), enqueued))
+        for job in enqueued:
+            if job['job_id'] in replayed and job['status'] == 'FAILED':
+                job['status'] = 'PENDING'
+
+    statuses = {job['job_id']: job['status'] for job in jobs}
+    statuses.update({job_id: 'FAILED' for job_id in failed_job_ids})
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+        },
+        'body': json.dumps({
+            'jobs': [
+                {'job_id': job['job_id'], 'status': statuses[job['job_id']], **({'replayed': True} if job['job_id'] in replayed else {})}
+                for job in jobs
+            ],
+            'errors': errors,
+        })
+    }
+
+def source_key(s3_key):
+    """Key S3 của phần tử batch, ValueError nếu nằm ngoài BATCH_SOURCE_PREFIX"""
+    if not BATCH_SOURCE_PREFIX:
+        raise ValueError('s3_key entries are disabled')
+    if (not isinstance(s3_key, str) or not s3_key.startswith(BATCH_SOURCE_PREFIX) or s3_key.startswith(RESERVED_PREFIXES)
+            or '..' in s3_key.split('/')):
+        raise ValueError(f's3_key must be an object under {BATCH_SOURCE_PREFIX}')
+    return s3_key
+
+def complete_from_cache(job, labels):
+    """
+    Job hoàn thành ngay từ cache vẫn được thêm vào chỉ mục nhãn và gửi thông báo như job được xử lý bình thường
+    """
+    if labels is not None and label_index.is_enabled():
+        try:
+            with metrics.timer('label_index'):
+                label_index.index_job(job['job_id'], labels, job_index.to_iso(job['completed_at']))
+        except Exception as e:
+            metrics.count('label_index_errors')
+            print(f"Failed to index labels of job {job['job_id']}: {e}")
+    notifier.notify_completed(
+        job['job_id'],
+        job.get('callback_url'),
+        labels or [],
+        BUCKET_NAME,
+        job.get('processed_s3_key'),
+        cache_hit=True,
+    )
+
+def send_messages(messages):
+    """
+    Gửi message vào hàng đợi của từng làn theo nhóm 10 (giới hạn của send_message_batch),
+    trả về job_id gửi thất bại
+    """
+    by_queue = {}
+    for message in messages:
+        by_queue.setdefault(lanes.queue_url(message['priority']), []).append(message)
+
+    failed_job_ids = []
+    for queue_url, queue_messages in by_queue.items():
+        for start in range(0, len(queue_messages), 10):
+            chunk = queue_messages[start:start + 10]
+            response = sqs.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {'Id': str(index), 'MessageBody': json.dumps(message)}
+                    for index, message in enumerate(chunk)
+                ]
+            )
+            failed_job_ids.extend(chunk[int(failure['Id'])]['job_id'] for failure in response.get('Failed', []))
+    return failed_job_ids
+
+def new_job(job_id, s3_key, options, timestamp, content_hash=None, content_type=None):
+    """Tạo item job PENDING để lưu vào DynamoDB (thời gian là epoch giây, sort key của GSI status/created_at)"""
+    job = {
+        'job_id': job_id,
+        's3_key': s3_key,
+        'status': 'PENDING',
+        'created_at': timestamp,
+        'updated_at': timestamp,
+        **options,
+        'min_confidence': Decimal(str(options['min_confidence'])),
+    }
+    if 'sequence' in options:
+        job['sequence'] = {name: Decimal(str(value)) for name, value in options['sequence'].items()}
+    if content_hash:
+        job['content_hash'] = content_hash
+    if content_type:
+        job['content_type'] = content_type
+    return job
+
+def new_message(job_id, s3_key, bucket, options, content_hash=None, content_type=None):
+    """Tạo message SQS cho Processing Lambda"""
+    message = {
+        'job_id': job_id,
+        's3_key': s3_key,
+        'bucket': bucket,
+        **options,
+    }
+    if content_hash:
+        message['content_hash'] = content_hash
+    if content_type:
+        message['content_type'] = content_type
+    return message
+
+def update_job_status(job_id, status, error=None):
+    """Update job status trong DynamoDB"""
+    table = dynamodb.Table(TABLE_NAME)
+    update_expr = 'SET #status = :status, updated_at = :time'
+    expr_values = {':status': status, ':time': job_index.now()}
+    expr_names = {'#status': 'status'}
+
+    if error:
+        update_expr += ', error_message = :error'
+        expr_values[':error'] = error
+
+    table.update_item(
+        Key={'job_id': job_id},
+        UpdateExpression=update_expr,
+        ExpressionAttributeNames=expr_names,
+        ExpressionAttributeValues=expr_values
+    )
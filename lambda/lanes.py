@@ -0,0 +1,57 @@
+import os
+import clients
+import metrics
+
+# Làn ưu tiên của job: "interactive" (người dùng đang chờ) và "bulk" (backfill, xử lý hàng loạt).
+# Mỗi làn có hàng đợi SQS riêng nên job interactive không bao giờ nằm sau hàng nghìn job bulk trong cùng hàng đợi.
+# Phần năng lực xử lý của mỗi làn do trigger SQS của Processing Lambda quyết định (Maximum concurrency của
+# trigger bulk nhỏ), không có bộ lập lịch trong code.
+LANES = ('interactive', 'bulk')
+DEFAULT_LANE = os.environ.get('DEFAULT_PRIORITY', 'interactive')
+if DEFAULT_LANE not in LANES:
+    # Lỗi cấu hình: báo ngay lúc init thay vì gửi mọi job vào một làn không tồn tại
+    raise ValueError(f"DEFAULT_PRIORITY must be one of: {', '.join(LANES)} (got {DEFAULT_LANE!r})")
+
+# Biến môi trường chứa URL hàng đợi của từng làn; làn chưa cấu hình dùng chung QUEUE_URL
+LANE_QUEUE_ENV = {'interactive': 'QUEUE_URL', 'bulk': 'BULK_QUEUE_URL'}
+
+sqs = clients.lazy_client('sqs')
+
+def parse_priority(value) -> str:
+    """Làn của request từ field `priority` (None = DEFAULT_LANE), ValueError nếu không hợp lệ"""
+    if value is None:
+        return DEFAULT_LANE
+    if value not in LANES:
+        raise ValueError(f"priority must be one of: {', '.join(LANES)}")
+    return value
+
+def queue_url(lane: str) -> str | None:
+    return os.environ.get(LANE_QUEUE_ENV[lane]) or os.environ.get('QUEUE_URL')
+
+def queue_urls() -> dict[str, str]:
+    """URL hàng đợi của từng làn đã cấu hình"""
+    return {lane: queue_url(lane) for lane in LANES if queue_url(lane)}
+
+def queue_depths() -> dict[str, dict]:
+    """
+    Số message đang chờ (`visible`), đang được xử lý (`in_flight`) và đang delay của từng làn,
+    đồng thời ghi gauge `queue_depth_<làn>` vào metrics của request hiện tại
+    """
+    depths = {}
+    urls = queue_urls()
+    for lane, url in urls.items():
+        with metrics.timer('sqs_attributes'):
+            attributes = sqs.get_queue_attributes(
+                QueueUrl=url,
+                AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible',
+                                'ApproximateNumberOfMessagesDelayed'],
+            )['Attributes']
+        depths[lane] = {
+            'visible': int(attributes.get('ApproximateNumberOfMessages', 0)),
+            'in_flight': int(attributes.get('ApproximateNumberOfMessagesNotVisible', 0)),
+            'delayed': int(attributes.get('ApproximateNumberOfMessagesDelayed', 0)),
+            # Hai làn dùng chung một hàng đợi (chưa cấu hình BULK_QUEUE_URL): số liệu là của cả hàng đợi
+            'shared_queue': list(urls.values()).count(url) > 1,
+        }
+        metrics.gauge(f'queue_depth_{lane}', depths[lane]['visible'], 'Count')
+    return depths
@@ -0,0 +1,183 @@
+import json
+import os
+import hmac
+import hashlib
+import ipaddress
+import socket
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import clients
+import label_codec
+
+sns = clients.lazy_client("sns")
+s3 = clients.lazy_client("s3")
+
+# Khoá ký HMAC cho webhook (client dùng để xác thực request đến từ hệ thống)
+CALLBACK_SECRET = os.environ.get('CALLBACK_SECRET')
+CALLBACK_TIMEOUT = float(os.environ.get('CALLBACK_TIMEOUT', '3'))
+# Thời hạn (giây) của URL ảnh đã vẽ trong thông báo COMPLETED
+PROCESSED_URL_EXPIRES = 3600
+
+# SNS topic nhận mọi thông báo hoàn thành (để fan-out sang WebSocket/SSE, email, SQS của client...)
+NOTIFY_TOPIC_ARN = os.environ.get('NOTIFY_TOPIC_ARN')
+
+# Chỉ gửi callback tới các host này (phân cách bởi dấu phẩy, ".example.com" gồm mọi subdomain);
+# để trống thì nhận mọi tên miền công khai
+CALLBACK_ALLOWED_HOSTS = [host.strip().lower() for host in os.environ.get('CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+SIGNATURE_HEADER = 'X-Rekognition-Signature'
+
+# Tên miền chỉ có nghĩa trong mạng nội bộ
+INTERNAL_SUFFIXES = ('.localhost', '.local', '.internal', '.intranet', '.lan', '.home.arpa')
+
+def is_valid_callback_url(callback_url):
+    """
+    Chỉ chấp nhận callback HTTPS tới một tên miền công khai (hoặc nằm trong CALLBACK_ALLOWED_HOSTS).
+    Địa chỉ IP, localhost và tên nội bộ bị từ chối để callback không gọi được vào mạng nội bộ
+    hay endpoint metadata của Lambda (SSRF).
+    """
+    if not isinstance(callback_url, str):
+        return False
+    try:
+        parts = urlsplit(callback_url)
+        parts.port
+    except ValueError:
+        return False
+    host = (parts.hostname or '').rstrip('.')
+    if parts.scheme != 'https' or not host or parts.username is not None:
+        return False
+    if CALLBACK_ALLOWED_HOSTS:
+        return is_allowed_host(host)
+    return '.' in host and not is_ip_literal(host) and not host.endswith(INTERNAL_SUFFIXES)
+
+def is_allowed_host(host):
+    return any(host == allowed or (allowed.startswith('.') and host.endswith(allowed)) for allowed in CALLBACK_ALLOWED_HOSTS)
+
+def is_ip_literal(host):
+    """Host là địa chỉ IP, kể cả các dạng viết tắt mà resolver vẫn nhận (127.1, 0x7f000001...)"""
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        pass
+    try:
+        socket.inet_aton(host)
+        return True
+    except OSError:
+        return False
+
+def resolves_to_public(host, port):
+    """Mọi địa chỉ của host đều là địa chỉ công khai (không loopback/private/link-local/reserved)"""
+    addresses = {info[4][0].split('%')[0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    return bool(addresses) and all(ipaddress.ip_address(address).is_global for address in addresses)
+
+def notify_job(job_id, status, callback_url=None, **fields):
+    """
+    Gửi thông báo khi job chuyển sang COMPLETED/FAILED.
+    Lỗi khi gửi thông báo chỉ được log, không làm hỏng job.
+    """
+    payload = {'job_id': job_id, 'status': status, 'notified_at': datetime.now(timezone.utc).isoformat(), **fields}
+
+    if local_notifier is not None:
+        local_notifier.deliver(callback_url, payload)
+        return
+
+    if callback_url:
+        try:
+            post_callback(callback_url, payload)
+        except Exception as e:
+            print(f"❌ Không gửi được callback cho job {job_id}: {str(e)}")
+
+    if NOTIFY_TOPIC_ARN:
+        try:
+            sns.publish(
+                TopicArn=NOTIFY_TOPIC_ARN,
+                Message=json.dumps(payload),
+                MessageAttributes={
+                    'job_id': {'DataType': 'String', 'StringValue': job_id},
+                    'status': {'DataType': 'String', 'StringValue': status},
+                },
+            )
+        except Exception as e:
+            print(f"❌ Không publish được thông báo cho job {job_id}: {str(e)}")
+
+def notify_completed(job_id, callback_url, compact_labels, bucket=None, processed_s3_key=None, **fields):
+    """
+    Thông báo COMPLETED với cùng payload dù job được xử lý hay hoàn thành ngay từ cache: nhãn từng instance,
+    nhãn cả ảnh (label_codec) và URL đã ký của ảnh đã vẽ nếu có.
+    """
+    if not (callback_url or NOTIFY_TOPIC_ARN or local_notifier is not None):
+        return
+    if processed_s3_key:
+        fields['processed_image_url'] = s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': processed_s3_key},
+            ExpiresIn=PROCESSED_URL_EXPIRES,
+        )
+    notify_job(
+        job_id,
+        'COMPLETED',
+        callback_url,
+        labels=label_codec.flatten_labels(compact_labels),
+        image_labels=label_codec.image_labels(compact_labels),
+        **fields,
+    )
+
+def post_callback(callback_url, payload):
+    """
+    POST payload JSON tới callback URL, ký HMAC-SHA256 nếu có CALLBACK_SECRET. Tên miền phải trỏ tới địa chỉ
+    công khai ngay lúc gửi (URL hợp lệ lúc submit vẫn có thể đổi DNS sang IP nội bộ) và redirect không được theo.
+    """
+    # Import khi cần: phần lớn job không có callback URL
+    import urllib.request
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    if not is_valid_callback_url(callback_url):
+        raise ValueError('callback_url is not allowed')
+    parts = urlsplit(callback_url)
+    if not CALLBACK_ALLOWED_HOSTS and not resolves_to_public(parts.hostname, parts.port or 443):
+        raise ValueError(f'callback host {parts.hostname} resolves to a non-public address')
+
+    body = json.dumps(payload).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if CALLBACK_SECRET:
+        headers[SIGNATURE_HEADER] = sign(body)
+
+    request = urllib.request.Request(callback_url, data=body, headers=headers, method='POST')
+    with urllib.request.build_opener(NoRedirect).open(request, timeout=CALLBACK_TIMEOUT) as response:
+        return response.status
+
+def sign(body):
+    """Chữ ký HMAC-SHA256 của body"""
+    return 'sha256=' + hmac.new(CALLBACK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+class LocalNotifier:
+    """Thay thế webhook/SNS khi chạy local: giữ thông báo trong bộ nhớ và cho phép chờ theo job_id"""
+
+    def __init__(self):
+        self.notifications = {}
+        self._condition = threading.Condition()
+
+    def deliver(self, callback_url, payload):
+        with self._condition:
+            self.notifications[payload['job_id']] = payload
+            self._condition.notify_all()
+
+    def wait(self, job_id, timeout=None):
+        """Chờ tới khi job có thông báo, trả về payload hoặc None nếu hết thời gian"""
+        with self._condition:
+            self._condition.wait_for(lambda: job_id in self.notifications, timeout=timeout)
+            return self.notifications.get(job_id)
+
+# Được gán bởi install_local_notifier() khi chạy local
+local_notifier = None
+
+def install_local_notifier():
+    """Chuyển mọi thông báo sang LocalNotifier trong bộ nhớ"""
+    global local_notifier
+    local_notifier = LocalNotifier()
+    return local_notifier
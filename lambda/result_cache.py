@@ -0,0 +1,123 @@
+import json
+import os
+import hashlib
+from decimal import Decimal
+import clients
+import metrics
+
+dynamodb = clients.lazy_resource("dynamodb")
+
+# Bảng cache: partition key `content_hash` (String), sort key `params` (String)
+CACHE_TABLE_NAME = os.environ.get('CACHE_TABLE_NAME')
+
+def is_enabled():
+    """Cache chỉ bật khi đã cấu hình CACHE_TABLE_NAME"""
+    return bool(CACHE_TABLE_NAME)
+
+def content_hash(image_bytes):
+    """Tính SHA-256 của bytes ảnh đã decode"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def cache_params(max_labels, min_confidence):
+    """Sort key của một lần chạy Rekognition"""
+    return f"{int(max_labels)}#{float(min_confidence):g}"
+
+def compact_labels(response_labels):
+    """Rút gọn response['Labels'] của Rekognition để lưu vào cache"""
+    labels = []
+    for label_data in response_labels:
+        labels.append({
+            'name': label_data["Name"],
+            'confidence': label_data["Confidence"],
+            'instances': [
+                {'bounding_box': instance["BoundingBox"], 'confidence': instance.get("Confidence")}
+                for instance in label_data.get("Instances", [])
+                if instance.get("BoundingBox")
+            ],
+        })
+    return labels
+
+def filter_labels(labels, max_labels, min_confidence):
+    """Lọc kết quả đã cache theo tham số của request (giống cách DetectLabels áp dụng MinConfidence/MaxLabels)"""
+    kept = [label for label in labels if label['confidence'] >= min_confidence]
+    kept.sort(key=lambda label: label['confidence'], reverse=True)
+    return kept[:int(max_labels)]
+
+def can_serve(entry, max_labels, min_confidence):
+    """
+    Một lần chạy đã cache có thể phục vụ request nếu ngưỡng confidence của nó thấp hơn hoặc bằng
+    và nó trả về đủ nhãn (MaxLabels lớn hơn hoặc bằng, hoặc Rekognition đã trả về ít hơn MaxLabels)
+    """
+    if float(entry['min_confidence']) > float(min_confidence):
+        return False
+    if int(entry['max_labels']) >= int(max_labels):
+        return True
+    return int(entry['label_count']) < int(entry['max_labels'])
+
+def lookup(image_hash, max_labels, min_confidence, record=True):
+    """
+    Tìm kết quả đã cache cho ảnh. Trả về (entry, labels, exact) hoặc None.
+    `exact` = True khi tham số trùng khớp, có thể dùng lại luôn ảnh đã vẽ.
+    `record` = False để không tính lần tra này vào bộ đếm hit/miss (metrics cache_hits/cache_misses).
+    """
+    table = dynamodb.Table(CACHE_TABLE_NAME)
+    response = table.query(
+        KeyConditionExpression='content_hash = :hash',
+        ExpressionAttributeValues={':hash': image_hash},
+    )
+    entries = response.get('Items', [])
+
+    params = cache_params(max_labels, min_confidence)
+    exact = next((entry for entry in entries if entry['params'] == params), None)
+    if exact:
+        if record:
+            record_lookup(True)
+        return exact, json.loads(exact['labels']), True
+
+    # Ưu tiên lần chạy có ngưỡng gần nhất để ít phải lọc nhất
+    candidates = [entry for entry in entries if can_serve(entry, max_labels, min_confidence)]
+    if candidates:
+        entry = max(candidates, key=lambda entry: float(entry['min_confidence']))
+        labels = filter_labels(json.loads(entry['labels']), max_labels, min_confidence)
+        if record:
+            record_lookup(True)
+        return entry, labels, False
+
+    if record:
+        record_lookup(False)
+    return None
+
+def find_image(image_hash):
+    """Key S3 của ảnh nếu ảnh đã từng được upload (có ít nhất một entry trong cache), None nếu chưa"""
+    table = dynamodb.Table(CACHE_TABLE_NAME)
+    response = table.query(
+        KeyConditionExpression='content_hash = :hash',
+        ExpressionAttributeValues={':hash': image_hash},
+        ProjectionExpression='content_hash, s3_key',
+        Limit=1,
+    )
+    items = response.get('Items')
+    return items[0].get('s3_key') if items else None
+
+def store(image_hash, s3_key, max_labels, min_confidence, labels, processed_s3_key):
+    """Lưu kết quả của một lần chạy Rekognition vào cache (processed_s3_key = None khi chưa vẽ ảnh)"""
+    item = {
+        'content_hash': image_hash,
+        'params': cache_params(max_labels, min_confidence),
+        's3_key': s3_key,
+        'max_labels': int(max_labels),
+        'min_confidence': Decimal(str(float(min_confidence))),
+        'label_count': len(labels),
+        'labels': json.dumps(labels),
+    }
+    if processed_s3_key:
+        item['processed_s3_key'] = processed_s3_key
+    dynamodb.Table(CACHE_TABLE_NAME).put_item(Item=item)
+
+def record_lookup(hit):
+    """
+    Đếm hit/miss vào metrics (EMF) của job/request hiện tại. Không dùng bộ đếm trong bảng cache: mọi upload cùng
+    ghi vào một item sẽ thành partition nóng.
+    """
+    metrics.count('cache_hits', 1 if hit else 0)
+    metrics.count('cache_misses', 0 if hit else 1)
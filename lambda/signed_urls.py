@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.parse import quote
+import clients
+import metrics
+
+# URL ký có hiệu lực SIGNED_URL_TTL giây, được dùng lại tới khi chỉ còn SIGNED_URL_REFRESH_MARGIN giây
+SIGNED_URL_TTL = int(os.environ.get('SIGNED_URL_TTL', '3600'))
+SIGNED_URL_REFRESH_MARGIN = int(os.environ.get('SIGNED_URL_REFRESH_MARGIN', '300'))
+SIGNED_URL_CACHE_SIZE = int(os.environ.get('SIGNED_URL_CACHE_SIZE', '1024'))
+# "s3" (presigned URL của S3) hoặc "cloudfront" (signed URL qua CloudFront, cần thư viện cryptography)
+URL_SIGNER = os.environ.get('URL_SIGNER', 's3')
+
+class LRUCache:
+    """Dict giới hạn kích thước, thread-safe, bỏ phần tử ít được dùng gần đây nhất khi đầy"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+class S3UrlSigner:
+    """Presigned GET URL của S3"""
+
+    def __init__(self, client=None):
+        self.client = client or clients.lazy_client('s3')
+
+    def sign(self, bucket: str, key: str, expires_at: float) -> str:
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=max(1, int(expires_at - time.time())),
+        )
+
+class CloudFrontUrlSigner:
+    """Signed URL của CloudFront (canned policy) cho distribution trỏ vào bucket"""
+
+    def __init__(self, domain: str, key_pair_id: str, private_key_pem: str):
+        from botocore.signers import CloudFrontSigner
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        private_key = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+        self.domain = domain
+        self._signer = CloudFrontSigner(key_pair_id, lambda message: private_key.sign(message, padding.PKCS1v15(), hashes.SHA1()))
+
+    def sign(self, bucket: str, key: str, expires_at: float) -> str:
+        return self._signer.generate_presigned_url(
+            f'https://{self.domain}/{quote(key)}',
+            date_less_than=datetime.fromtimestamp(expires_at, timezone.utc),
+        )
+
+class SignedUrlCache:
+    """
+    Cache URL đã ký trong container, key là (bucket, key). Mỗi URL được ký với hạn `ttl` giây và dùng lại
+    cho mọi request tới khi chỉ còn `refresh_margin` giây, nên response của job đã xong giữ nguyên giữa các lần poll.
+    """
+
+    def __init__(self, signer, ttl: int = SIGNED_URL_TTL, refresh_margin: int = SIGNED_URL_REFRESH_MARGIN,
+                 maxsize: int = SIGNED_URL_CACHE_SIZE):
+        self.signer = signer
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+        self.cache = LRUCache(maxsize)
+
+    def get(self, bucket: str, key: str) -> tuple[str, float]:
+        """Trả về (url, thời điểm hết hạn dạng epoch giây)"""
+        now = time.time()
+        entry = self.cache.get((bucket, key))
+        if entry and entry[1] - now > self.refresh_margin:
+            metrics.count('signed_url_cache_hit')
+            return entry
+        metrics.count('signed_url_cache_miss')
+        expires_at = now + self.ttl
+        entry = (self.signer.sign(bucket, key, expires_at), expires_at)
+        self.cache.put((bucket, key), entry)
+        return entry
+
+    def url(self, bucket: str, key: str) -> str:
+        return self.get(bucket, key)[0]
+
+def from_env() -> SignedUrlCache:
+    """SignedUrlCache với signer chọn theo URL_SIGNER"""
+    if URL_SIGNER == 'cloudfront':
+        signer = CloudFrontUrlSigner(
+            os.environ['CLOUDFRONT_DOMAIN'],
+            os.environ['CLOUDFRONT_KEY_PAIR_ID'],
+            os.environ['CLOUDFRONT_PRIVATE_KEY'],
+        )
+    else:
+        signer = S3UrlSigner()
+    return SignedUrlCache(signer)
@@ -1,9 +1,17 @@
-import boto3
 from botocore.exceptions import ClientError
-from settings import get_settings
+import clients
 from pathlib import Path
-from PIL import Image, ImageDraw
-from dataclasses import dataclass
+from PIL import Image
+from dataclasses import dataclass, field
+import numpy as np
+import rendering
+import preprocessing
+import metrics
+from ratelimit import ThrottlingRetry
+import detection
+
+# botocore không tự retry DetectLabels (max_attempts=1), throttle và lỗi tạm thời được thử lại ở đây
+default_retry = ThrottlingRetry(max_retries=5)
 
 @dataclass
 class BoundingBox:
@@ -18,38 +26,67 @@ class Label:
     confidence: float
     bounding_box: BoundingBox
 
+@dataclass
+class ImageLabel:
+    """Nhãn của cả ảnh, kể cả nhãn không có box (câu trả lời của model phân loại local, nhãn cảnh)"""
+    name: str
+    confidence: float
+    instances: int = 0
+
 @dataclass
 class DetectionResponse:
     labels: list[Label]
-
-def detect_labels_from_local_file(image_path: Path, max_labels: int = 10, min_confidence: int = 40):
-    """Phát hiện nhãn từ ảnh trên máy local"""
+    image_labels: list[ImageLabel] = field(default_factory=list)
+    # Số lần gọi DetectLabels (kể cả retry khi bị throttle), 0 khi model local trả lời
+    attempts: int = 1
+
+def rekognition_backend(retry: ThrottlingRetry | None = default_retry) -> detection.RekognitionBackend:
+    # Client dùng chung, tạo một lần cho cả process
+    return detection.RekognitionBackend(lambda: clients.get_client("rekognition", max_attempts=1), retry)
+
+def detect_labels_from_local_file(image_path: Path, max_labels: int = 10, min_confidence: int = 40, max_edge: int | None = preprocessing.MAX_EDGE,
+                                  verbose: bool = True, raise_errors: bool = False, retry: ThrottlingRetry | None = default_retry,
+                                  backend=None):
+    """
+    Phát hiện nhãn từ ảnh trên máy local (ảnh lớn được thu nhỏ còn cạnh dài max_edge, None = gửi nguyên ảnh).
+    raise_errors=True ném lại lỗi thay vì in ra và trả về None; retry=None gọi DetectLabels đúng một lần.
+    `backend` (xem detection.py) thay cho DetectLabels, ví dụ cascade model local -> Rekognition hoặc
+    rekognition_backend(retry) dùng chung limiter; khi đó `retry` không được dùng. Retry chỉ gọi lại DetectLabels,
+    ảnh không bị đọc và thu nhỏ lại.
+    """
     try:
-        settings = get_settings()
-        rekognition = boto3.client(
-            "rekognition",
-            region_name=settings.aws_region,
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-        )
+        backend = backend or rekognition_backend(retry)
 
         # Đọc file ảnh dưới dạng bytes
-        with open(image_path, "rb") as image_file:
+        with metrics.timer("read"), open(image_path, "rb") as image_file:
             image_bytes = image_file.read()
 
-        # Gọi API DetectLabels
-        response = rekognition.detect_labels(
-            Image={"Bytes": image_bytes},
-            MaxLabels=max_labels,
-            MinConfidence=min_confidence,
-        )
+        # Thu nhỏ ảnh lớn để giảm dung lượng gửi đi và tránh ImageTooLargeException
+        if max_edge:
+            with metrics.timer("preprocess"):
+                prepared = preprocessing.prepare_bytes(image_bytes, max_edge)
+            if prepared.resized and verbose:
+                print(f"Thu nhỏ ảnh {prepared.original_width}x{prepared.original_height} -> {prepared.width}x{prepared.height} ({len(image_bytes) / 1024:.0f} KB -> {len(prepared.data) / 1024:.0f} KB)")
+            image_bytes = prepared.data
 
-        print(f"\n{'='*60}")
-        print(f"Kết quả phân tích ảnh: {image_path}")
-        print(f"{'='*60}\n")
+        # Gọi API DetectLabels (hoặc model local nếu backend là cascade)
+        detected = backend.detect(detection.DetectionImage.from_bytes(image_bytes), max_labels, min_confidence)
+
+        if verbose:
+            print(f"\n{'='*60}")
+            print(f"Kết quả phân tích ảnh: {image_path}")
+            if detected.source != "rekognition":
+                print(f"(trả lời bởi {detected.source}, không gọi Rekognition)")
+            print(f"{'='*60}\n")
 
         labels = []
-        for label_data in response["Labels"]:
+        image_labels = []
+        for label_data in detected.labels:
+            image_labels.append(ImageLabel(
+                name=label_data["Name"],
+                confidence=label_data["Confidence"],
+                instances=sum(1 for instance in label_data.get("Instances", []) if instance.get("BoundingBox")),
+            ))
             if label_data.get("Instances"):
                 for instance in label_data["Instances"]:
                     if instance.get("BoundingBox"):
@@ -66,17 +103,22 @@ def detect_labels_from_local_file(image_path: Path, max_labels: int = 10, min_co
                         )
                         labels.append(label_obj)
 
-        if not labels:
-            print("❌ Không tìm thấy đối tượng nào trong ảnh")
+        if not image_labels:
+            if verbose:
+                print("❌ Không tìm thấy đối tượng nào trong ảnh")
             return None
 
-        return DetectionResponse(labels=labels)
+        return DetectionResponse(labels=labels, image_labels=image_labels, attempts=detected.attempts)
 
     except FileNotFoundError:
+        if raise_errors:
+            raise
         print(f"❌ Lỗi: Không tìm thấy file '{image_path}'")
         return None
 
     except ClientError as e:
+        if raise_errors:
+            raise
         error_code = e.response["Error"]["Code"]
         error_message = e.response["Error"]["Message"]
 
@@ -91,64 +133,54 @@ def detect_labels_from_local_file(image_path: Path, max_labels: int = 10, min_co
         return None
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"❌ Lỗi không xác định: {str(e)}")
         return None
     
 
-def draw_bounding_box(image_path: Path, detection_response: DetectionResponse):
-    """Vẽ khung bao quanh từng đối tượng trong ảnh"""
+@metrics.timed("draw")
+def draw_bounding_box(image_path: Path, detection_response: DetectionResponse, iou_threshold: float = rendering.IOU_THRESHOLD,
+                      output_path: Path | None = None):
+    """Vẽ khung bao quanh từng đối tượng trong ảnh (các khung trùng nhau được gộp nhãn), mặc định lưu vào image/detected_<tên ảnh>"""
     image = Image.open(image_path)
-    draw = ImageDraw.Draw(image)
-    
-    # Lấy kích thước ảnh
-    img_width, img_height = image.size
 
-    bbox_dict = {}
-    
-    for label in detection_response.labels:
-        bbox_key = (round(label.bounding_box.left, 2), round(label.bounding_box.top, 2), round(label.bounding_box.width, 2), round(label.bounding_box.height, 2))
-        if bbox_key in bbox_dict:
-            continue
-        bbox_dict[bbox_key] = True
-        # Chuyển đổi từ tỷ lệ (0-1) sang pixel
-        left = label.bounding_box.left * img_width
-        top = label.bounding_box.top * img_height
-        width = label.bounding_box.width * img_width
-        height = label.bounding_box.height * img_height
-        
-        # Vẽ hình chữ nhật
-        draw.rectangle(
-            [left, top, left + width, top + height],
-            outline="red", 
-            width=3
-        )
-        
-        # Vẽ nhãn
-        draw.text(
-            (left, top - 10),  # Đặt text phía trên khung
-            f"{label.name} ({label.confidence:.1f}%)",
-            fill="white",
-        )
+    labels = detection_response.labels
+    names = [label.name for label in labels]
+    confidences = np.array([label.confidence for label in labels], dtype=np.float32)
+    boxes = np.array(
+        [[label.bounding_box.left, label.bounding_box.top, label.bounding_box.width, label.bounding_box.height] for label in labels],
+        dtype=np.float32,
+    ).reshape(-1, 4)
+    image = rendering.render_labels(image, names, confidences, boxes, iou_threshold)
     
     # Tạo thư mục nếu chưa có
-    output_path = Path(f"image/detected_{image_path.name}")
+    output_path = Path(output_path or f"image/detected_{image_path.name}")
     output_path.parent.mkdir(parents=True, exist_ok=True)
     image.save(output_path)
+    return output_path
 
 def main():
     # Ảnh nằm trong thư mục image/surreal.jpg
     image_path = Path("image/surreal.jpg")
-    detection_response = detect_labels_from_local_file(
-        image_path=image_path,
-        max_labels=10,
-        min_confidence=20,
-    )
-    if detection_response:
-        draw_bounding_box(image_path, detection_response)
-        print(f"ảnh đã được vẽ khung bao quanh đối tượng và lưu vào thư mục image/detected_{image_path.name}")
-    else:
-        print(f"❌ Không tìm thấy đối tượng nào trong ảnh: {image_path}")
-        return
+    # In thời gian từng bước (đọc file, thu nhỏ, DetectLabels, vẽ) dưới dạng một dòng JSON khi xong
+    with metrics.job("local", image=str(image_path)):
+        detection_response = detect_labels_from_local_file(
+            image_path=image_path,
+            max_labels=10,
+            min_confidence=20,
+        )
+        if detection_response:
+            for label in detection_response.image_labels:
+                print(f"  {label.name} - {label.confidence:.2f}%" + (f" ({label.instances} đối tượng)" if label.instances else ""))
+        if detection_response and detection_response.labels:
+            draw_bounding_box(image_path, detection_response)
+            print(f"ảnh đã được vẽ khung bao quanh đối tượng và lưu vào thư mục image/detected_{image_path.name}")
+        elif detection_response:
+            print("Không có đối tượng nào có khung bao, ảnh không được vẽ")
+        else:
+            print(f"❌ Không tìm thấy đối tượng nào trong ảnh: {image_path}")
+            return
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Tắt bằng METRICS_ENABLED=false; khi tắt, timer/count không làm gì và không in bản ghi nào
+ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'RekognitionPipeline')
+
+# Hàm nhận từng bản ghi đã emit (dùng cho benchmark hoặc script local)
+listeners = []
+
+_current = ContextVar('metrics', default=None)
+
+class Metrics:
+    """
+    Số liệu của một job/request: thời gian từng bước (ms), bộ đếm và thuộc tính.
+    emit() in một dòng JSON theo CloudWatch Embedded Metric Format (EMF), CloudWatch Logs tự tạo metric từ đó.
+    `dimensions` (ví dụ {'Lane': 'bulk'}) thêm một bộ dimension Service + các key đó, bên cạnh Service.
+    """
+
+    def __init__(self, service: str, enabled: bool | None = None, dimensions: dict | None = None, **properties):
+        self.service = service
+        self.enabled = ENABLED if enabled is None else enabled
+        self.dimensions = dimensions or {}
+        self.timings = {}
+        self.counters = {}
+        self.gauges = {}
+        self.properties = properties
+        self._started = time.perf_counter()
+        # Luồng chạy trong contextvars.copy_context() của job ghi vào cùng đối tượng
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Đo thời gian của một bước; gọi nhiều lần cùng tên thì cộng dồn"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds * 1000
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float, unit: str = 'None'):
+        """Giá trị tức thời (ghi đè, không cộng dồn), ví dụ tốc độ hiện tại của rate limiter"""
+        self.gauges[name] = (value, unit)
+
+    def set_property(self, key: str, value):
+        self.properties[key] = value
+
+    def to_record(self) -> dict:
+        """Bản ghi EMF: thời gian (Milliseconds) và bộ đếm (Count) là metric, thuộc tính chỉ để tra cứu log"""
+        timings = {stage: round(ms, 2) for stage, ms in self.timings.items()}
+        timings['total'] = round((time.perf_counter() - self._started) * 1000, 2)
+        definitions = [{'Name': stage, 'Unit': 'Milliseconds'} for stage in timings]
+        definitions += [{'Name': name, 'Unit': 'Count'} for name in self.counters]
+        definitions += [{'Name': name, 'Unit': unit} for name, (_, unit) in self.gauges.items()]
+        dimensions = [['Service']]
+        if self.dimensions:
+            dimensions.append(['Service', *self.dimensions])
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{'Namespace': NAMESPACE, 'Dimensions': dimensions, 'Metrics': definitions}],
+            },
+            'Service': self.service,
+            **self.dimensions,
+            **self.properties,
+            **self.counters,
+            **{name: value for name, (value, _) in self.gauges.items()},
+            **timings,
+        }
+
+    def emit(self) -> dict | None:
+        if not self.enabled:
+            return None
+        record = self.to_record()
+        for listener in listeners:
+            listener(record)
+        print(json.dumps(record, default=str))
+        return record
+
+@contextmanager
+def job(service: str, dimensions: dict | None = None, **properties):
+    """Tạo Metrics cho một job/request, gắn vào context hiện tại (cho timer()/count()/timed) và emit khi kết thúc"""
+    metrics = Metrics(service, dimensions=dimensions, **properties)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        metrics.emit()
+
+def current() -> Metrics | None:
+    return _current.get()
+
+@contextmanager
+def timer(stage: str):
+    """Đo thời gian vào Metrics của context hiện tại (không làm gì nếu không có)"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.timer(stage):
+        yield
+
+def count(name: str, value: float = 1):
+    metrics = _current.get()
+    if metrics is not None and metrics.enabled:
+        metrics.count(name, value)
+
+def gauge(name: str, value: float, unit: str = 'None'):
+    metrics = _current.get()
+    if metrics is not None and metrics.enabled:
+        metrics.gauge(name, value, unit)
+
+def timed(stage: str):
+    """Decorator: đo thời gian của cả hàm vào Metrics của context hiện tại"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
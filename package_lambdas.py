@@ -0,0 +1,138 @@
+"""
+Đóng gói mỗi Lambda thành một file zip chỉ chứa các module nó thật sự import (tìm theo cây import, kể cả import
+trong hàm), kèm .pyc đã biên dịch sẵn: /var/task chỉ đọc nên Lambda không ghi được __pycache__ và phải biên dịch
+lại mọi module ở mỗi cold start.
+
+    python package_lambdas.py                  # dist/upload-lambda.zip, dist/processing-lambda.zip, ...
+    python package_lambdas.py processing --install-deps   # cài luôn Pillow/NumPy vào zip thay vì dùng layer
+
+.pyc được biên dịch bằng Python đang chạy script, nên phiên bản phải trùng với runtime của Lambda (ví dụ 3.12).
+"""
+import argparse
+import ast
+import io
+import py_compile
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+SOURCE_DIRS = (ROOT, ROOT / 'lambda')
+
+# Tên ngắn -> (module handler, tên file zip như trong hướng dẫn deploy, thư viện cần trong layer).
+# Thư viện khai báo tay: upload handler có import Pillow trong image_output.thumbnails() nhưng không bao giờ gọi tới.
+HANDLERS = {
+    'upload': ('lambda_upload_handler', 'upload-lambda', ()),
+    'processing': ('lambda_rekognition_processor', 'processing-lambda', ('Pillow', 'numpy')),
+    'status': ('lambda_get_job_status', 'status-lambda', ()),
+    'search': ('lambda_search_labels', 'search-lambda', ()),
+}
+
+# Module local chỉ dùng khi chạy ngoài Lambda (clients.py thử import settings, không có thì đọc biến môi trường)
+LOCAL_ONLY = {'settings'}
+
+# Thời điểm cố định cho mọi file trong zip: cùng mã nguồn cho ra cùng file zip (dễ so sánh giữa các lần deploy)
+ZIP_TIMESTAMP = (2020, 1, 1, 0, 0, 0)
+
+def local_module(name: str) -> Path | None:
+    for directory in SOURCE_DIRS:
+        path = directory / f'{name}.py'
+        if path.is_file():
+            return path
+    return None
+
+def imported_names(path: Path) -> set[str]:
+    """Tên package cấp cao nhất của mọi câu lệnh import trong file"""
+    names = set()
+    for node in ast.walk(ast.parse(path.read_text(encoding='utf-8'), str(path))):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return names
+
+def resolve(handler: str) -> dict[str, Path]:
+    """Các module local (tên -> file) mà handler import, trực tiếp hoặc gián tiếp"""
+    modules = {}
+    pending = [handler]
+    while pending:
+        name = pending.pop()
+        if name in modules:
+            continue
+        modules[name] = local_module(name)
+        pending.extend(imported for imported in imported_names(modules[name])
+                       if imported not in LOCAL_ONLY and local_module(imported))
+    return modules
+
+def compile_module(path: Path) -> bytes:
+    """Biên dịch thành .pyc kiểu unchecked-hash: Lambda nạp thẳng, không so mtime với file nguồn"""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / 'module.pyc'
+        py_compile.compile(str(path), cfile=str(target), doraise=True,
+                           invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        return target.read_bytes()
+
+def install_dependencies(packages: list[str], target: Path, python_version: str, platform: str):
+    subprocess.run([
+        sys.executable, '-m', 'pip', 'install', '--quiet', '--target', str(target),
+        '--platform', platform, '--python-version', python_version, '--only-binary=:all:', *packages,
+    ], check=True)
+
+def add_file(bundle: zipfile.ZipFile, name: str, data: bytes):
+    info = zipfile.ZipInfo(name, ZIP_TIMESTAMP)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    bundle.writestr(info, data)
+
+def build(handler: str, zip_name: str, packages, output: Path, compile_pyc=True, install_deps=False,
+          python_version='3.12', platform='manylinux2014_x86_64') -> dict:
+    modules = resolve(handler)
+    path = output / f'{zip_name}.zip'
+    cache_tag = sys.implementation.cache_tag
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as bundle:
+        for name, source in sorted(modules.items()):
+            add_file(bundle, f'{name}.py', source.read_bytes())
+            if compile_pyc:
+                add_file(bundle, f'__pycache__/{name}.{cache_tag}.pyc', compile_module(source))
+        if install_deps and packages:
+            with tempfile.TemporaryDirectory() as tmp:
+                install_dependencies(packages, Path(tmp), python_version, platform)
+                for file in sorted(Path(tmp).rglob('*')):
+                    if file.is_file():
+                        add_file(bundle, file.relative_to(tmp).as_posix(), file.read_bytes())
+    path.write_bytes(buffer.getvalue())
+    return {'zip': path, 'modules': sorted(modules), 'layer': [] if install_deps else list(packages),
+            'bytes': path.stat().st_size}
+
+def main():
+    parser = argparse.ArgumentParser(description='Đóng gói từng Lambda thành file zip tối giản')
+    parser.add_argument('handlers', nargs='*', help=f"{', '.join(HANDLERS)} (mặc định: tất cả)")
+    parser.add_argument('--output', type=Path, default=ROOT / 'dist')
+    parser.add_argument('--no-compile', action='store_true', help='không kèm .pyc biên dịch sẵn')
+    parser.add_argument('--install-deps', action='store_true', help='cài thư viện bên thứ ba vào zip thay vì dùng layer')
+    parser.add_argument('--python-version', default=f'{sys.version_info.major}.{sys.version_info.minor}')
+    parser.add_argument('--platform', default='manylinux2014_x86_64', help='manylinux2014_aarch64 cho arm64')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.handlers if name not in HANDLERS]
+    if unknown:
+        parser.error(f"Unknown handlers: {', '.join(unknown)} (allowed: {', '.join(HANDLERS)})")
+    args.output.mkdir(parents=True, exist_ok=True)
+    if args.python_version != f'{sys.version_info.major}.{sys.version_info.minor}' and not args.no_compile:
+        parser.error('.pyc phải được biên dịch bằng đúng phiên bản Python của runtime (hoặc dùng --no-compile)')
+
+    for short_name in args.handlers or HANDLERS:
+        handler, zip_name, packages = HANDLERS[short_name]
+        result = build(handler, zip_name, packages, args.output, not args.no_compile, args.install_deps,
+                       args.python_version, args.platform)
+        print(f"{result['zip']}: {result['bytes'] / 1024:.1f} KB, handler {handler}.lambda_handler")
+        print(f"  modules: {', '.join(result['modules'])}")
+        if result['layer']:
+            print(f"  layer:   {', '.join(result['layer'])}")
+
+if __name__ == '__main__':
+    main()
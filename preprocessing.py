@@ -0,0 +1,86 @@
+from io import BytesIO
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Cạnh dài tối đa của ảnh gửi cho Rekognition
+MAX_EDGE = 1920
+JPEG_QUALITY = 85
+# Giới hạn của Rekognition khi gửi ảnh dạng bytes
+MAX_BYTES = 5 * 1024 * 1024
+# Tag EXIF Orientation
+ORIENTATION = 0x0112
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    width: int
+    height: int
+    original_width: int
+    original_height: int
+
+    @property
+    def resized(self) -> bool:
+        return (self.width, self.height) != (self.original_width, self.original_height)
+
+def target_size(width: int, height: int, max_edge: int) -> tuple[int, int]:
+    """Kích thước sau khi thu nhỏ để cạnh dài nhất không vượt quá max_edge (giữ tỷ lệ)"""
+    scale = min(1.0, max_edge / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def encode_jpeg(image: 'Image.Image', quality: int = JPEG_QUALITY, orientation: int | None = None) -> bytes:
+    """Encode JPEG không kèm metadata (EXIF, ICC...), trừ tag Orientation nếu truyền vào"""
+    from PIL import Image
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    options = {}
+    if orientation and orientation != 1:
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        options["exif"] = exif.tobytes()
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, **options)
+    return buffer.getvalue()
+
+def prepare_bytes(image_bytes: bytes, max_edge: int = MAX_EDGE, quality: int = JPEG_QUALITY) -> PreparedImage:
+    """
+    Thu nhỏ ảnh trước khi gửi Rekognition. Với JPEG, draft() cho decoder DCT giải mã thẳng ở 1/2, 1/4, 1/8
+    kích thước nên không phải decode toàn bộ ảnh gốc. Ảnh đã nằm trong giới hạn được giữ nguyên bytes.
+    Vùng resize phủ đúng toàn bộ ảnh gốc nên toạ độ tỷ lệ (0-1) Rekognition trả về áp dụng thẳng cho ảnh gốc;
+    tag EXIF Orientation được giữ lại để Rekognition xoay ảnh thu nhỏ giống như khi nhận ảnh gốc.
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes))
+    original_width, original_height = image.size
+    width, height = target_size(original_width, original_height, max_edge)
+
+    if (width, height) == image.size and len(image_bytes) <= MAX_BYTES and image.format in ("JPEG", "PNG"):
+        return PreparedImage(image_bytes, width, height, original_width, original_height)
+
+    # draft() trả về vùng trong ảnh đã giảm tương ứng với toàn bộ ảnh gốc
+    drafted = image.draft("RGB", (width, height))
+    box = drafted[1] if drafted else None
+    resized = image.resize((width, height), Image.Resampling.BILINEAR, box=box, reducing_gap=2.0)
+    orientation = image.getexif().get(ORIENTATION)
+    return PreparedImage(encode_jpeg(resized, quality, orientation), width, height, original_width, original_height)
+
+def prepare_image(image: 'Image.Image', max_edge: int = MAX_EDGE, quality: int = JPEG_QUALITY,
+                  keep_orientation: bool = True) -> PreparedImage:
+    """
+    Giống prepare_bytes nhưng cho ảnh đã decode sẵn. resize(reducing_gap=2.0) để Pillow tự thu nhỏ theo hệ số
+    nguyên (reduce) tới khoảng gấp đôi kích thước đích rồi mới lọc BILINEAR. Tag EXIF Orientation của ảnh gốc
+    cũng được giữ lại, trừ khi `keep_orientation=False` (toạ độ phải theo pixel gốc, ví dụ khi gộp với các tile).
+    """
+    from PIL import Image
+
+    original_width, original_height = image.size
+    width, height = target_size(original_width, original_height, max_edge)
+    # Đọc trước khi resize: ảnh mới tạo từ resize() không còn EXIF
+    orientation = image.getexif().get(ORIENTATION) if keep_orientation else None
+    if (width, height) != image.size:
+        image = image.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return PreparedImage(encode_jpeg(image, quality, orientation), width, height, original_width, original_height)
@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from contextlib import nullcontext
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+import clients
+import metrics
+
+# Mã lỗi AWS trả về khi vượt hạn mức TPS
+THROTTLING_CODES = {"ThrottlingException", "ProvisionedThroughputExceededException", "LimitExceededException",
+                    "TooManyRequestsException", "RequestLimitExceeded"}
+
+# Lỗi tạm thời phía AWS hoặc mạng: thử lại nhưng không giảm tốc độ
+TRANSIENT_CODES = {"InternalServerError", "InternalFailure", "ServiceUnavailable", "ServiceUnavailableException"}
+
+def is_throttling(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response["Error"]["Code"] in THROTTLING_CODES
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response["Error"]["Code"] in TRANSIENT_CODES
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError))
+
+class RateLimiter:
+    """Token bucket thread-safe: tối đa `rate` lượt gọi mỗi giây, cho phép dồn tối đa `burst` lượt"""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Chờ tới khi có token rồi lấy một token"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                # Sai số float khi cộng dồn có thể để lại 0.9999999999; coi như đủ token thay vì chờ mãi
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return
+                wait = (1 - self._tokens) / self.rate
+            # Chờ tối thiểu 1ms: khoảng chờ nhỏ hơn độ phân giải của đồng hồ sẽ không làm thời gian tiến lên
+            time.sleep(max(wait, 1e-3))
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket có tốc độ tự điều chỉnh theo AIMD: mỗi lần gọi thành công tăng tốc độ thêm `increase`/giây
+    (tăng tuyến tính, tối đa `max_rate`), mỗi lần bị throttle nhân tốc độ với `decrease` (tối thiểu `min_rate`).
+    Các lần throttle trong cùng `cooldown` giây chỉ giảm một lần, vì chúng thường cùng do một đợt vượt hạn mức.
+    `shared` (ví dụ DynamoDBRateLimiter) được gọi sau token local để giới hạn chung cho nhiều container.
+    """
+
+    def __init__(self, max_rate: float, min_rate: float | None = None, initial_rate: float | None = None,
+                 increase: float | None = None, decrease: float = 0.5, cooldown: float = 1.0, shared=None):
+        super().__init__(initial_rate or max_rate)
+        self.max_rate = max_rate
+        self.min_rate = min_rate if min_rate is not None else max(0.1, max_rate / 20)
+        self.increase = increase if increase is not None else max(0.1, max_rate / 20)
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.shared = shared
+        self.throttles = 0
+        self._last_decrease = float("-inf")
+
+    def acquire(self):
+        super().acquire()
+        if self.shared:
+            self.shared.acquire()
+
+    def _set_rate(self, rate: float, now: float):
+        # Tính token theo tốc độ cũ tới thời điểm đổi; burst theo tốc độ mới để không dồn lại mức cũ
+        self._refill(now)
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self._tokens = min(self._tokens, self.burst)
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                # Chia cho tốc độ hiện tại: cộng dồn qua ~rate lần gọi mỗi giây thành `increase` mỗi giây
+                self._set_rate(min(self.max_rate, self.rate + self.increase / max(1.0, self.rate)), time.monotonic())
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self._set_rate(max(self.min_rate, self.rate * self.decrease), now)
+                self._tokens = 0.0
+
+class DynamoDBRateLimiter:
+    """
+    Giới hạn chung `rate` lời gọi/giây cho mọi container: mỗi giây có một item đếm trong bảng DynamoDB
+    (partition key `limiter` kiểu String, bật TTL trên `expires_at`). Mỗi lời gọi tăng bộ đếm bằng một lệnh
+    ghi có điều kiện; khi giây hiện tại đã đủ thì chờ sang giây kế tiếp.
+    """
+
+    def __init__(self, table_name: str, name: str, rate: float, table=None):
+        self.name = name
+        self.limit = max(1, int(rate))
+        self._table = table
+        self._table_name = table_name
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = clients.get_resource("dynamodb").Table(self._table_name)
+        return self._table
+
+    def acquire(self):
+        while True:
+            now = time.time()
+            window = int(now)
+            try:
+                self.table.update_item(
+                    Key={"limiter": f"{self.name}#{window}"},
+                    UpdateExpression="ADD calls :one SET expires_at = :expires",
+                    ConditionExpression="attribute_not_exists(calls) OR calls < :limit",
+                    ExpressionAttributeValues={":one": 1, ":limit": self.limit, ":expires": window + 60},
+                )
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            # Jitter nhỏ để các container không cùng ghi vào đầu giây kế tiếp
+            time.sleep(window + 1 - now + random.uniform(0, 0.05))
+
+class ThrottlingRetry:
+    """
+    Gọi hàm qua rate limiter (nếu có) và thử lại khi bị throttle hoặc gặp lỗi tạm thời, chờ exponential backoff
+    với full jitter. Báo cho AdaptiveRateLimiter biết mỗi lần thành công/bị throttle để nó điều chỉnh tốc độ.
+    Client boto3 nên tạo với max_attempts=1 (clients.get_client) để mọi lần throttle đều tới được đây.
+    """
+
+    def __init__(self, limiter: RateLimiter | None = None, max_retries: int = 5, base_delay: float = 0.1,
+                 max_delay: float = 5.0):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args, stage: str | None = None, **kwargs):
+        """
+        Gọi fn(*args, **kwargs), trả về (kết quả, số lần gọi). Thời gian chờ limiter/backoff được ghi vào metrics
+        (`rate_limit_wait`, `backoff`), thời gian của riêng các lần gọi vào `stage` nếu có.
+        """
+        adaptive = isinstance(self.limiter, AdaptiveRateLimiter)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                with metrics.timer("rate_limit_wait"):
+                    self.limiter.acquire()
+            try:
+                with metrics.timer(stage) if stage else nullcontext():
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttling(e)
+                if not (throttled or is_transient(e)) or attempt == self.max_retries:
+                    raise
+                if throttled:
+                    with self._lock:
+                        self.throttled += 1
+                    metrics.count("throttled")
+                    if adaptive:
+                        self.limiter.on_throttle()
+                        metrics.gauge("rate_limit", round(self.limiter.rate, 2), "Count/Second")
+                with metrics.timer("backoff"):
+                    time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            if adaptive:
+                self.limiter.on_success()
+                metrics.gauge("rate_limit", round(self.limiter.rate, 2), "Count/Second")
+            return result, attempt + 1
@@ -0,0 +1,103 @@
+import image_output
+
+# numpy/Pillow import trong hàm để import module (chỉ lấy hằng số) không tốn thời gian cold start
+
+# Hai box có IoU từ ngưỡng này trở lên được coi là cùng một đối tượng
+IOU_THRESHOLD = 0.7
+
+def from_instances(labels):
+    """Chuyển danh sách instance {'name', 'confidence', 'bounding_box'} sang (names, confidences, boxes)"""
+    import numpy as np
+
+    names = [label['name'] for label in labels]
+    confidences = np.array([label['confidence'] for label in labels], dtype=np.float32)
+    boxes = np.array(
+        [[label['bounding_box'][key] for key in ('Left', 'Top', 'Width', 'Height')] for label in labels],
+        dtype=np.float32,
+    ).reshape(-1, 4)
+    return names, confidences, boxes
+
+def iou_matrix(boxes):
+    """IoU giữa mọi cặp box (left, top, width, height theo tỷ lệ 0-1), trả về ma trận N x N"""
+    import numpy as np
+
+    left, top = boxes[:, 0], boxes[:, 1]
+    right, bottom = left + boxes[:, 2], top + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    inter_width = np.clip(np.minimum(right[:, None], right[None, :]) - np.maximum(left[:, None], left[None, :]), 0, None)
+    inter_height = np.clip(np.minimum(bottom[:, None], bottom[None, :]) - np.maximum(top[:, None], top[None, :]), 0, None)
+    intersection = inter_width * inter_height
+    union = areas[:, None] + areas[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def merge_overlapping(names, confidences, boxes, iou_threshold=IOU_THRESHOLD):
+    """
+    Non-maximum suppression theo IoU: giữ box có confidence cao nhất trong mỗi cụm box chồng nhau
+    và gộp tên nhãn của cả cụm vào box đó. Trả về (groups, confidences, boxes) của các box được giữ.
+    """
+    import numpy as np
+
+    if len(boxes) == 0:
+        return [], confidences[:0], boxes[:0]
+
+    overlaps = iou_matrix(boxes)
+    np.fill_diagonal(overlaps, 1.0)
+    order = np.argsort(-confidences, kind='stable')
+
+    kept, groups = [], []
+    while order.size:
+        best = order[0]
+        members = order[overlaps[best, order] >= iou_threshold]
+        kept.append(best)
+        # Tên nhãn theo thứ tự confidence giảm dần, bỏ trùng
+        groups.append(list(dict.fromkeys(names[member] for member in members)))
+        order = order[overlaps[best, order] < iou_threshold]
+
+    kept = np.array(kept)
+    return groups, confidences[kept], boxes[kept]
+
+def build_overlays(labels, iou_threshold=IOU_THRESHOLD):
+    """Danh sách box đã gộp dạng JSON, cho client tự vẽ mà không cần decode/encode ảnh"""
+    groups, confidences, boxes = merge_overlapping(*from_instances(labels), iou_threshold=iou_threshold)
+    return [
+        {
+            'names': group,
+            'confidence': round(float(confidence), 3),
+            'bounding_box': dict(zip(('Left', 'Top', 'Width', 'Height'), (round(value, 6) for value in box.tolist()))),
+        }
+        for group, confidence, box in zip(groups, confidences, boxes)
+    ]
+
+def drawable(image):
+    """
+    Ảnh ở mode vẽ được màu bất kỳ: ảnh palette (GIF, PNG 8-bit), xám, 16-bit, CMYK... được chuyển sang RGBA nếu có
+    kênh alpha, còn lại RGB. Vẽ màu mới lên ảnh palette đã đủ 256 màu sẽ lỗi "cannot allocate more than 256 colors".
+    """
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    return image.convert('RGBA' if image_output.has_alpha(image) else 'RGB')
+
+def draw_boxes(image, groups, confidences, boxes):
+    """Vẽ tất cả box và nhãn lên ảnh trong một lượt; trả về ảnh đã vẽ (bản chuyển mode nếu ảnh không phải RGB/RGBA)"""
+    import numpy as np
+    from PIL import ImageDraw
+
+    image = drawable(image)
+    draw = ImageDraw.Draw(image)
+    img_width, img_height = image.size
+
+    # Chuyển đổi từ tỷ lệ (0-1) sang pixel cho toàn bộ box cùng lúc
+    pixels = boxes * np.array([img_width, img_height, img_width, img_height], dtype=np.float32)
+    rects = np.column_stack([pixels[:, :2], pixels[:, :2] + pixels[:, 2:]]).tolist()
+
+    for group, confidence, rect in zip(groups, confidences.tolist(), rects):
+        draw.rectangle(rect, outline='red', width=3)
+        draw.text((rect[0], max(0, rect[1] - 15)), f"{', '.join(group)} ({confidence:.1f}%)", fill='white')
+
+    return image
+
+def render_labels(image, names, confidences, boxes, iou_threshold=IOU_THRESHOLD):
+    """Gộp các box trùng nhau rồi vẽ lên ảnh"""
+    groups, confidences, boxes = merge_overlapping(names, confidences, boxes, iou_threshold)
+    return draw_boxes(image, groups, confidences, boxes)
@@ -0,0 +1,298 @@
+"""
+Job chuỗi khung hình: video (qua ffmpeg), file zip chứa các frame hoặc GIF/WebP động được xử lý trong một job.
+
+- Lấy mẫu `sample_fps` frame mỗi giây.
+- Frame gần giống frame được phân tích gần nhất (khoảng cách difference-hash < `diff_threshold`) bị bỏ qua.
+- Các frame còn lại được phát hiện nhãn song song. Kết quả là một track theo thời gian: mỗi đoạn [t, until)
+  mang nhãn của frame được phân tích tại t, vì các frame bị bỏ qua trong đoạn giống frame đó.
+
+Module này được đóng gói cả vào Upload Lambda (không có Pillow) nên chỉ import PIL bên trong các hàm. Chạy offline
+bằng detect_sequence.py.
+"""
+import math
+import os
+import subprocess
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Content type của chuỗi khung hình và phần mở rộng của key S3
+SEQUENCE_TYPES = {
+    'video/mp4': 'mp4',
+    'video/quicktime': 'mov',
+    'video/webm': 'webm',
+    'video/x-matroska': 'mkv',
+    'application/zip': 'zip',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+VIDEO_TYPES = ('video/mp4', 'video/quicktime', 'video/webm', 'video/x-matroska')
+MP4_BRANDS = (b'isom', b'iso2', b'iso4', b'iso5', b'iso6', b'mp41', b'mp42', b'avc1', b'M4V ', b'dash')
+ARCHIVE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+# ffmpeg (ví dụ từ layer: /opt/bin/ffmpeg) giải mã video và lấy mẫu frame
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', 'ffmpeg')
+SAMPLE_FPS = 1.0
+MAX_SAMPLE_FPS = 30.0
+# Tỷ lệ bit khác nhau (0-1) của difference-hash giữa hai frame để coi là đã thay đổi
+DIFF_THRESHOLD = 0.05
+# Tốc độ khung hình của frame trong file zip (frame thứ i ở thời điểm i / source_fps)
+SOURCE_FPS = 1.0
+HASH_SIZE = 16
+# Số frame lấy mẫu tối đa của một job và số lời gọi phát hiện nhãn song song
+MAX_FRAMES = int(os.environ.get('MAX_SEQUENCE_FRAMES', '3600'))
+# Giới hạn của file zip upload: số file ảnh và kích thước (đã giải nén) của mỗi file, kiểm tra trước khi đọc
+MAX_ARCHIVE_MEMBERS = int(os.environ.get('MAX_ARCHIVE_MEMBERS', '100000'))
+MAX_ARCHIVE_MEMBER_BYTES = int(os.environ.get('MAX_ARCHIVE_MEMBER_BYTES', str(50 * 1024 * 1024)))
+SEQUENCE_CONCURRENCY = int(os.environ.get('SEQUENCE_CONCURRENCY', '4'))
+
+def sniff_content_type(data: bytes) -> str | None:
+    """Nhận diện video/zip/ảnh động từ magic bytes (không tin phần mở rộng hay header của client)"""
+    if data[:4] == b'PK\x03\x04':
+        return 'application/zip'
+    if data[4:8] == b'ftyp':
+        if data[8:12] == b'qt  ':
+            return 'video/quicktime'
+        if data[8:12] in MP4_BRANDS:
+            return 'video/mp4'
+    if data[:4] == b'\x1a\x45\xdf\xa3':
+        return 'video/webm' if b'webm' in data[:64] else 'video/x-matroska'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+@dataclass
+class SequenceOptions:
+    """
+    Tuỳ chọn `sequence` của request: `sample_fps` (số frame lấy mẫu mỗi giây), `diff_threshold` (0-1, 0 = phân tích
+    mọi frame lấy mẫu) và `source_fps` (tốc độ khung hình của các frame trong file zip).
+    """
+    sample_fps: float = SAMPLE_FPS
+    diff_threshold: float = DIFF_THRESHOLD
+    source_fps: float = SOURCE_FPS
+
+    @classmethod
+    def from_dict(cls, value: dict | None) -> 'SequenceOptions':
+        """Đọc và kiểm tra tuỳ chọn `sequence` của request, ValueError nếu không hợp lệ"""
+        if value is None or value is True:
+            return cls()
+        if not isinstance(value, dict):
+            raise ValueError('sequence must be an object')
+        unknown = value.keys() - {'sample_fps', 'diff_threshold', 'source_fps'}
+        if unknown:
+            raise ValueError(f"Unknown sequence options: {', '.join(sorted(unknown))}")
+
+        def number(name, default, low, high, low_inclusive):
+            number = value.get(name, default)
+            if not isinstance(number, (int, float)) or isinstance(number, bool) \
+                    or not (low <= number if low_inclusive else low < number) or number > high:
+                raise ValueError(f"sequence.{name} must be a number {'>=' if low_inclusive else '>'} {low:g} and <= {high:g}")
+            return float(number)
+
+        return cls(
+            number('sample_fps', SAMPLE_FPS, 0, MAX_SAMPLE_FPS, False),
+            number('diff_threshold', DIFF_THRESHOLD, 0, 1, True),
+            number('source_fps', SOURCE_FPS, 0, 120, False),
+        )
+
+    def to_dict(self) -> dict:
+        return {'sample_fps': self.sample_fps, 'diff_threshold': self.diff_threshold, 'source_fps': self.source_fps}
+
+@dataclass
+class Frame:
+    timestamp: float
+    image: 'Image.Image'
+
+def sample_times(timestamps, sample_fps: float):
+    """Chỉ số các frame được lấy mẫu: frame đầu tiên tại hoặc sau mỗi mốc k / sample_fps"""
+    next_time = 0.0
+    for index, timestamp in enumerate(timestamps):
+        if timestamp + 1e-6 >= next_time:
+            yield index
+            # Mốc kế tiếp sau frame này; các mốc đã trôi qua (frame thưa hơn tốc độ lấy mẫu) bị bỏ qua
+            next_time = (math.floor(timestamp * sample_fps + 1e-6) + 1) / sample_fps
+
+def archive_frames(path, options: SequenceOptions, max_frames: int = MAX_FRAMES, max_members: int = MAX_ARCHIVE_MEMBERS,
+                   max_member_bytes: int = MAX_ARCHIVE_MEMBER_BYTES):
+    """
+    Frame trong file zip, theo thứ tự tên file (thư mục con và file không phải ảnh bị bỏ qua).
+    ValueError nếu có hơn `max_members` file ảnh hoặc một file được lấy mẫu lớn hơn `max_member_bytes` khi giải nén.
+    """
+    from PIL import Image
+
+    with zipfile.ZipFile(path) as archive:
+        members = []
+        for info in archive.infolist():
+            if info.is_dir() or PurePosixPath(info.filename).suffix.lower() not in ARCHIVE_EXTENSIONS \
+                    or info.filename.startswith('__MACOSX/'):
+                continue
+            if len(members) >= max_members:
+                raise ValueError(f'Archive has more than {max_members} images')
+            members.append(info)
+        members.sort(key=lambda info: info.filename)
+        timestamps = [index / options.source_fps for index in range(len(members))]
+        for count, index in enumerate(sample_times(timestamps, options.sample_fps)):
+            if count >= max_frames:
+                return
+            # file_size là kích thước đã giải nén ghi trong zip; ZipExtFile không đọc quá con số này
+            if members[index].file_size > max_member_bytes:
+                raise ValueError(f'Archive member {members[index].filename} is larger than {max_member_bytes} bytes')
+            image = Image.open(BytesIO(archive.read(members[index])))
+            image.load()
+            yield Frame(timestamps[index], image)
+
+def animated_frames(path, options: SequenceOptions, max_frames: int = MAX_FRAMES):
+    """Frame của GIF/WebP động, thời điểm lấy từ thời lượng (ms) của từng frame"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        timestamps, elapsed = [], 0.0
+        for index in range(getattr(image, 'n_frames', 1)):
+            image.seek(index)
+            timestamps.append(elapsed)
+            elapsed += (image.info.get('duration') or 100) / 1000
+        for count, index in enumerate(sample_times(timestamps, options.sample_fps)):
+            if count >= max_frames:
+                return
+            image.seek(index)
+            yield Frame(timestamps[index], image.convert('RGB'))
+
+def read_ppm(stream):
+    """Một ảnh PPM (P6) từ stdout của ffmpeg, None khi hết stream"""
+    from PIL import Image
+
+    tokens = []
+    while len(tokens) < 4:
+        line = stream.readline()
+        if not line:
+            return None
+        tokens.extend(line.split(b'#', 1)[0].split())
+    width, height = int(tokens[1]), int(tokens[2])
+    data = stream.read(width * height * 3)
+    if len(data) < width * height * 3:
+        return None
+    return Image.frombytes('RGB', (width, height), data)
+
+def video_frames(path, options: SequenceOptions, max_frames: int = MAX_FRAMES, max_edge: int = 1920):
+    """
+    Frame của video, giải mã bằng ffmpeg: bộ lọc fps lấy mẫu và thu nhỏ (cạnh dài <= max_edge) ngay trong ffmpeg,
+    Python chỉ nhận các frame đã lấy mẫu dạng PPM qua pipe.
+    """
+    scale = f"scale=w='min(iw,{max_edge})':h='min(ih,{max_edge})':force_original_aspect_ratio=decrease"
+    process = subprocess.Popen(
+        [FFMPEG_PATH, '-nostdin', '-v', 'error', '-i', str(path), '-vf', f'fps={options.sample_fps:g},{scale}',
+         '-frames:v', str(max_frames), '-f', 'image2pipe', '-vcodec', 'ppm', '-'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        index = 0
+        while (image := read_ppm(process.stdout)) is not None:
+            yield Frame(index / options.sample_fps, image)
+            index += 1
+        if process.wait() != 0:
+            raise ValueError(f"ffmpeg failed: {process.stderr.read().decode('utf-8', 'replace').strip()[-500:]}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def frames(path, content_type: str, options: SequenceOptions, max_frames: int = MAX_FRAMES):
+    """Các frame được lấy mẫu của một chuỗi khung hình (file local), theo thời gian tăng dần"""
+    if content_type == 'application/zip':
+        return archive_frames(path, options, max_frames)
+    if content_type in ('image/gif', 'image/webp'):
+        return animated_frames(path, options, max_frames)
+    if content_type in VIDEO_TYPES:
+        return video_frames(path, options, max_frames)
+    raise ValueError(f'Unsupported sequence type: {content_type}')
+
+def frame_hash(image: 'Image.Image', hash_size: int = HASH_SIZE) -> int:
+    """Difference-hash: mỗi bit cho biết điểm ảnh có sáng hơn điểm bên phải trên bản thu nhỏ xám hay không"""
+    from PIL import Image
+
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            bits = bits << 1 | (pixels[offset + column] > pixels[offset + column + 1])
+    return bits
+
+def hash_distance(first: int, second: int, hash_size: int = HASH_SIZE) -> float:
+    """Tỷ lệ bit khác nhau giữa hai hash (0 = giống hệt, 1 = khác hoàn toàn)"""
+    return (first ^ second).bit_count() / (hash_size * hash_size)
+
+@dataclass
+class Track:
+    # Mỗi phần tử: {'t', 'until', 'labels'} với nhãn dạng compact (result_cache.compact_labels)
+    segments: list[dict] = field(default_factory=list)
+    sampled: int = 0
+    analyzed: int = 0
+    skipped: int = 0
+    duration: float = 0.0
+
+    @property
+    def frames(self) -> dict:
+        return {'sampled': self.sampled, 'analyzed': self.analyzed, 'skipped': self.skipped}
+
+    def summary(self) -> list[dict]:
+        """Mỗi nhãn xuất hiện trong track: confidence cao nhất, lần đầu/cuối xuất hiện và số frame được phân tích có nhãn"""
+        labels = {}
+        for segment in self.segments:
+            for label in segment['labels']:
+                entry = labels.setdefault(label['name'], {
+                    'name': label['name'], 'confidence': 0.0, 'first_seen': segment['t'], 'last_seen': segment['until'], 'frames': 0,
+                })
+                entry['confidence'] = max(entry['confidence'], float(label['confidence']))
+                entry['last_seen'] = segment['until']
+                entry['frames'] += 1
+        return sorted(labels.values(), key=lambda entry: entry['confidence'], reverse=True)
+
+    def all_labels(self) -> list[dict]:
+        """Nhãn của mọi frame được phân tích (để ghi chỉ mục nhãn -> job)"""
+        return [label for segment in self.segments for label in segment['labels']]
+
+    def to_dict(self) -> dict:
+        return {'duration': self.duration, 'frames': self.frames, 'track': self.segments}
+
+def analyze(frame_iter, detect, diff_threshold: float = DIFF_THRESHOLD, concurrency: int = SEQUENCE_CONCURRENCY,
+            hash_size: int = HASH_SIZE) -> Track:
+    """
+    So sánh từng frame với frame được phân tích gần nhất, `detect(image)` (trả về nhãn dạng compact) chạy song song
+    tối đa `concurrency` frame. Số frame đang chờ được giới hạn để không giữ quá nhiều ảnh đã decode trong bộ nhớ.
+    """
+    track = Track()
+    last_hash = None
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for frame in frame_iter:
+            track.sampled += 1
+            track.duration = frame.timestamp
+            current = frame_hash(frame.image, hash_size)
+            if last_hash is not None and hash_distance(current, last_hash, hash_size) < diff_threshold:
+                track.skipped += 1
+                continue
+            last_hash = current
+            segment = {'t': round(frame.timestamp, 3)}
+            track.segments.append(segment)
+            pending.append((segment, executor.submit(detect, frame.image)))
+            while len(pending) > 2 * concurrency:
+                done, future = pending.popleft()
+                done['labels'] = future.result()
+        for segment, future in pending:
+            segment['labels'] = future.result()
+
+    track.analyzed = len(track.segments)
+    for segment, following in zip(track.segments, track.segments[1:] + [None]):
+        segment['until'] = following['t'] if following else round(track.duration, 3)
+    return track
@@ -2,14 +2,23 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
 class Settings(BaseSettings):
-    aws_access_key_id: str
-    aws_secret_access_key: str
-    api_upload_url: str
-    api_status_url: str
+    # Để trống khi chạy trên Lambda: boto3 dùng credential của execution role
+    aws_access_key_id: str | None = None
+    aws_secret_access_key: str | None = None
+    aws_session_token: str | None = None
+    api_upload_url: str | None = None
+    api_status_url: str | None = None
     aws_region: str = "ap-southeast-1"
 
+    # Cấu hình botocore dùng chung cho mọi client
+    aws_max_pool_connections: int = 50
+    aws_connect_timeout: float = 5
+    aws_read_timeout: float = 30
+    aws_max_attempts: int = 5
+    aws_retry_mode: str = "standard"
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 @lru_cache
 def get_settings():
-    return Settings()
\ No newline at end of file
+    return Settings()
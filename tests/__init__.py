@@ -0,0 +1,24 @@
+"""
+Test hành vi của các handler trên dịch vụ AWS giả lập trong bộ nhớ (benchmarks/aws_fakes.py), không cần AWS.
+
+    python -m unittest discover -s tests -t .
+"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / 'lambda'), str(ROOT / 'benchmarks')]
+
+# Các module đọc cấu hình lúc import nên biến môi trường phải có trước khi import handler
+os.environ.update(
+    AWS_DEFAULT_REGION='us-east-1',
+    AWS_REGION='us-east-1',
+    BUCKET_NAME='test-bucket',
+    TABLE_NAME='jobs',
+    QUEUE_URL='https://sqs.local/test',
+    METRICS_ENABLED='false',
+)
+for name in ('CACHE_TABLE_NAME', 'LABEL_INDEX_TABLE_NAME', 'BULK_QUEUE_URL', 'NOTIFY_TOPIC_ARN', 'REKOGNITION_TPS',
+             'RATE_LIMIT_TABLE_NAME', 'PREPROCESS_MAX_EDGE', 'DETECTION_BACKEND'):
+    os.environ.pop(name, None)
@@ -0,0 +1,27 @@
+import base64
+import contextlib
+import io
+import json
+import aws_fakes
+
+def install(**options):
+    """Dịch vụ giả lập mới cho mỗi test (Rekognition không có độ trễ)"""
+    return aws_fakes.install(rekognition_latency=0, rekognition_jitter=0, **options)
+
+def jpeg(color='red', size=(64, 48)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def upload_event(body, idempotency_key=None):
+    headers = {'Idempotency-Key': idempotency_key} if idempotency_key else {}
+    return {'headers': headers, 'body': json.dumps(body)}
+
+def image_body(data=None, **options):
+    return {'image': base64.b64encode(data or jpeg()).decode(), **options}
+
+def quiet():
+    """Handler in log từng job, tắt đi cho output test gọn"""
+    return contextlib.redirect_stdout(io.StringIO())
@@ -0,0 +1,122 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+from . import support
+import api_client
+
+UPLOAD_URL = 'https://api.local/upload'
+STATUS_URL = 'https://api.local/status'
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+class FakeApi:
+    """requests.Session giả: job COMPLETED sau `polls_needed` lần poll, `upload_errors` là mã lỗi của các POST đầu"""
+
+    def __init__(self, polls_needed=2, upload_errors=(), status_errors=0):
+        self.polls_needed = polls_needed
+        self.upload_errors = list(upload_errors)
+        self.status_errors = status_errors
+        self.polls = {}
+        self.uploads = []
+        self.status_requests = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            if method == 'POST':
+                self.uploads.append(kwargs['headers']['Idempotency-Key'])
+                if self.upload_errors:
+                    return FakeResponse(self.upload_errors.pop(0), 'error')
+                job_id = f'job-{len(self.polls)}'
+                self.polls[job_id] = 0
+                return FakeResponse(200, {'job_id': job_id})
+
+            job_ids = kwargs['params']['job_ids'].split(',')
+            self.status_requests.append(job_ids)
+            if self.status_errors:
+                self.status_errors -= 1
+                return FakeResponse(503, 'unavailable')
+            jobs = []
+            for job_id in job_ids:
+                self.polls[job_id] += 1
+                done = self.polls_needed is not None and self.polls[job_id] >= self.polls_needed
+                jobs.append({'job_id': job_id, 'status': 'COMPLETED' if done else 'PROCESSING'})
+            return FakeResponse(200, {'jobs': jobs})
+
+class ApiClientTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.images = []
+        for index in range(5):
+            path = Path(directory.name) / f'{index}.jpg'
+            path.write_bytes(support.jpeg())
+            self.images.append(path)
+
+    def analyze_many(self, api, images=None, **kwargs):
+        client = api_client.RekognitionClient(upload_url=UPLOAD_URL, status_url=STATUS_URL, session=api,
+                                              poll_initial=0.02, poll_max=0.05, **kwargs)
+        return client.analyze_many(images or self.images)
+
+    def test_jobs_are_polled_together_until_completed(self):
+        api = FakeApi(polls_needed=3)
+
+        results = self.analyze_many(api)
+
+        self.assertEqual(sorted(result['image'] for result in results), sorted(map(str, self.images)))
+        self.assertEqual({result['status'] for result in results}, {'COMPLETED'})
+        # Không poll tiếp job đã xong, và các job đến hạn cùng lúc đi chung một request ?job_ids=
+        self.assertEqual(set(api.polls.values()), {3})
+        self.assertLess(len(api.status_requests), 5 * 3)
+
+    def test_status_errors_are_retried_on_next_poll(self):
+        api = FakeApi(polls_needed=1, status_errors=2)
+
+        results = self.analyze_many(api)
+
+        self.assertEqual({result['status'] for result in results}, {'COMPLETED'})
+
+    def test_job_that_never_finishes_times_out(self):
+        results = self.analyze_many(FakeApi(polls_needed=None), images=self.images[:1], job_timeout=0.1)
+
+        self.assertEqual(results, [{'image': str(self.images[0]), 'job_id': 'job-0', 'status': 'TIMEOUT'}])
+
+    def test_upload_retries_server_errors_with_the_same_idempotency_key(self):
+        api = FakeApi(polls_needed=1, upload_errors=[503, 429])
+
+        results = self.analyze_many(api, images=self.images[:1])
+
+        self.assertEqual(results[0]['status'], 'COMPLETED')
+        self.assertEqual(len(api.uploads), 3)
+        self.assertEqual(len(set(api.uploads)), 1)
+
+    def test_client_errors_are_not_retried(self):
+        api = FakeApi(upload_errors=[400])
+
+        results = self.analyze_many(api, images=self.images[:1])
+
+        self.assertEqual(results[0]['status'], 'FAILED')
+        self.assertIn('upload: 400', results[0]['error_message'])
+        self.assertEqual(len(api.uploads), 1)
+
+    def test_backoff_doubles_up_to_the_cap_with_jitter(self):
+        client = api_client.AsyncRekognitionClient(upload_url=UPLOAD_URL, status_url=STATUS_URL, session=FakeApi(),
+                                                   poll_initial=1.0, poll_max=15.0)
+        self.addCleanup(client.close)
+
+        with mock.patch.object(api_client.random, 'uniform', side_effect=lambda low, high: high):
+            self.assertEqual([client._next_delay(attempt) for attempt in range(6)], [1, 2, 4, 8, 15, 15])
+        for attempt in range(6):
+            self.assertGreaterEqual(client._next_delay(attempt), min(15, 2 ** attempt) / 2)
+
+if __name__ == '__main__':
+    unittest.main()
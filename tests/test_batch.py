@@ -0,0 +1,42 @@
+import json
+import unittest
+from . import support
+import lambda_upload_handler
+
+class BatchUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def upload(self, body):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(body), None)
+        return response['statusCode'], json.loads(response['body'])
+
+    def test_batch_s3_keys_outside_source_prefix_are_rejected(self):
+        keys = ['uploads/other.jpg', 'processed/other.jpg', 'incoming/other.jpg', 'sources/../uploads/other.jpg', 'sources/mine.jpg']
+        status, body = self.upload({'images': [{'s3_key': key} for key in keys]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual([error['index'] for error in body['errors']], [0, 1, 2, 3])
+        self.assertEqual(len(body['jobs']), 1)
+
+    def test_invalid_detection_options_are_rejected(self):
+        invalid = [{'max_labels': 'abc'}, {'max_labels': 0}, {'max_labels': 2.5}, {'max_labels': True},
+                   {'min_confidence': 'abc'}, {'min_confidence': -1}, {'min_confidence': 150}, {'min_confidence': None}]
+        for options in invalid:
+            with self.subTest(options=options):
+                status, body = self.upload(support.image_body(**options))
+
+                self.assertEqual(status, 400)
+                self.assertIn(next(iter(options)), body['error'])
+
+        # Phần tử của batch ghi đè tham số chung: lỗi riêng phần tử đó, các phần tử khác vẫn tạo job
+        status, body = self.upload({'images': [{'s3_key': 'sources/a.jpg', 'max_labels': 'abc'}, {'s3_key': 'sources/b.jpg'}],
+                                    'min_confidence': 55.5})
+        self.assertEqual(status, 200)
+        self.assertEqual([error['index'] for error in body['errors']], [0])
+        self.assertEqual(len(body['jobs']), 1)
+        self.assertEqual(self.upload({'images': [{'s3_key': 'sources/a.jpg'}], 'max_labels': 'abc'})[0], 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import argparse
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from . import support
+import aws_fakes
+import batch_detect
+import main
+import preprocessing
+from ratelimit import ThrottlingRetry
+
+class DetectOneTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.image = Path(directory.name) / 'photo.jpg'
+        self.image.write_bytes(support.jpeg(size=(3000, 2000)))
+        self.args = argparse.Namespace(max_labels=10, min_confidence=40, max_edge=preprocessing.MAX_EDGE)
+
+    def test_throttled_call_is_retried_without_preparing_the_image_again(self):
+        rekognition = self.fakes['rekognition']
+        throttles = [aws_fakes.client_error('ThrottlingException', 'Rate exceeded', 'DetectLabels')] * 2
+        detect_labels = rekognition.detect_labels
+
+        def throttled_twice(**request):
+            if throttles:
+                raise throttles.pop()
+            return detect_labels(**request)
+
+        rekognition.detect_labels = mock.Mock(side_effect=throttled_twice)
+        backend = main.rekognition_backend(ThrottlingRetry(max_retries=3, base_delay=0, max_delay=0))
+
+        with mock.patch.object(preprocessing, 'prepare_bytes', wraps=preprocessing.prepare_bytes) as prepare, \
+                mock.patch('builtins.open', wraps=open) as open_file:
+            record = batch_detect.detect_one(self.image, self.args, backend)
+
+        self.assertEqual(record['status'], 'ok')
+        self.assertEqual(record['attempts'], 3)
+        self.assertEqual(prepare.call_count, 1)
+        self.assertEqual(open_file.call_count, 1)
+        self.assertEqual(rekognition.detect_labels.call_count, 3)
+        # Cả ba lần gọi gửi cùng bytes đã thu nhỏ
+        sent = [call.kwargs['Image']['Bytes'] for call in rekognition.detect_labels.call_args_list]
+        self.assertEqual(len(set(sent)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import threading
+import unittest
+from unittest import mock
+import clients
+
+class ClientFactoryTest(unittest.TestCase):
+    def setUp(self):
+        # Factory trống cho mỗi test; cấu hình lấy từ biến môi trường thay cho file .env
+        for name, value in [('_clients', {}), ('_resources', {}), ('_session', None), ('_config', None),
+                            ('_load_settings', lambda: None)]:
+            patcher = mock.patch.object(clients, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_config_comes_from_settings(self):
+        with mock.patch.dict(os.environ, {'AWS_MAX_POOL_CONNECTIONS': '7', 'AWS_RETRY_MODE': 'adaptive'}):
+            client = clients.get_client('s3')
+
+        self.assertEqual(client.meta.region_name, 'us-east-1')
+        self.assertEqual(client.meta.config.max_pool_connections, 7)
+        self.assertEqual(client.meta.config.retries['mode'], 'adaptive')
+        self.assertEqual(client.meta.config.read_timeout, 30)
+
+    def test_client_is_created_once_across_threads(self):
+        results = []
+        start = threading.Barrier(8)
+
+        def worker():
+            start.wait()
+            results.append(clients.get_client('sqs'))
+
+        with mock.patch('botocore.session.Session.create_client', autospec=True,
+                        side_effect=lambda session, name, config=None: object()) as create_client:
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        create_client.assert_called_once()
+        self.assertEqual(len({id(client) for client in results}), 1)
+
+    def test_max_attempts_gets_its_own_client(self):
+        retrying = clients.get_client('rekognition')
+        single = clients.get_client('rekognition', max_attempts=1)
+
+        self.assertIsNot(retrying, single)
+        self.assertIs(single, clients.get_client('rekognition', max_attempts=1))
+        self.assertEqual(single.meta.config.retries['total_max_attempts'], 1)
+
+    def test_lazy_client_waits_for_first_use(self):
+        lazy = clients.lazy_client('sns')
+        self.assertEqual(clients._clients, {})
+
+        self.assertEqual(lazy.meta.service_model.service_name, 'sns')
+        self.assertEqual(list(clients._clients), ['sns'])
+
+    def test_dynamodb_resource_is_shared(self):
+        table = clients.get_resource('dynamodb').Table('jobs')
+
+        self.assertIs(clients.get_resource('dynamodb'), clients._resources['dynamodb'])
+        self.assertEqual(table.name, 'jobs')
+        with self.assertRaises(ValueError):
+            clients.get_resource('s3')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+from PIL import Image
+from . import support
+import detection
+import main
+import metrics
+import lambda_get_job_status
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+class FakeModel:
+    """Model phân loại giả: luôn trả cùng các dự đoán (tên nhãn, xác suất 0-1)"""
+
+    def __init__(self, predictions):
+        self.predictions = predictions
+
+    def predict(self, image):
+        return self.predictions
+
+def textured_jpeg(size=(64, 48)):
+    """Ảnh có chi tiết (không bị coi là ảnh một màu)"""
+    image = Image.new('RGB', size)
+    image.putdata([((x * 37) % 256, (y * 53) % 256, (x * y) % 256) for y in range(size[1]) for x in range(size[0])])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+class CascadeTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        self.remote = processor.detector
+
+    def cascade(self, predictions):
+        return detection.CascadeBackend(detection.LocalBackend(FakeModel(predictions)), self.remote, min_confidence=90)
+
+    def detect(self, backend, data):
+        with support.quiet(), metrics.job('test', enabled=True) as job_metrics:
+            detected = backend.detect(detection.DetectionImage.from_bytes(data), 10, 40)
+        return detected, job_metrics.counters
+
+    def test_confident_local_answer_skips_rekognition(self):
+        backend = self.cascade([('Cat', 0.97), ('Dog', 0.02)])
+
+        detected, counters = self.detect(backend, textured_jpeg())
+
+        self.assertEqual(detected.source, 'local')
+        self.assertEqual([label['Name'] for label in detected.labels], ['Cat'])
+        self.assertEqual(self.fakes['rekognition'].calls, 0)
+        self.assertEqual(backend.avoided(), 1)
+        self.assertEqual(counters['rekognition_avoided'], 1)
+
+    def test_uncertain_image_falls_through_to_rekognition(self):
+        backend = self.cascade([('Cat', 0.55), ('Dog', 0.45)])
+
+        detected, counters = self.detect(backend, textured_jpeg())
+
+        self.assertEqual(detected.source, 'rekognition')
+        self.assertEqual(self.fakes['rekognition'].calls, 1)
+        self.assertEqual(backend.avoided(), 0)
+        self.assertEqual(counters['rekognition_avoided'], 0)
+
+    def test_blank_image_needs_no_model(self):
+        backend = self.cascade([])
+
+        detected, _ = self.detect(backend, support.jpeg('black'))
+
+        self.assertEqual((detected.source, detected.labels), ('blank', []))
+        self.assertEqual(self.fakes['rekognition'].calls, 0)
+
+    def test_model_error_falls_back_to_rekognition(self):
+        backend = self.cascade([])
+        backend.local.model.predict = mock.Mock(side_effect=RuntimeError('model broken'))
+
+        detected, counters = self.detect(backend, textured_jpeg())
+
+        self.assertEqual(detected.source, 'rekognition')
+        self.assertEqual(counters['local_detect_errors'], 1)
+        self.assertEqual(backend.stats['local_errors'], 1)
+
+class ImageLabelsTest(unittest.TestCase):
+    """Nhãn không có box (câu trả lời của model local) đi tới mọi nơi dùng kết quả"""
+
+    def setUp(self):
+        self.fakes = support.install()
+        self.cascade = detection.CascadeBackend(detection.LocalBackend(FakeModel([('Cat', 0.97)])), processor.detector, 90)
+
+    def test_local_file_detection_keeps_labels_without_boxes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'cat.jpg'
+            path.write_bytes(textured_jpeg())
+            with support.quiet():
+                detected = main.detect_labels_from_local_file(path, backend=self.cascade, verbose=False)
+
+        self.assertEqual(detected.labels, [])
+        self.assertEqual([(label.name, label.instances) for label in detected.image_labels], [('Cat', 0)])
+
+    def test_processed_job_reports_image_labels(self):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(
+                support.upload_event(support.image_body(textured_jpeg(), render=False, callback_url='https://example.com/hook')), None)
+        job_id = json.loads(response['body'])['job_id']
+        record = self.fakes['sqs'].receive_batch(wait=0)[0]
+        with mock.patch.object(processor, 'detector', self.cascade), \
+                mock.patch.object(processor.notifier, 'post_callback') as post_callback, support.quiet():
+            self.assertEqual(processor.lambda_handler({'Records': [record]}, None), {'batchItemFailures': []})
+
+        with support.quiet():
+            status = lambda_get_job_status.lambda_handler({'queryStringParameters': {'job_id': job_id}}, None)
+        result = json.loads(status['body'])
+        self.assertEqual(result['status'], 'COMPLETED')
+        self.assertEqual(result['labels'], [])
+        self.assertEqual([label['name'] for label in result['image_labels']], ['Cat'])
+        self.assertAlmostEqual(result['image_labels'][0]['confidence'], 97, places=3)
+        self.assertEqual(post_callback.call_args.args[1]['image_labels'][0]['name'], 'Cat')
+        self.assertEqual(self.fakes['rekognition'].calls, 0)
+
+    def test_rekognition_scene_labels_are_kept_beside_boxes(self):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(render=False)), None)
+            job_id = json.loads(response['body'])['job_id']
+            processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+            status = lambda_get_job_status.lambda_handler(
+                {'queryStringParameters': {'job_id': job_id, 'fields': 'labels,image_labels'}}, None)
+        result = json.loads(status['body'])
+
+        self.assertNotIn('Indoors', {label['name'] for label in result['labels']})
+        self.assertIn('Indoors', [label['name'] for label in result['image_labels']])
+
+if __name__ == '__main__':
+    unittest.main()
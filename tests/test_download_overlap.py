@@ -0,0 +1,57 @@
+import json
+import threading
+import unittest
+from unittest import mock
+from . import support
+import metrics
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+class DownloadOverlapTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def run_job(self, wait=2, **options):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(**options)), None)
+        job_id = json.loads(response['body'])['job_id']
+        s3, rekognition = self.fakes['s3'], self.fakes['rekognition']
+        downloading = threading.Event()
+        overlapped = []
+        get_object, detect_labels = s3.get_object, rekognition.detect_labels
+
+        def tracked_get_object(**request):
+            downloading.set()
+            return get_object(**request)
+
+        def tracked_detect_labels(**request):
+            # Ảnh phải đang được tải trong lúc DetectLabels chưa trả về
+            overlapped.append(downloading.wait(timeout=wait))
+            return detect_labels(**request)
+
+        records = []
+        with mock.patch.object(s3, 'get_object', side_effect=tracked_get_object), \
+                mock.patch.object(rekognition, 'detect_labels', side_effect=tracked_detect_labels), \
+                mock.patch.object(metrics, 'ENABLED', True), mock.patch.object(metrics, 'listeners', [records.append]), \
+                support.quiet():
+            processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+        job = self.fakes['dynamodb'].Table('jobs').get_item(Key={'job_id': job_id})['Item']
+        return job, overlapped, next(record for record in records if record['Service'] == 'processor')
+
+    def test_download_runs_while_rekognition_is_called(self):
+        job, overlapped, record = self.run_job()
+
+        self.assertEqual(job['status'], 'COMPLETED')
+        self.assertEqual(overlapped, [True])
+        for stage in ('detect', 's3_get', 'decode', 'download_wait', 'draw', 'encode', 's3_put'):
+            self.assertIn(stage, record)
+
+    def test_overlay_only_job_does_not_download(self):
+        job, overlapped, record = self.run_job(wait=0.05, render=False)
+
+        self.assertEqual(job['status'], 'COMPLETED')
+        self.assertEqual(overlapped, [False])
+        self.assertNotIn('s3_get', record)
+
+if __name__ == '__main__':
+    unittest.main()
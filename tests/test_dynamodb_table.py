@@ -0,0 +1,127 @@
+import unittest
+from decimal import Decimal
+from unittest import mock
+from . import support  # noqa: F401 (sys.path)
+import dynamodb_table
+
+def put(job_id):
+    return {'PutRequest': {'Item': {'job_id': {'S': job_id}}}}
+
+class SerializeTest(unittest.TestCase):
+    def test_round_trip(self):
+        item = {
+            'job_id': 'abc',
+            'count': 3,
+            'score': Decimal('97.125'),
+            'done': True,
+            'error': None,
+            'boxes': b'\x00\x01\xff',
+            'names': {'Car', 'Road'},
+            'sizes': {1, Decimal('2.5')},
+            'blobs': {b'a', b'b'},
+            'output': {'format': 'webp', 'thumbnails': [{'size': 256}, {'size': Decimal('512')}], 'extra': {}},
+            'empty_list': [],
+            'empty_string': '',
+        }
+
+        self.assertEqual(dynamodb_table.deserialize_item(dynamodb_table.serialize_item(item)),
+                         {**item, 'sizes': {Decimal(1), Decimal('2.5')}, 'count': Decimal(3)})
+
+    def test_attribute_values(self):
+        serialize = dynamodb_table.serialize
+
+        self.assertEqual(serialize(7), {'N': '7'})
+        self.assertEqual(serialize(False), {'BOOL': False})
+        self.assertEqual(serialize(bytearray(b'x')), {'B': b'x'})
+        self.assertEqual(serialize({'a': [1, 'b']}), {'M': {'a': {'L': [{'N': '1'}, {'S': 'b'}]}}})
+        self.assertEqual(serialize(('a', None)), {'L': [{'S': 'a'}, {'NULL': True}]})
+        self.assertEqual(sorted(serialize({'b', 'a'})['SS']), ['a', 'b'])
+
+    def test_unsupported_values_are_rejected(self):
+        for value in (1.5, set(), {True, False}, object()):
+            with self.subTest(value=value), self.assertRaises(TypeError):
+                dynamodb_table.serialize(value)
+        with self.assertRaises(TypeError):
+            dynamodb_table.deserialize({'X': 'value'})
+
+class TableTest(unittest.TestCase):
+    def test_requests_and_responses_are_converted(self):
+        client = mock.Mock()
+        client.query.return_value = {'Items': [{'job_id': {'S': 'a'}, 'n': {'N': '1'}}],
+                                     'LastEvaluatedKey': {'job_id': {'S': 'a'}}, 'Count': 1}
+        table = dynamodb_table.DynamoDB(client).Table('jobs')
+
+        response = table.query(KeyConditionExpression='job_id = :id', ExpressionAttributeValues={':id': 'a'}, Limit=1)
+
+        client.query.assert_called_once_with(TableName='jobs', KeyConditionExpression='job_id = :id',
+                                             ExpressionAttributeValues={':id': {'S': 'a'}}, Limit=1)
+        self.assertEqual(response, {'Items': [{'job_id': 'a', 'n': Decimal(1)}], 'LastEvaluatedKey': {'job_id': 'a'}, 'Count': 1})
+
+    def test_batch_get_item_returns_unprocessed_keys_ready_to_resend(self):
+        client = mock.Mock()
+        client.batch_get_item.return_value = {
+            'Responses': {'jobs': [{'job_id': {'S': 'a'}}]},
+            'UnprocessedKeys': {'jobs': {'Keys': [{'job_id': {'S': 'b'}}], 'ProjectionExpression': 'job_id'}},
+        }
+        dynamodb = dynamodb_table.DynamoDB(client)
+
+        response = dynamodb.batch_get_item(RequestItems={'jobs': {'Keys': [{'job_id': 'a'}, {'job_id': 'b'}],
+                                                                  'ProjectionExpression': 'job_id'}})
+
+        self.assertEqual(client.batch_get_item.call_args.kwargs['RequestItems']['jobs']['Keys'],
+                         [{'job_id': {'S': 'a'}}, {'job_id': {'S': 'b'}}])
+        self.assertEqual(response['Responses'], {'jobs': [{'job_id': 'a'}]})
+        self.assertEqual(response['UnprocessedKeys'], {'jobs': {'Keys': [{'job_id': 'b'}], 'ProjectionExpression': 'job_id'}})
+
+class BatchWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.batch_write_item.return_value = {'UnprocessedItems': {}}
+        sleep = mock.patch.object(dynamodb_table.time, 'sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def writer(self, **kwargs):
+        return dynamodb_table.BatchWriter(self.client, 'jobs', **kwargs)
+
+    def sent(self):
+        return [call.kwargs['RequestItems']['jobs'] for call in self.client.batch_write_item.call_args_list]
+
+    def test_writes_are_sent_in_batches_of_25(self):
+        with dynamodb_table.Table(self.client, 'jobs').batch_writer() as writer:
+            for index in range(30):
+                writer.put_item(Item={'job_id': str(index)})
+            writer.delete_item(Key={'job_id': 'old'})
+
+        self.assertEqual([len(batch) for batch in self.sent()], [25, 6])
+        self.assertEqual(self.sent()[1][-1], {'DeleteRequest': {'Key': {'job_id': {'S': 'old'}}}})
+        self.sleep.assert_not_called()
+
+    def test_unprocessed_items_are_resent_with_backoff(self):
+        self.client.batch_write_item.side_effect = [
+            {'UnprocessedItems': {'jobs': [put('b')]}},
+            {'UnprocessedItems': {'jobs': [put('b')]}},
+            {'UnprocessedItems': {}},
+        ]
+
+        with mock.patch.object(dynamodb_table.random, 'uniform', side_effect=lambda low, high: high), self.writer() as writer:
+            writer.put_item(Item={'job_id': 'a'})
+            writer.put_item(Item={'job_id': 'b'})
+
+        self.assertEqual(self.sent(), [[put('a'), put('b')], [put('b')], [put('b')]])
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list],
+                         [dynamodb_table.RETRY_BASE_DELAY, dynamodb_table.RETRY_BASE_DELAY * 2])
+
+    def test_gives_up_after_max_retries(self):
+        self.client.batch_write_item.return_value = {'UnprocessedItems': {'jobs': [put('a')]}}
+
+        with self.assertRaises(dynamodb_table.UnprocessedItemsError) as raised:
+            with self.writer(max_retries=3) as writer:
+                writer.put_item(Item={'job_id': 'a'})
+
+        self.assertEqual(self.client.batch_write_item.call_count, 4)
+        self.assertEqual(self.sleep.call_count, 3)
+        self.assertEqual(raised.exception.items, [put('a')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import unittest
+from . import support
+import lambda_upload_handler
+
+class IdempotentUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        self.sqs = self.fakes['sqs']
+        self.table = self.fakes['dynamodb'].Table('jobs')
+
+    def upload(self, body, key=None):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(body, key), None)
+        return response, json.loads(response['body'])
+
+    def test_replay_returns_same_job_without_enqueueing_again(self):
+        first, first_body = self.upload(support.image_body(), 'key-1')
+        replay, replay_body = self.upload(support.image_body(), 'key-1')
+
+        self.assertEqual(first['statusCode'], 200)
+        self.assertEqual(replay['statusCode'], 200)
+        self.assertEqual(replay['headers'].get('Idempotent-Replayed'), 'true')
+        self.assertNotIn('Idempotent-Replayed', first['headers'])
+        self.assertEqual(replay_body['job_id'], first_body['job_id'])
+        self.assertEqual(self.sqs.depth(), 1)
+        self.assertNotIn('pending_message', self.table.get_item(Key={'job_id': first_body['job_id']})['Item'])
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        self.upload(support.image_body(), 'key-1')
+        response, body = self.upload(support.image_body(support.jpeg('blue')), 'key-1')
+
+        self.assertEqual(response['statusCode'], 422)
+        self.assertIn('Idempotency-Key', body['error'])
+
+    def test_replay_after_failed_send_enqueues_job(self):
+        send_message = self.sqs.send_message
+
+        def unavailable(**kwargs):
+            raise RuntimeError('SQS unavailable')
+
+        self.sqs.send_message = unavailable
+        failed, _ = self.upload(support.image_body(), 'key-1')
+        self.assertEqual(failed['statusCode'], 500)
+        self.assertEqual(self.sqs.depth(), 0)
+
+        self.sqs.send_message = send_message
+        replay, body = self.upload(support.image_body(), 'key-1')
+        self.assertEqual(replay['statusCode'], 200)
+        self.assertEqual(self.sqs.depth(), 1)
+        self.assertEqual(json.loads(self.sqs.receive_batch(wait=0)[0]['body'])['job_id'], body['job_id'])
+
+        # Message đã gửi được thì lần gửi lại sau không thêm message nào
+        self.upload(support.image_body(), 'key-1')
+        self.assertEqual(self.sqs.depth(), 0)
+
+    def test_batch_entries_replay_with_derived_keys(self):
+        body = {'images': [support.image_body(), support.image_body(support.jpeg('blue'))]}
+        _, first = self.upload(body, 'batch-key')
+        _, replay = self.upload(body, 'batch-key')
+
+        self.assertEqual([job['job_id'] for job in replay['jobs']], [job['job_id'] for job in first['jobs']])
+        self.assertTrue(all(job.get('replayed') for job in replay['jobs']))
+        self.assertEqual(self.sqs.depth(), 2)
+
+    def test_duplicate_s3_event_creates_one_job(self):
+        self.fakes['s3'].put_object(Bucket='test-bucket', Key='incoming/job-1.jpg', Body=support.jpeg(),
+                                    ContentType='image/jpeg')
+        event = {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'test-bucket'},
+                                                              'object': {'key': 'incoming/job-1.jpg'}}}]}
+        with support.quiet():
+            lambda_upload_handler.lambda_handler(event, None)
+            lambda_upload_handler.lambda_handler(event, None)
+
+        self.assertEqual(self.sqs.depth(), 1)
+        self.assertEqual(self.table.get_item(Key={'job_id': 'job-1'})['Item']['status'], 'PENDING')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import json
+import unittest
+from unittest import mock
+from . import support
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+HEIC = b'\x00\x00\x00\x18ftypheic' + bytes(40)
+AVIF = b'\x00\x00\x00\x1cftypavif' + bytes(40)
+
+class UploadFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def test_undecodable_format_is_rejected(self):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(HEIC)), None)
+
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('image/heic', json.loads(response['body'])['error'])
+
+    def test_presigned_upload_is_sniffed_not_trusted(self):
+        self.fakes['s3'].put_object(Bucket='test-bucket', Key='incoming/job-1.jpg', Body=HEIC, ContentType='image/jpeg')
+        event = {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'test-bucket'},
+                                                              'object': {'key': 'incoming/job-1.jpg'}}}]}
+        with support.quiet():
+            lambda_upload_handler.lambda_handler(event, None)
+
+        self.assertEqual(self.fakes['sqs'].depth(), 0)
+        self.assertEqual(self.fakes['dynamodb'].Table('jobs').get_item(Key={'job_id': 'job-1'})['Item']['status'], 'FAILED')
+
+    def test_format_the_processor_cannot_decode_fails_without_retry(self):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(AVIF)), None)
+        job_id = json.loads(response['body'])['job_id']
+        with mock.patch('PIL.features.check', return_value=False), support.quiet():
+            result = processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+
+        item = self.fakes['dynamodb'].Table('jobs').get_item(Key={'job_id': job_id})['Item']
+        self.assertEqual(result, {'batchItemFailures': []})
+        self.assertEqual(item['status'], 'FAILED')
+        self.assertIn('image/avif', item['error_message'])
+        self.assertEqual(self.fakes['rekognition'].calls, 0)
+
+def palette_image(format, **options):
+    """Ảnh palette dùng hết 256 màu: không còn chỗ cho màu viền/chữ mới"""
+    from PIL import Image
+
+    image = Image.new('P', (64, 48))
+    image.putpalette([value for index in range(256) for value in (index, 255 - index, index * 7 % 256)])
+    image.putdata([index % 256 for index in range(64 * 48)])
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+class PaletteRenderTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def test_full_palette_images_are_drawn_in_rgb(self):
+        from PIL import Image
+
+        cases = [('GIF', palette_image('GIF'), 'JPEG', 'RGB'),
+                 ('PNG', palette_image('PNG'), 'JPEG', 'RGB'),
+                 ('PNG with transparency', palette_image('PNG', transparency=0), 'PNG', 'RGBA')]
+        for name, data, output_format, mode in cases:
+            with self.subTest(name), support.quiet():
+                response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(data)), None)
+                job_id = json.loads(response['body'])['job_id']
+                result = processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+
+                item = self.fakes['dynamodb'].Table('jobs').get_item(Key={'job_id': job_id})['Item']
+                self.assertEqual(result, {'batchItemFailures': []})
+                self.assertEqual(item['status'], 'COMPLETED')
+                with Image.open(io.BytesIO(self.fakes['s3'].objects[item['processed_s3_key']]['Body'])) as output:
+                    self.assertEqual((output.format, output.mode), (output_format, mode))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import unittest
+from decimal import Decimal
+from unittest import mock
+from . import support
+import aws_fakes
+import job_index
+import label_index
+import lambda_get_job_status
+
+def job(job_id, status, created_at):
+    return {'job_id': job_id, 'status': status, 'created_at': Decimal(str(created_at))}
+
+class ParseTimeTest(unittest.TestCase):
+    def test_epoch_seconds(self):
+        self.assertEqual(job_index.parse_time('1700000000.1234'), Decimal('1700000000.123'))
+
+    def test_iso_8601(self):
+        self.assertEqual(job_index.parse_time('2023-11-14T22:13:20+00:00'), Decimal(1700000000))
+        self.assertEqual(job_index.parse_time('2023-11-15T05:13:20+07:00'), Decimal(1700000000))
+        # Không có múi giờ thì hiểu là UTC
+        self.assertEqual(job_index.parse_time('2023-11-14T22:13:20'), Decimal(1700000000))
+
+    def test_invalid_time(self):
+        for value in ('yesterday', 'nan', 'inf', ''):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                job_index.parse_time(value)
+
+    def test_to_iso(self):
+        self.assertEqual(job_index.to_iso(Decimal('1700000000.5')), '2023-11-14T22:13:20.500+00:00')
+        self.assertEqual(job_index.to_iso('2023-11-14T22:13:20'), '2023-11-14T22:13:20')
+        self.assertIsNone(job_index.to_iso(None))
+
+class QueryTest(unittest.TestCase):
+    def setUp(self):
+        self.table = aws_fakes.FakeTable('jobs', ['job_id'])
+        for index, status in enumerate(['FAILED', 'FAILED', 'COMPLETED', 'FAILED']):
+            self.table.put_item(Item=job(f'job-{index}', status, 100 + index * 10))
+
+    def ids(self, items):
+        return sorted(item['job_id'] for item in items)
+
+    def test_since_and_until_use_between(self):
+        table = mock.Mock(wraps=self.table)
+
+        items, cursor = job_index.query('FAILED', Decimal(105), Decimal(130), table=table)
+
+        request = table.query.call_args.kwargs
+        self.assertEqual(request['KeyConditionExpression'], '#status = :status AND #created BETWEEN :since AND :until')
+        self.assertEqual(request['IndexName'], job_index.STATUS_INDEX_NAME)
+        self.assertFalse(request['ScanIndexForward'])
+        self.assertEqual(self.ids(items), ['job-1', 'job-3'])
+        self.assertIsNone(cursor)
+
+    def test_open_ended_ranges(self):
+        self.assertEqual(self.ids(job_index.query('FAILED', since=Decimal(110), table=self.table)[0]), ['job-1', 'job-3'])
+        self.assertEqual(self.ids(job_index.query('FAILED', until=Decimal(110), table=self.table)[0]), ['job-0', 'job-1'])
+        self.assertEqual(self.ids(job_index.query('FAILED', table=self.table)[0]), ['job-0', 'job-1', 'job-3'])
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValueError):
+            job_index.query('DONE', table=self.table)
+
+class CursorTest(unittest.TestCase):
+    def setUp(self):
+        self.table = mock.Mock()
+        self.table.query.return_value = {'Items': [], 'LastEvaluatedKey': job('job-1', 'FAILED', '110.5')}
+
+    def test_last_evaluated_key_round_trips_through_the_cursor(self):
+        _, cursor = job_index.query('FAILED', limit=1, table=self.table)
+        job_index.query('FAILED', limit=1, cursor=cursor, table=self.table)
+
+        self.assertEqual(self.table.query.call_args.kwargs['ExclusiveStartKey'], job('job-1', 'FAILED', '110.5'))
+
+    def test_invalid_cursors_are_rejected(self):
+        cursors = [
+            'not base64!',
+            label_index.encode_cursor(['job-1']),
+            # Cursor của trạng thái khác hoặc thiếu/sai key
+            label_index.encode_cursor({'status': 'COMPLETED', 'created_at': '110', 'job_id': 'job-1'}),
+            label_index.encode_cursor({'status': 'FAILED', 'created_at': '110'}),
+            label_index.encode_cursor({'status': 'FAILED', 'created_at': '110', 'job_id': 7}),
+            label_index.encode_cursor({'status': 'FAILED', 'created_at': 'soon', 'job_id': 'job-1'}),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                job_index.query('FAILED', cursor=cursor, table=self.table)
+        self.table.query.assert_not_called()
+
+class MigrateTest(unittest.TestCase):
+    def test_string_timestamps_are_converted_to_epoch(self):
+        table = mock.Mock()
+        table.scan.side_effect = [
+            {'Items': [{'job_id': 'a', 'created_at': '2023-11-14T22:13:20', 'completed_at': Decimal('1700000001')}],
+             'LastEvaluatedKey': {'job_id': 'a'}},
+            {'Items': [{'job_id': 'b', 'created_at': '2023-11-14T22:13:20.250000', 'completed_at': '2023-11-14T22:13:21'}]},
+        ]
+
+        self.assertEqual(job_index.migrate(table), 2)
+
+        self.assertEqual(table.scan.call_args_list[1].kwargs['ExclusiveStartKey'], {'job_id': 'a'})
+        first, second = [call.kwargs for call in table.update_item.call_args_list]
+        self.assertEqual(first, {'Key': {'job_id': 'a'}, 'UpdateExpression': 'SET created_at = :created_at',
+                                 'ExpressionAttributeValues': {':created_at': Decimal(1700000000)}})
+        self.assertEqual(second['UpdateExpression'], 'SET created_at = :created_at, completed_at = :completed_at')
+        self.assertEqual(second['ExpressionAttributeValues'],
+                         {':created_at': Decimal('1700000000.25'), ':completed_at': Decimal(1700000001)})
+
+class ListJobsTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        table = self.fakes['dynamodb'].Table('jobs')
+        table.put_item(Item=job('job-0', 'FAILED', 1700000000))
+        table.put_item(Item=job('job-1', 'COMPLETED', 1700000000))
+
+    def request(self, **params):
+        with support.quiet():
+            return lambda_get_job_status.lambda_handler({'queryStringParameters': params}, None)
+
+    def test_jobs_are_listed_with_iso_times(self):
+        response = self.request(status='failed', since='2023-11-14T00:00:00Z', until='1800000000')
+
+        self.assertEqual(response['statusCode'], 200)
+        body = json.loads(response['body'])
+        self.assertEqual([entry['job_id'] for entry in body['jobs']], ['job-0'])
+        self.assertEqual(body['jobs'][0]['created_at'], '2023-11-14T22:13:20.000+00:00')
+        self.assertIsNone(body['next_cursor'])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'cursor': 'garbage'}, {'since': 'yesterday'}, {'since': '200', 'until': '100'}, {'limit': '0'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.request(status='FAILED', **params)['statusCode'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from . import support  # noqa: F401 (sys.path)
+import label_codec
+
+LABELS = [
+    {'name': 'Person', 'confidence': 99.123, 'bounding_box': {'Left': 0.1, 'Top': 0.2, 'Width': 0.3, 'Height': 0.4}},
+    {'name': 'Chair', 'confidence': 87.5, 'bounding_box': {'Left': 0.5, 'Top': 0.55, 'Width': 0.15, 'Height': 0.3}},
+    {'name': 'Person', 'confidence': 97.4, 'bounding_box': {'Left': 0.55, 'Top': 0.1, 'Width': 0.22, 'Height': 0.78}},
+]
+
+class LabelCodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        names, blob = label_codec.encode_labels(LABELS)
+        decoded = label_codec.decode_labels(names, blob)
+
+        self.assertEqual(names, ['Person', 'Chair'])
+        self.assertEqual(len(blob), len(LABELS) * label_codec.FIELDS_PER_INSTANCE * 4)
+        self.assertEqual([label['name'] for label in decoded], [label['name'] for label in LABELS])
+        for original, label in zip(LABELS, decoded):
+            self.assertAlmostEqual(label['confidence'], original['confidence'], places=3)
+            for key, value in original['bounding_box'].items():
+                self.assertAlmostEqual(label['bounding_box'][key], value, places=6)
+
+    def test_empty(self):
+        names, blob = label_codec.encode_labels([])
+        self.assertEqual((names, blob), ([], b''))
+        self.assertEqual(label_codec.decode_labels(names, blob), [])
+
+    def test_flatten_compact_labels(self):
+        compact = [
+            {'name': 'Person', 'confidence': 99.0, 'instances': [
+                {'bounding_box': LABELS[0]['bounding_box'], 'confidence': 99.0},
+                {'bounding_box': LABELS[2]['bounding_box'], 'confidence': 97.4},
+            ]},
+            {'name': 'Indoors', 'confidence': 76.0, 'instances': []},
+        ]
+        flat = label_codec.flatten_labels(compact)
+
+        self.assertEqual([label['name'] for label in flat], ['Person', 'Person'])
+        self.assertEqual(flat[1]['bounding_box'], LABELS[2]['bounding_box'])
+
+if __name__ == '__main__':
+    unittest.main()
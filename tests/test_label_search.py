@@ -0,0 +1,39 @@
+import json
+import unittest
+from unittest import mock
+from . import support
+import aws_fakes
+import label_index
+import lambda_search_labels
+
+def search(**params):
+    with support.quiet():
+        response = lambda_search_labels.lambda_handler({'queryStringParameters': params}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def test_unconfigured_index_returns_503(self):
+        status, body = search(label='Person')
+
+        self.assertEqual(status, 503)
+        self.assertIn('not configured', body['error'])
+
+    def test_configured_index_is_queried(self):
+        self.fakes['dynamodb'].tables['labels'] = aws_fakes.FakeTable('labels', ['label', 'rank'])
+        with mock.patch.object(label_index, 'LABEL_INDEX_TABLE_NAME', 'labels'):
+            label_index.index_job('job-1', [{'name': 'Person', 'confidence': 99.1, 'instances': [{}, {}]}])
+            label_index.index_job('job-2', [{'name': 'Chair', 'confidence': 87.5, 'instances': [{}]}])
+
+            status, body = search(label='person', min_confidence='90')
+            self.assertEqual(status, 200)
+            self.assertEqual(body['matches'], [{'job_id': 'job-1', 'name': 'Person', 'confidence': 99.1, 'instances': 2}])
+
+            self.assertEqual(search()[0], 400)
+            self.assertEqual(search(label='Person', min_confidence='120')[0], 400)
+            self.assertEqual(search(label='Person', cursor='not-a-cursor')[0], 400)
+
+if __name__ == '__main__':
+    unittest.main()
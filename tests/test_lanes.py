@@ -0,0 +1,83 @@
+import importlib
+import json
+import os
+import unittest
+from unittest import mock
+from . import support
+import lanes
+import lambda_get_job_status
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+BULK_QUEUE_URL = 'https://sqs.local/test-bulk'
+
+class LaneTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        self.sqs = self.fakes['sqs']
+
+    def submit(self, priority):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(
+                support.upload_event(support.image_body(render=False, priority=priority)), None)
+        return json.loads(response['body'])['job_id']
+
+    def queue_depth(self):
+        with support.quiet():
+            response = lambda_get_job_status.lambda_handler({'queryStringParameters': {'queue_depth': 'true'}}, None)
+        return json.loads(response['body'])['lanes']
+
+    def test_each_lane_has_its_own_queue(self):
+        with mock.patch.dict(os.environ, {'BULK_QUEUE_URL': BULK_QUEUE_URL}):
+            bulk = [self.submit('bulk') for _ in range(3)]
+            interactive = self.submit('interactive')
+            depths = self.queue_depth()
+
+        self.assertEqual((depths['interactive']['visible'], depths['bulk']['visible']), (1, 3))
+        self.assertFalse(depths['bulk']['shared_queue'])
+        # Hàng đợi interactive không có job bulk nào đứng trước
+        first = self.sqs.receive_batch(10, wait=0, queue_url=lanes.queue_url('interactive'))
+        self.assertEqual([json.loads(record['body'])['job_id'] for record in first], [interactive])
+        queued = self.sqs.receive_batch(10, wait=0, queue_url=BULK_QUEUE_URL)
+        self.assertEqual([json.loads(record['body'])['job_id'] for record in queued], bulk)
+
+    def test_shared_queue_starts_interactive_jobs_first(self):
+        bulk = [self.submit('bulk') for _ in range(3)]
+        interactive = self.submit('interactive')
+        depths = self.queue_depth()
+        self.assertEqual(depths['bulk']['visible'], 4)
+        self.assertTrue(depths['bulk']['shared_queue'])
+
+        started = []
+        process_record = processor.process_record
+
+        def record_start(record, lease):
+            started.append(json.loads(record['body'])['job_id'])
+            return process_record(record, lease)
+
+        with mock.patch.object(processor, 'BATCH_WORKERS', 1), \
+                mock.patch.object(processor, 'process_record', side_effect=record_start), support.quiet():
+            response = processor.lambda_handler({'Records': self.sqs.receive_batch(10, wait=0)}, None)
+
+        self.assertEqual(response, {'batchItemFailures': []})
+        self.assertEqual(started, [interactive, *bulk])
+
+    def test_unknown_priority_is_rejected(self):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(
+                support.upload_event(support.image_body(priority='urgent')), None)
+
+        self.assertEqual(response['statusCode'], 400)
+        self.assertEqual(self.sqs.depth(), 0)
+
+    def test_unknown_default_priority_fails_at_import(self):
+        self.addCleanup(importlib.reload, lanes)
+        with mock.patch.dict(os.environ, {'DEFAULT_PRIORITY': 'interactve'}), self.assertRaises(ValueError):
+            importlib.reload(lanes)
+
+        with mock.patch.dict(os.environ, {'DEFAULT_PRIORITY': 'bulk'}):
+            importlib.reload(lanes)
+        self.assertEqual(lanes.parse_priority(None), 'bulk')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import time
+import unittest
+from unittest import mock
+from . import support
+import metrics
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.records = []
+        for name, value in [('ENABLED', True), ('listeners', [self.records.append])]:
+            patcher = mock.patch.object(metrics, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_job_emits_one_emf_record(self):
+        @metrics.timed('decode')
+        def decode():
+            return 'image'
+
+        with support.quiet() as output:
+            with metrics.job('processor', dimensions={'Lane': 'bulk'}, job_id='job-1') as job_metrics:
+                self.assertEqual(decode(), 'image')
+                with metrics.timer('decode'):
+                    pass
+                metrics.count('labels', 3)
+                metrics.count('labels', 2)
+                metrics.gauge('rate', 4.5, 'Count/Second')
+            # Ngoài job thì timer/count không ghi vào đâu cả
+            with metrics.timer('detect'):
+                metrics.count('labels')
+
+        record, = self.records
+        self.assertEqual(json.loads(output.getvalue()), json.loads(json.dumps(record)))
+        self.assertIsNone(metrics.current())
+        self.assertEqual((record['Service'], record['Lane'], record['job_id']), ('processor', 'bulk', 'job-1'))
+        self.assertEqual((record['labels'], record['rate']), (5, 4.5))
+        self.assertNotIn('detect', record)
+        self.assertGreaterEqual(record['total'], record['decode'])
+        emf, = record['_aws']['CloudWatchMetrics']
+        self.assertEqual(emf['Dimensions'], [['Service'], ['Service', 'Lane']])
+        units = {definition['Name']: definition['Unit'] for definition in emf['Metrics']}
+        self.assertEqual(units, {'decode': 'Milliseconds', 'total': 'Milliseconds', 'labels': 'Count', 'rate': 'Count/Second'})
+        self.assertEqual(job_metrics.timings.keys(), {'decode'})
+
+    def test_record_is_emitted_when_the_job_fails(self):
+        with support.quiet(), self.assertRaises(RuntimeError):
+            with metrics.job('processor'):
+                metrics.count('errors')
+                raise RuntimeError('boom')
+
+        self.assertEqual(self.records[0]['errors'], 1)
+
+    def test_disabled_metrics_do_nothing(self):
+        with mock.patch.object(metrics, 'ENABLED', False), support.quiet() as output:
+            with metrics.job('upload') as job_metrics:
+                with metrics.timer('s3_put'):
+                    pass
+                metrics.count('images')
+
+        self.assertEqual((job_metrics.timings, job_metrics.counters), ({}, {}))
+        self.assertEqual((self.records, output.getvalue()), ([], ''))
+
+    def test_processor_records_queue_wait(self):
+        fakes = support.install()
+        with support.quiet():
+            lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(render=False)), None)
+            records = fakes['sqs'].receive_batch(wait=0)
+            # Message đã nằm trong hàng đợi 5 giây
+            records[0]['attributes']['SentTimestamp'] = str(int((time.time() - 5) * 1000))
+            processor.lambda_handler({'Records': records}, None)
+
+        upload, = [record for record in self.records if record['Service'] == 'upload']
+        job, = [record for record in self.records if record['Service'] == 'processor']
+        self.assertEqual(upload['status_code'], 200)
+        self.assertGreaterEqual(job['queue_wait'], 5000)
+        self.assertLess(job['queue_wait'], 10000)
+        self.assertEqual((job['Lane'], job['receive_count']), ('interactive', 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import io
+import unittest
+from unittest import mock
+from PIL import Image, JpegImagePlugin
+from . import support
+import preprocessing
+
+def encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+class TargetSizeTest(unittest.TestCase):
+    def test_long_edge_is_capped_keeping_aspect_ratio(self):
+        self.assertEqual(preprocessing.target_size(4000, 3000, 1920), (1920, 1440))
+        self.assertEqual(preprocessing.target_size(3000, 4000, 1920), (1440, 1920))
+        self.assertEqual(preprocessing.target_size(10000, 3, 1000), (1000, 1))
+
+    def test_small_images_are_not_enlarged(self):
+        self.assertEqual(preprocessing.target_size(640, 480, 1920), (640, 480))
+
+class PrepareBytesTest(unittest.TestCase):
+    def test_large_jpeg_is_drafted_down_to_max_edge(self):
+        data = support.jpeg(size=(4000, 3000))
+        decoded_sizes, original_draft = [], JpegImagePlugin.JpegImageFile.draft
+
+        def draft(image, mode, size):
+            result = original_draft(image, mode, size)
+            decoded_sizes.append(image.size)
+            return result
+
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True, side_effect=draft) as drafted:
+            prepared = preprocessing.prepare_bytes(data, max_edge=1000)
+
+        # draft() cho decoder JPEG giải mã thẳng ở 1/4 kích thước, không decode ảnh 12MP
+        self.assertEqual(drafted.call_args.args[1:], ('RGB', (1000, 750)))
+        self.assertEqual(decoded_sizes, [(1000, 750)])
+        self.assertTrue(prepared.resized)
+        self.assertEqual((prepared.width, prepared.height, prepared.original_width, prepared.original_height), (1000, 750, 4000, 3000))
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (1000, 750)))
+
+    def test_small_jpeg_and_png_are_returned_unchanged(self):
+        for data in (support.jpeg(size=(640, 480)), encode(Image.new('RGBA', (640, 480)), 'PNG')):
+            with self.subTest(format=data[:4]):
+                prepared = preprocessing.prepare_bytes(data, max_edge=1920)
+
+                self.assertIs(prepared.data, data)
+                self.assertFalse(prepared.resized)
+
+    def test_other_formats_are_converted_to_jpeg(self):
+        data = encode(Image.new('RGBA', (64, 48), (255, 0, 0, 128)), 'WEBP')
+
+        prepared = preprocessing.prepare_bytes(data)
+
+        self.assertFalse(prepared.resized)
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', (64, 48)))
+
+    def test_oversized_bytes_are_reencoded(self):
+        data = encode(Image.effect_noise((256, 256), 64).convert('RGB'), 'PNG')
+
+        with mock.patch.object(preprocessing, 'MAX_BYTES', len(data) - 1):
+            prepared = preprocessing.prepare_bytes(data)
+
+        self.assertIsNot(prepared.data, data)
+        self.assertEqual(prepared.data[:2], b'\xff\xd8')
+
+    def test_exif_orientation_is_kept_and_other_metadata_dropped(self):
+        exif = Image.Exif()
+        exif[preprocessing.ORIENTATION] = 6
+        exif[0x010F] = 'Camera maker'
+        data = encode(Image.new('RGB', (400, 300), 'red'), 'JPEG', exif=exif.tobytes())
+
+        prepared = preprocessing.prepare_bytes(data, max_edge=200)
+
+        # Ảnh thu nhỏ giữ pixel gốc (chưa xoay) và tag Orientation, giống ảnh gốc Rekognition nhận khi không thu nhỏ
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            self.assertEqual(image.size, (200, 150))
+            self.assertEqual(dict(image.getexif()), {preprocessing.ORIENTATION: 6})
+
+    def test_resized_image_without_orientation_has_no_exif(self):
+        prepared = preprocessing.prepare_bytes(support.jpeg(size=(400, 300)), max_edge=200)
+
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            self.assertEqual(dict(image.getexif()), {})
+
+class PrepareImageTest(unittest.TestCase):
+    def test_exif_orientation_is_kept(self):
+        exif = Image.Exif()
+        exif[preprocessing.ORIENTATION] = 8
+        data = encode(Image.new('RGB', (400, 300), 'red'), 'JPEG', exif=exif.tobytes())
+
+        # Processing Lambda gửi ảnh đã decode (PREPROCESS_MAX_EDGE, tile, frame) qua prepare_image
+        for max_edge in (200, 1000):
+            with self.subTest(max_edge=max_edge), Image.open(io.BytesIO(data)) as decoded:
+                prepared = preprocessing.prepare_image(decoded, max_edge=max_edge)
+
+                with Image.open(io.BytesIO(prepared.data)) as image:
+                    self.assertEqual(dict(image.getexif()), {preprocessing.ORIENTATION: 8})
+
+        # Lượt toàn ảnh của chế độ tile: box phải cùng hệ toạ độ với các tile (không có EXIF)
+        with Image.open(io.BytesIO(data)) as decoded:
+            prepared = preprocessing.prepare_image(decoded, max_edge=200, keep_orientation=False)
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_decoded_image_is_resized_and_encoded(self):
+        prepared = preprocessing.prepare_image(Image.new('RGBA', (3000, 1000)), max_edge=1500)
+
+        self.assertEqual((prepared.width, prepared.height), (1500, 500))
+        with Image.open(io.BytesIO(prepared.data)) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (1500, 500)))
+
+if __name__ == '__main__':
+    unittest.main()
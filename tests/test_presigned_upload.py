@@ -0,0 +1,85 @@
+import json
+import unittest
+from . import support
+import lambda_upload_handler
+
+class PresignedUploadTest(unittest.TestCase):
+    """Client xin presigned POST, tự upload lên S3, job được tạo khi S3 event tới"""
+
+    def setUp(self):
+        self.fakes = support.install()
+        self.jobs = self.fakes['dynamodb'].tables['jobs']
+
+    def request_upload(self, **options):
+        body = {'mode': 'presigned', 'content_type': 'image/jpeg', 'max_labels': 5, **options}
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(body), None)
+        self.assertEqual(response['statusCode'], 200)
+        return json.loads(response['body'])
+
+    def client_upload(self, upload, data):
+        """Giống S3 xử lý multipart POST: các field x-amz-meta-* thành metadata của object"""
+        fields = upload['fields']
+        metadata = {name[len('x-amz-meta-'):]: value for name, value in fields.items() if name.startswith('x-amz-meta-')}
+        self.fakes['s3'].put_object(Bucket='test-bucket', Key=fields['key'], Body=data,
+                                    ContentType=fields['Content-Type'], Metadata=metadata)
+        return fields['key']
+
+    def s3_event(self, key):
+        event = {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': 'test-bucket'}, 'object': {'key': key}}}]}
+        with support.quiet():
+            return lambda_upload_handler.lambda_handler(event, None)
+
+    def test_upload_creates_job_with_signed_options(self):
+        created = self.request_upload(callback_url='https://hooks.example.com/done', render=False)
+        fields = created['upload']['fields']
+
+        self.assertEqual(created['status'], 'WAITING_UPLOAD')
+        self.assertEqual(fields['key'], f"incoming/{created['job_id']}.jpg")
+        self.assertEqual(fields['x-amz-meta-max-labels'], '5')
+        self.assertEqual(fields['x-amz-meta-render'], 'false')
+        # Chưa upload thì chưa có job hay message nào
+        self.assertEqual((self.jobs.items, self.fakes['sqs'].depth()), ({}, 0))
+
+        key = self.client_upload(created['upload'], support.jpeg())
+        self.assertEqual(self.s3_event(key)['statusCode'], 200)
+
+        job = self.jobs.items[(created['job_id'],)]
+        self.assertEqual(job['status'], 'PENDING')
+        self.assertNotIn('pending_message', job)
+        message = json.loads(self.fakes['sqs'].receive_batch(10, wait=0)[0]['body'])
+        self.assertEqual(message['job_id'], created['job_id'])
+        self.assertEqual(message['s3_key'], key)
+        self.assertEqual(message['max_labels'], 5)
+        self.assertEqual(message['callback_url'], 'https://hooks.example.com/done')
+        self.assertIs(message['render'], False)
+
+    def test_duplicate_event_is_enqueued_once(self):
+        created = self.request_upload()
+        key = self.client_upload(created['upload'], support.jpeg())
+
+        self.s3_event(key)
+        self.s3_event(key)
+
+        self.assertEqual(len(self.jobs.items), 1)
+        self.assertEqual(self.fakes['sqs'].depth(), 1)
+
+    def test_non_image_upload_fails_the_job(self):
+        created = self.request_upload()
+        key = self.client_upload(created['upload'], b'%PDF-1.7 not an image')
+
+        self.s3_event(key)
+
+        job = self.jobs.items[(created['job_id'],)]
+        self.assertEqual(job['status'], 'FAILED')
+        self.assertEqual(self.fakes['sqs'].depth(), 0)
+
+    def test_unsupported_content_type_is_rejected(self):
+        body = {'mode': 'presigned', 'content_type': 'application/pdf'}
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(body), None)
+
+        self.assertEqual(response['statusCode'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from . import support
+import aws_fakes
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        self.table = self.fakes['dynamodb'].Table('jobs')
+
+    def submit(self, count):
+        body = {'images': [support.image_body(support.jpeg(color), render=False) for color in ('red', 'green', 'blue', 'white')[:count]]}
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(body), None)
+        return [job['job_id'] for job in json.loads(response['body'])['jobs']]
+
+    def test_only_failed_records_are_returned_to_sqs(self):
+        job_ids = self.submit(3)
+        records = self.fakes['sqs'].receive_batch(10, wait=0)
+        bad = next(record for record in records if json.loads(record['body'])['job_id'] == job_ids[1])
+        detect_labels = self.fakes['rekognition'].detect_labels
+
+        def fail_one(Image, **request):
+            if Image.get('S3Object', {}).get('Name') == json.loads(bad['body'])['s3_key']:
+                raise aws_fakes.client_error('InternalServerError', 'boom', 'DetectLabels')
+            return detect_labels(Image=Image, **request)
+
+        with mock.patch.object(self.fakes['rekognition'], 'detect_labels', side_effect=fail_one), \
+                mock.patch.object(processor.rekognition_retry, 'max_retries', 0), support.quiet():
+            response = processor.lambda_handler({'Records': records}, None)
+
+        self.assertEqual(response, {'batchItemFailures': [{'itemIdentifier': bad['messageId']}]})
+        statuses = [self.table.get_item(Key={'job_id': job_id})['Item']['status'] for job_id in job_ids]
+        self.assertEqual(statuses, ['COMPLETED', 'FAILED', 'COMPLETED'])
+
+    def test_records_run_concurrently_up_to_batch_workers(self):
+        self.submit(4)
+        records = self.fakes['sqs'].receive_batch(10, wait=0)
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def slow_record(record, lease):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        with mock.patch.object(processor, 'BATCH_WORKERS', 2), \
+                mock.patch.object(processor, 'process_record', side_effect=slow_record), support.quiet():
+            response = processor.lambda_handler({'Records': records}, None)
+
+        self.assertEqual(response, {'batchItemFailures': []})
+        self.assertEqual(peak[0], 2)
+
+if __name__ == '__main__':
+    unittest.main()
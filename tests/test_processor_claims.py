@@ -0,0 +1,93 @@
+import json
+import time
+import unittest
+from unittest import mock
+from . import support
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+class ClaimTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        self.table = self.fakes['dynamodb'].Table('jobs')
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(render=False)), None)
+        self.job_id = json.loads(response['body'])['job_id']
+        self.record = self.fakes['sqs'].receive_batch(wait=0)[0]
+
+    def process(self, record=None):
+        with support.quiet():
+            return processor.lambda_handler({'Records': [record or self.record]}, None)
+
+    def job(self):
+        return self.table.get_item(Key={'job_id': self.job_id})['Item']
+
+    def test_redelivered_message_is_skipped_after_completion(self):
+        self.assertEqual(self.process(), {'batchItemFailures': []})
+        self.assertEqual(self.process(), {'batchItemFailures': []})
+
+        self.assertEqual(self.job()['status'], 'COMPLETED')
+        self.assertEqual(self.job()['attempts'], 1)
+        self.assertEqual(self.fakes['rekognition'].calls, 1)
+
+    def test_job_held_by_live_lease_is_returned_to_queue(self):
+        processor.claim_job(self.job_id)
+
+        self.assertEqual(self.process(), {'batchItemFailures': [{'itemIdentifier': self.record['messageId']}]})
+        self.assertEqual(self.job()['status'], 'PROCESSING')
+        self.assertEqual(self.fakes['rekognition'].calls, 0)
+
+    def test_expired_lease_is_reclaimed(self):
+        stale_claim = processor.claim_job(self.job_id)
+        self.table.items[(self.job_id,)]['lease_until'] = int(time.time()) - 1
+
+        self.assertEqual(self.process(), {'batchItemFailures': []})
+        self.assertEqual(self.job()['status'], 'COMPLETED')
+        self.assertEqual(self.job()['attempts'], 2)
+        # Lần xử lý cũ không còn giữ job: không ghi được kết quả hay FAILED
+        with self.assertRaises(processor.DuplicateDelivery):
+            processor.complete_job(self.job_id, stale_claim, None)
+        self.assertFalse(processor.update_job_status(self.job_id, 'FAILED', 'late failure', stale_claim))
+
+    def test_failure_after_completion_keeps_job_completed(self):
+        with mock.patch.object(processor.notifier, 'notify_job', side_effect=RuntimeError('notifier down')):
+            self.assertEqual(self.process(), {'batchItemFailures': []})
+
+        self.assertEqual(self.job()['status'], 'COMPLETED')
+        self.assertNotIn('error_message', self.job())
+        self.assertEqual(self.process(), {'batchItemFailures': []})
+        self.assertEqual(self.fakes['rekognition'].calls, 1)
+
+    def test_completed_job_is_never_marked_failed_by_its_own_claim(self):
+        claim_id = processor.claim_job(self.job_id)
+        processor.complete_job(self.job_id, claim_id, None, labels=[])
+
+        self.assertFalse(processor.update_job_status(self.job_id, 'FAILED', 'late failure', claim_id))
+        self.assertEqual(self.job()['status'], 'COMPLETED')
+
+    def test_lease_follows_remaining_invocation_time(self):
+        context = mock.Mock()
+        context.get_remaining_time_in_millis.return_value = 299_500
+        with support.quiet():
+            processor.lambda_handler({'Records': [self.record]}, context)
+
+        # Lần gọi bị timeout sau 300 s thì job được nhận lại ngay, không phải chờ một lease dài hơn
+        self.assertAlmostEqual(int(self.job()['lease_until']), int(time.time()) + 300, delta=1)
+
+    def test_configured_lease_overrides_invocation_time(self):
+        context = mock.Mock()
+        context.get_remaining_time_in_millis.return_value = 299_500
+
+        with mock.patch.object(processor, 'PROCESSING_LEASE_SECONDS', 60):
+            self.assertEqual(processor.lease_seconds(context), 60)
+        self.assertEqual(processor.lease_seconds(None), processor.DEFAULT_LEASE_SECONDS)
+
+    def test_failure_before_completion_marks_job_failed(self):
+        with mock.patch.object(self.fakes['rekognition'], 'detect_labels', side_effect=RuntimeError('boom')):
+            self.assertEqual(len(self.process()['batchItemFailures']), 1)
+
+        self.assertEqual(self.job()['status'], 'FAILED')
+        self.assertEqual(self.job()['error_message'], 'boom')
+
+if __name__ == '__main__':
+    unittest.main()
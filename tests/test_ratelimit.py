@@ -0,0 +1,166 @@
+import unittest
+from unittest import mock
+from . import support
+import aws_fakes
+import metrics
+import ratelimit
+
+class FakeClock:
+    """Thay time.monotonic/time.time/time.sleep của ratelimit: sleep chỉ cộng thời gian, không chờ thật"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def install(self, test):
+        for name, value in [('monotonic', self.time), ('time', self.time), ('sleep', self.sleep)]:
+            patcher = mock.patch.object(ratelimit.time, name, side_effect=value)
+            patcher.start()
+            test.addCleanup(patcher.stop)
+
+def throttling():
+    return aws_fakes.client_error('ThrottlingException', 'Rate exceeded', 'DetectLabels')
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.install(self)
+
+    def test_calls_beyond_the_burst_wait_for_tokens(self):
+        limiter = ratelimit.RateLimiter(rate=4)
+        start = self.clock.now
+
+        for _ in range(8):
+            limiter.acquire()
+
+        # 4 lượt đầu dùng burst, 4 lượt sau mỗi lượt chờ 1/4 giây
+        self.assertAlmostEqual(self.clock.now - start, 1.0)
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.install(self)
+
+    def test_throttle_halves_rate_once_per_cooldown(self):
+        limiter = ratelimit.AdaptiveRateLimiter(max_rate=20, min_rate=3)
+
+        limiter.on_throttle()
+        limiter.on_throttle()
+        self.assertEqual((limiter.rate, limiter.throttles), (10, 2))
+
+        self.clock.now += limiter.cooldown
+        limiter.on_throttle()
+        self.clock.now += limiter.cooldown
+        limiter.on_throttle()
+        self.assertEqual(limiter.rate, 3)
+
+    def test_success_increases_rate_linearly_up_to_max(self):
+        limiter = ratelimit.AdaptiveRateLimiter(max_rate=10, initial_rate=4, increase=1)
+
+        # Khoảng `rate` lần thành công (một giây ở tốc độ hiện tại) tăng tốc độ thêm `increase`
+        for _ in range(4):
+            limiter.on_success()
+        self.assertAlmostEqual(limiter.rate, 5, delta=0.2)
+
+        for _ in range(200):
+            limiter.on_success()
+        self.assertEqual(limiter.rate, 10)
+
+    def test_shared_limiter_is_acquired_after_local_token(self):
+        shared = mock.Mock()
+        limiter = ratelimit.AdaptiveRateLimiter(max_rate=5, shared=shared)
+
+        limiter.acquire()
+
+        shared.acquire.assert_called_once_with()
+
+class DynamoDBRateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(now=1000.5)
+        self.clock.install(self)
+        self.table = aws_fakes.FakeTable('limits', ['limiter'])
+
+    def test_calls_over_the_limit_wait_for_the_next_second(self):
+        limiter = ratelimit.DynamoDBRateLimiter('limits', 'rekognition', rate=2, table=self.table)
+        # Container khác (cùng tên limiter) dùng chung bộ đếm
+        other = ratelimit.DynamoDBRateLimiter('limits', 'rekognition', rate=2, table=self.table)
+
+        limiter.acquire()
+        other.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        limiter.acquire()
+
+        self.assertEqual(self.table.items[('rekognition#1000',)]['calls'], 2)
+        self.assertEqual(self.table.items[('rekognition#1001',)]['calls'], 1)
+        self.assertEqual(self.table.items[('rekognition#1001',)]['expires_at'], 1061)
+        self.assertEqual(len(self.clock.sleeps), 1)
+        self.assertGreaterEqual(self.clock.sleeps[0], 0.5)
+
+class ThrottlingRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.install(self)
+
+    def test_throttled_call_is_retried_and_slows_the_limiter(self):
+        limiter = ratelimit.AdaptiveRateLimiter(max_rate=10)
+        retry = ratelimit.ThrottlingRetry(limiter, max_retries=3)
+        detect = mock.Mock(side_effect=[throttling(), throttling(), {'Labels': []}])
+        records = []
+
+        with mock.patch.object(metrics, 'ENABLED', True), mock.patch.object(metrics, 'listeners', [records.append]), \
+                support.quiet():
+            with metrics.job('processor'):
+                self.assertEqual(retry.call(detect, Image={}), ({'Labels': []}, 3))
+
+        self.assertEqual((retry.throttled, limiter.throttles), (2, 2))
+        self.assertLess(limiter.rate, 10)
+        self.assertEqual(records[0]['throttled'], 2)
+        self.assertEqual(records[0]['rate_limit'], round(limiter.rate, 2))
+
+    def test_backoff_doubles_up_to_max_delay(self):
+        retry = ratelimit.ThrottlingRetry(max_retries=4, base_delay=0.1, max_delay=0.3)
+        detect = mock.Mock(side_effect=[throttling()] * 4 + ['ok'])
+
+        # Jitter lấy cận trên để thấy đúng giới hạn base_delay * 2^attempt (chặn bởi max_delay)
+        with mock.patch.object(ratelimit.random, 'uniform', side_effect=lambda low, high: high):
+            self.assertEqual(retry.call(detect), ('ok', 5))
+
+        self.assertEqual(self.clock.sleeps, [0.1, 0.2, 0.3, 0.3])
+
+    def test_gives_up_after_max_retries(self):
+        retry = ratelimit.ThrottlingRetry(max_retries=2)
+        detect = mock.Mock(side_effect=throttling())
+
+        with self.assertRaises(Exception) as raised:
+            retry.call(detect)
+
+        self.assertTrue(ratelimit.is_throttling(raised.exception))
+        self.assertEqual(detect.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        retry = ratelimit.ThrottlingRetry(max_retries=2)
+        detect = mock.Mock(side_effect=aws_fakes.client_error('InvalidImageFormatException', 'bad', 'DetectLabels'))
+
+        with self.assertRaises(Exception):
+            retry.call(detect)
+
+        detect.assert_called_once()
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_transient_errors_are_retried_without_slowing_down(self):
+        limiter = ratelimit.AdaptiveRateLimiter(max_rate=10)
+        retry = ratelimit.ThrottlingRetry(limiter)
+        detect = mock.Mock(side_effect=[aws_fakes.client_error('ServiceUnavailableException', 'busy', 'DetectLabels'), 'ok'])
+
+        self.assertEqual(retry.call(detect), ('ok', 2))
+        self.assertEqual((limiter.throttles, limiter.rate), (0, 10))
+
+if __name__ == '__main__':
+    unittest.main()
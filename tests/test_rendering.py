@@ -0,0 +1,79 @@
+import json
+import unittest
+from unittest import mock
+from PIL import Image
+from . import support
+import rendering
+import lambda_get_job_status
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+def instance(name, confidence, left, top, width=0.2, height=0.2):
+    return {'name': name, 'confidence': confidence,
+            'bounding_box': {'Left': left, 'Top': top, 'Width': width, 'Height': height}}
+
+class MergeOverlappingTest(unittest.TestCase):
+    def test_near_identical_boxes_merge_onto_the_most_confident(self):
+        # Hai box lệch nhau rất ít (làm tròn khác nhau) vẫn là một đối tượng
+        labels = [instance('Human', 90.0, 0.1, 0.1), instance('Person', 99.0, 0.1001, 0.0999),
+                  instance('Chair', 80.0, 0.6, 0.6)]
+
+        overlays = rendering.build_overlays(labels)
+
+        self.assertEqual([overlay['names'] for overlay in overlays], [['Person', 'Human'], ['Chair']])
+        self.assertEqual(overlays[0]['confidence'], 99.0)
+        self.assertEqual(overlays[0]['bounding_box']['Left'], 0.1001)
+
+    def test_threshold_keeps_partly_overlapping_boxes_apart(self):
+        # IoU = 0.6 / 1.4 ≈ 0.43
+        labels = [instance('Person', 99.0, 0.0, 0.0, 0.5, 0.5), instance('Person', 95.0, 0.1, 0.1, 0.5, 0.5)]
+
+        self.assertEqual(len(rendering.build_overlays(labels)), 2)
+        self.assertEqual(len(rendering.build_overlays(labels, iou_threshold=0.4)), 1)
+
+    def test_iou_matrix(self):
+        names, confidences, boxes = rendering.from_instances(
+            [instance('A', 1, 0.0, 0.0, 0.5, 0.5), instance('B', 1, 0.25, 0.0, 0.5, 0.5), instance('C', 1, 0.5, 0.5, 0.0, 0.0)])
+
+        overlaps = rendering.iou_matrix(boxes)
+
+        self.assertAlmostEqual(float(overlaps[0, 1]), 1 / 3, places=5)
+        self.assertEqual(float(overlaps[0, 2]), 0.0)
+        # Box diện tích 0 không gây chia cho 0
+        self.assertEqual(float(overlaps[2, 2]), 0.0)
+
+    def test_no_labels(self):
+        self.assertEqual(rendering.build_overlays([]), [])
+
+    def test_render_draws_merged_boxes_only(self):
+        image = Image.new('RGB', (100, 100), 'black')
+        labels = [instance('Person', 99.0, 0.1, 0.1), instance('Human', 90.0, 0.1, 0.1)]
+
+        with mock.patch('PIL.ImageDraw.ImageDraw.rectangle') as rectangle:
+            rendering.render_labels(image, *rendering.from_instances(labels))
+
+        rectangle.assert_called_once()
+        self.assertEqual([round(value) for value in rectangle.call_args.args[0]], [10, 10, 30, 30])
+
+class OverlaysFastPathTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def test_render_false_skips_image_download_and_upload(self):
+        s3 = self.fakes['s3']
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(render=False)), None)
+            job_id = json.loads(response['body'])['job_id']
+            with mock.patch.object(s3, 'get_object', wraps=s3.get_object) as get_object:
+                processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+            status = lambda_get_job_status.lambda_handler({'queryStringParameters': {'job_id': job_id}}, None)
+
+        get_object.assert_not_called()
+        self.assertFalse([key for key in s3.objects if key.startswith('processed/')])
+        result = json.loads(status['body'])
+        self.assertEqual(result['status'], 'COMPLETED')
+        # Person và Human cùng box trong FakeRekognition được gộp thành một overlay
+        self.assertIn(['Person', 'Human'], [overlay['names'] for overlay in result['overlays']])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import unittest
+from unittest import mock
+from . import support
+import metrics
+import result_cache
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+def entry(max_labels, min_confidence, label_count):
+    return {'max_labels': max_labels, 'min_confidence': min_confidence, 'label_count': label_count}
+
+class CanServeTest(unittest.TestCase):
+    def test_lower_threshold_and_more_labels_can_serve(self):
+        self.assertTrue(result_cache.can_serve(entry(10, 40, 10), 10, 60))
+        self.assertTrue(result_cache.can_serve(entry(20, 40, 20), 10, 40))
+
+    def test_higher_threshold_cannot_serve(self):
+        self.assertFalse(result_cache.can_serve(entry(10, 60, 3), 10, 40))
+
+    def test_fewer_labels_serve_only_when_rekognition_returned_less_than_asked(self):
+        self.assertFalse(result_cache.can_serve(entry(5, 40, 5), 10, 40))
+        self.assertTrue(result_cache.can_serve(entry(5, 40, 3), 10, 40))
+
+    def test_filter_applies_threshold_and_limit(self):
+        labels = [{'name': name, 'confidence': confidence} for name, confidence in
+                  [('Lamp', 42.0), ('Person', 99.0), ('Chair', 87.5), ('Indoors', 76.0)]]
+        kept = result_cache.filter_labels(labels, 2, 60)
+
+        self.assertEqual([label['name'] for label in kept], ['Person', 'Chair'])
+
+    def test_params_key(self):
+        self.assertEqual(result_cache.cache_params(10, 40), '10#40')
+        self.assertEqual(result_cache.cache_params(10, 55.5), '10#55.5')
+
+class CacheMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install(cache_table='cache')
+        self.records = []
+        for patcher in (mock.patch.object(result_cache, 'CACHE_TABLE_NAME', 'cache'),
+                        mock.patch.object(metrics, 'ENABLED', True),
+                        mock.patch.object(metrics, 'listeners', [self.records.append])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self, body):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(body), None)
+        return json.loads(response['body'])
+
+    def test_hits_and_misses_are_counted_once_at_upload(self):
+        self.upload(support.image_body())
+        with support.quiet():
+            processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+        self.assertEqual(self.upload(support.image_body())['status'], 'COMPLETED')
+        self.upload({'images': [support.image_body(), support.image_body()]})
+
+        uploads = [record for record in self.records if record['Service'] == 'upload']
+        self.assertEqual(sum(record.get('cache_hits', 0) for record in uploads), 3)
+        self.assertEqual(sum(record.get('cache_misses', 0) for record in uploads), 1)
+        self.assertFalse([record for record in self.records if 'cache_hit' in record])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+import zipfile
+from unittest import mock
+from PIL import Image
+from . import support
+import sequence
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+def gradient(reverse=False, size=(64, 48)):
+    """Gradient ngang: difference-hash toàn bit 0 (sáng dần sang phải) hoặc toàn bit 1 (tối dần)"""
+    image = Image.linear_gradient('L').rotate(-90 if reverse else 90).resize(size)
+    return image.convert('RGB')
+
+def png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as output:
+        for name, data in members:
+            output.writestr(name, data)
+    return buffer.getvalue()
+
+def ppm(image, comment=b''):
+    return b'P6\n' + comment + f'{image.width} {image.height}\n255\n'.encode() + image.tobytes()
+
+def brightness(image):
+    """'dark' nếu góc trái tối (gradient sáng dần), 'light' nếu ngược lại"""
+    return 'dark' if image.convert('L').getpixel((0, 0)) < 128 else 'light'
+
+def write_file(test, data, suffix):
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    path = Path(directory.name) / f'input{suffix}'
+    path.write_bytes(data)
+    return path
+
+class SampleTimesTest(unittest.TestCase):
+    def test_first_frame_at_or_after_each_mark(self):
+        timestamps = [index / 4 for index in range(10)]
+
+        self.assertEqual(list(sequence.sample_times(timestamps, 1)), [0, 4, 8])
+        self.assertEqual(list(sequence.sample_times(timestamps, 2)), [0, 2, 4, 6, 8])
+
+    def test_marks_passed_during_a_gap_are_skipped(self):
+        # Frame tại 3.0 thay cho các mốc 1, 2, 3; frame tại 3.2 không thuộc mốc nào mới
+        self.assertEqual(list(sequence.sample_times([0, 3, 3.2, 4], 1)), [0, 1, 3])
+
+class AnalyzeTest(unittest.TestCase):
+    def frames(self, kinds):
+        return [sequence.Frame(float(t), gradient(kind == 'light')) for t, kind in enumerate(kinds)]
+
+    def test_frames_similar_to_last_analyzed_are_skipped(self):
+        detected = []
+
+        def detect(image):
+            detected.append(brightness(image))
+            return [{'name': brightness(image), 'confidence': 90.0, 'instances': []}]
+
+        track = sequence.analyze(self.frames(['dark', 'dark', 'light', 'light', 'dark']), detect, 0.05, concurrency=1)
+
+        self.assertEqual(detected, ['dark', 'light', 'dark'])
+        self.assertEqual(track.frames, {'sampled': 5, 'analyzed': 3, 'skipped': 2})
+        self.assertEqual([(segment['t'], segment['until']) for segment in track.segments], [(0, 2), (2, 4), (4, 4)])
+        self.assertEqual(track.to_dict(), {'duration': 4.0, 'frames': track.frames, 'track': track.segments})
+
+    def test_zero_threshold_analyzes_every_frame(self):
+        track = sequence.analyze(self.frames(['dark'] * 4), lambda image: [], 0)
+
+        self.assertEqual(track.frames, {'sampled': 4, 'analyzed': 4, 'skipped': 0})
+
+    def test_hash_distance(self):
+        dark, light = sequence.frame_hash(gradient()), sequence.frame_hash(gradient(reverse=True))
+
+        self.assertEqual(sequence.hash_distance(dark, dark), 0)
+        self.assertEqual(sequence.hash_distance(dark, light), 1)
+
+class TrackTest(unittest.TestCase):
+    def test_summary_keeps_best_confidence_and_time_range(self):
+        track = sequence.Track(segments=[
+            {'t': 0, 'until': 2, 'labels': [{'name': 'Car', 'confidence': 80.0}, {'name': 'Road', 'confidence': 70.0}]},
+            {'t': 2, 'until': 5, 'labels': [{'name': 'Car', 'confidence': 95.0}]},
+            {'t': 5, 'until': 6, 'labels': []},
+        ])
+
+        self.assertEqual(track.summary(), [
+            {'name': 'Car', 'confidence': 95.0, 'first_seen': 0, 'last_seen': 5, 'frames': 2},
+            {'name': 'Road', 'confidence': 70.0, 'first_seen': 0, 'last_seen': 2, 'frames': 1},
+        ])
+        self.assertEqual([label['name'] for label in track.all_labels()], ['Car', 'Road', 'Car'])
+
+class ArchiveFramesTest(unittest.TestCase):
+    def write(self, members):
+        return write_file(self, archive(members), '.zip')
+
+    def test_images_are_read_in_name_order_at_source_fps(self):
+        path = self.write([
+            ('002.png', png(gradient(reverse=True))), ('001.png', png(gradient())), ('003.png', png(gradient())),
+            ('notes.txt', b'not a frame'), ('__MACOSX/001.png', b'resource fork'), ('frames/', b''),
+        ])
+        options = sequence.SequenceOptions(sample_fps=1, source_fps=2)
+
+        frames = list(sequence.archive_frames(path, options))
+
+        self.assertEqual([(frame.timestamp, brightness(frame.image)) for frame in frames], [(0.0, 'dark'), (1.0, 'dark')])
+        self.assertEqual(len(list(sequence.archive_frames(path, options, max_frames=1))), 1)
+
+    def test_too_many_members_is_rejected(self):
+        path = self.write([(f'{index}.png', png(gradient())) for index in range(3)])
+
+        with self.assertRaises(ValueError):
+            list(sequence.archive_frames(path, sequence.SequenceOptions(), max_members=2))
+
+    def test_oversized_member_is_rejected_before_reading(self):
+        path = self.write([('001.png', png(gradient()))])
+
+        with mock.patch.object(zipfile.ZipFile, 'read') as read, self.assertRaises(ValueError):
+            list(sequence.archive_frames(path, sequence.SequenceOptions(), max_member_bytes=100))
+        read.assert_not_called()
+
+class AnimatedFramesTest(unittest.TestCase):
+    def test_timestamps_come_from_frame_durations(self):
+        buffer = io.BytesIO()
+        first, *rest = [gradient(), gradient(reverse=True), gradient()]
+        first.save(buffer, 'GIF', save_all=True, append_images=rest, duration=[500, 500, 1000], loop=0)
+        path = write_file(self, buffer.getvalue(), '.gif')
+
+        frames = list(sequence.frames(path, 'image/gif', sequence.SequenceOptions(sample_fps=1)))
+
+        self.assertEqual([(frame.timestamp, brightness(frame.image)) for frame in frames], [(0.0, 'dark'), (1.0, 'dark')])
+        self.assertEqual(frames[0].image.mode, 'RGB')
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            sequence.frames('clip.avi', 'video/x-msvideo', sequence.SequenceOptions())
+
+class VideoFramesTest(unittest.TestCase):
+    def ffmpeg(self, stdout, returncode=0, stderr=b''):
+        process = mock.Mock(stdout=io.BytesIO(stdout), stderr=io.BytesIO(stderr))
+        process.wait.return_value = returncode
+        process.poll.return_value = returncode
+        return mock.patch.object(sequence.subprocess, 'Popen', return_value=process)
+
+    def test_read_ppm(self):
+        stream = io.BytesIO(ppm(gradient(size=(4, 2)), b'# ffmpeg\n') + ppm(gradient(reverse=True, size=(4, 2))))
+
+        self.assertEqual(sequence.read_ppm(stream).tobytes(), gradient(size=(4, 2)).tobytes())
+        self.assertEqual(sequence.read_ppm(stream).size, (4, 2))
+        self.assertIsNone(sequence.read_ppm(stream))
+
+    def test_truncated_ppm_ends_the_stream(self):
+        self.assertIsNone(sequence.read_ppm(io.BytesIO(ppm(gradient(size=(4, 2)))[:-1])))
+
+    def test_frames_are_timed_by_sample_fps(self):
+        options = sequence.SequenceOptions(sample_fps=2)
+        with self.ffmpeg(ppm(gradient()) * 3) as popen:
+            frames = list(sequence.video_frames('clip.mp4', options, max_frames=10))
+
+        self.assertEqual([frame.timestamp for frame in frames], [0.0, 0.5, 1.0])
+        command = popen.call_args.args[0]
+        self.assertIn('fps=2,', command[command.index('-vf') + 1])
+        self.assertEqual(command[command.index('-frames:v') + 1], '10')
+
+    def test_ffmpeg_failure_raises(self):
+        with self.ffmpeg(b'', returncode=1, stderr=b'moov atom not found'), self.assertRaises(ValueError) as raised:
+            list(sequence.video_frames('clip.mp4', sequence.SequenceOptions()))
+
+        self.assertIn('moov atom not found', str(raised.exception))
+
+class ProcessSequenceTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+
+    def test_zip_job_stores_track_and_summary(self):
+        data = archive([(f'{index:03}.png', png(gradient(kind))) for index, kind in enumerate([False, False, True, True])])
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body(data, sequence={'source_fps': 1})), None)
+            job_id = json.loads(response['body'])['job_id']
+            record = self.fakes['sqs'].receive_batch(wait=0)[0]
+            self.assertEqual(processor.lambda_handler({'Records': [record]}, None), {'batchItemFailures': []})
+
+        job = self.fakes['dynamodb'].Table('jobs').get_item(Key={'job_id': job_id})['Item']
+        self.assertEqual(job['status'], 'COMPLETED')
+        self.assertEqual(job['frames'], {'sampled': 4, 'analyzed': 2, 'skipped': 2, 'duration': 3})
+        self.assertEqual(self.fakes['rekognition'].calls, 2)
+        summary = json.loads(job['label_summary'])
+        self.assertEqual(summary[0]['name'], 'Person')
+        self.assertEqual(summary[0]['frames'], 2)
+
+        track = json.loads(self.fakes['s3'].objects[job['track_s3_key']]['Body'])
+        self.assertEqual(track['job_id'], job_id)
+        self.assertEqual([segment['t'] for segment in track['track']], [0, 2])
+        self.assertEqual(track['track'][0]['labels'][0]['name'], 'Person')
+
+if __name__ == '__main__':
+    unittest.main()
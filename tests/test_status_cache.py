@@ -0,0 +1,177 @@
+import json
+import unittest
+from unittest import mock
+from . import support
+import signed_urls
+import lambda_get_job_status
+import lambda_rekognition_processor as processor
+import lambda_upload_handler
+
+class CountingSigner:
+    def __init__(self):
+        self.calls = 0
+
+    def sign(self, bucket, key, expires_at):
+        self.calls += 1
+        return f'https://{bucket}.s3.local/{key}?Expires={int(expires_at)}&n={self.calls}'
+
+class SignedUrlCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.signer = CountingSigner()
+        self.now = 1000.0
+        patcher = mock.patch.object(signed_urls.time, 'time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_url_is_reused_until_the_refresh_margin(self):
+        cache = signed_urls.SignedUrlCache(self.signer, ttl=3600, refresh_margin=300)
+
+        first, expires_at = cache.get('bucket', 'processed/a.jpg')
+        self.assertEqual(expires_at, 4600.0)
+        self.now += 3600 - 301
+        self.assertEqual(cache.url('bucket', 'processed/a.jpg'), first)
+        self.assertEqual(self.signer.calls, 1)
+
+        # Còn chưa tới refresh_margin giây thì ký lại với hạn mới
+        self.now += 2
+        second, expires_at = cache.get('bucket', 'processed/a.jpg')
+        self.assertNotEqual(second, first)
+        self.assertEqual((self.signer.calls, expires_at), (2, self.now + 3600))
+
+    def test_refresh_margin_is_at_most_half_the_ttl(self):
+        self.assertEqual(signed_urls.SignedUrlCache(self.signer, ttl=60, refresh_margin=300).refresh_margin, 30)
+
+    def test_least_recently_used_url_is_evicted(self):
+        cache = signed_urls.SignedUrlCache(self.signer, maxsize=2)
+        cache.url('bucket', 'a')
+        cache.url('bucket', 'b')
+        cache.url('bucket', 'a')
+        cache.url('bucket', 'c')
+
+        self.assertEqual(len(cache.cache), 2)
+        cache.url('bucket', 'a')
+        self.assertEqual(self.signer.calls, 3)
+        cache.url('bucket', 'b')
+        self.assertEqual(self.signer.calls, 4)
+
+class StatusResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.fakes = support.install()
+        self.s3 = self.fakes['s3']
+        for name, value in [('url_cache', signed_urls.SignedUrlCache(signed_urls.S3UrlSigner(self.s3))),
+                            ('completed_items', signed_urls.LRUCache(16))]:
+            patcher = mock.patch.object(lambda_get_job_status, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, process=True):
+        with support.quiet():
+            response = lambda_upload_handler.lambda_handler(support.upload_event(support.image_body()), None)
+            if process:
+                processor.lambda_handler({'Records': self.fakes['sqs'].receive_batch(wait=0)}, None)
+        return json.loads(response['body'])['job_id']
+
+    def status(self, headers=None, **params):
+        with support.quiet():
+            return lambda_get_job_status.lambda_handler({'queryStringParameters': params, 'headers': headers}, None)
+
+    def test_completed_job_is_served_from_cache_with_etag(self):
+        job_id = self.submit()
+
+        with mock.patch.object(self.s3, 'generate_presigned_url', wraps=self.s3.generate_presigned_url) as sign, \
+                mock.patch.object(self.fakes['dynamodb'].tables['jobs'], 'get_item',
+                                  wraps=self.fakes['dynamodb'].tables['jobs'].get_item) as get_item:
+            first = self.status(job_id=job_id)
+            second = self.status(job_id=job_id)
+            not_modified = self.status(headers={'if-none-match': f'W/{first["headers"]["ETag"]}'}, job_id=job_id)
+
+        self.assertEqual(first['statusCode'], 200)
+        self.assertEqual(second['body'], first['body'])
+        self.assertEqual(sign.call_count, 2)
+        get_item.assert_called_once()
+        self.assertEqual(first['headers']['Cache-Control'], f'private, max-age={lambda_get_job_status.STATUS_MAX_AGE}')
+        self.assertEqual((not_modified['statusCode'], not_modified['body']), (304, ''))
+        self.assertEqual(not_modified['headers']['ETag'], first['headers']['ETag'])
+
+    def test_pending_job_is_not_cached(self):
+        job_id = self.submit(process=False)
+
+        response = self.status(job_id=job_id)
+
+        self.assertEqual(json.loads(response['body'])['status'], 'PENDING')
+        self.assertEqual(response['headers']['Cache-Control'], 'no-cache')
+        self.assertEqual(len(lambda_get_job_status.completed_items), 0)
+
+    def test_fields_limit_response_and_projection(self):
+        job_id = self.submit()
+        table = self.fakes['dynamodb'].tables['jobs']
+
+        with mock.patch.object(table, 'get_item', wraps=table.get_item) as get_item, \
+                mock.patch.object(self.s3, 'generate_presigned_url') as sign:
+            response = self.status(job_id=job_id, fields='labels')
+
+        self.assertEqual(set(json.loads(response['body'])), {'job_id', 'status', 'labels'})
+        sign.assert_not_called()
+        names = get_item.call_args.kwargs['ExpressionAttributeNames']
+        self.assertEqual(set(names.values()), {'job_id', 'status', 'label_names', 'label_boxes', 'label_summary'})
+        self.assertEqual(self.status(job_id=job_id, fields='labels,secret')['statusCode'], 400)
+
+    def test_job_ids_retries_unprocessed_keys(self):
+        job_ids = [self.submit() for _ in range(3)]
+        dynamodb = self.fakes['dynamodb']
+        batch_get_item = dynamodb.batch_get_item
+
+        def throttled_once(RequestItems):
+            # Lần gọi đầu DynamoDB chỉ trả một key, các key còn lại nằm trong UnprocessedKeys
+            if throttled_once.calls == 0:
+                keys = RequestItems['jobs']['Keys']
+                response = batch_get_item(RequestItems={'jobs': {**RequestItems['jobs'], 'Keys': keys[:1]}})
+                response['UnprocessedKeys'] = {'jobs': {**RequestItems['jobs'], 'Keys': keys[1:]}}
+            else:
+                response = batch_get_item(RequestItems=RequestItems)
+            throttled_once.calls += 1
+            return response
+        throttled_once.calls = 0
+
+        with mock.patch.object(dynamodb, 'batch_get_item', side_effect=throttled_once), \
+                mock.patch.object(lambda_get_job_status.time, 'sleep') as sleep:
+            response = self.status(job_ids=','.join([*job_ids, 'missing', job_ids[0]]), fields='status')
+
+        body = json.loads(response['body'])
+        self.assertEqual([job['job_id'] for job in body['jobs']], job_ids)
+        self.assertEqual(body['not_found'], ['missing'])
+        self.assertEqual(throttled_once.calls, 2)
+        sleep.assert_called_once()
+        self.assertEqual(response['headers']['Cache-Control'], 'no-cache')
+
+    def test_job_ids_still_unprocessed_after_max_retries_are_returned(self):
+        job_ids = [self.submit() for _ in range(3)]
+        dynamodb = self.fakes['dynamodb']
+        batch_get_item = dynamodb.batch_get_item
+
+        def always_throttled(RequestItems):
+            # Mỗi lần gọi DynamoDB chỉ trả key đầu tiên, bảng không hết throttle
+            keys = RequestItems['jobs']['Keys']
+            response = batch_get_item(RequestItems={'jobs': {**RequestItems['jobs'], 'Keys': keys[:1]}})
+            response['UnprocessedKeys'] = {'jobs': {**RequestItems['jobs'], 'Keys': keys[1:]}} if keys[1:] else {}
+            return response
+
+        with mock.patch.object(lambda_get_job_status, 'MAX_BATCH_GET_RETRIES', 1), \
+                mock.patch.object(dynamodb, 'batch_get_item', side_effect=always_throttled) as batch_get, \
+                mock.patch.object(lambda_get_job_status.time, 'sleep') as sleep:
+            response = self.status(job_ids=','.join([*job_ids, 'missing']), fields='status')
+
+        body = json.loads(response['body'])
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual([job['job_id'] for job in body['jobs']], job_ids[:2])
+        self.assertEqual(body['unprocessed'], [job_ids[2], 'missing'])
+        self.assertEqual(body['not_found'], [])
+        self.assertEqual((batch_get.call_count, sleep.call_count), (2, 1))
+        self.assertEqual(response['headers']['Cache-Control'], 'no-cache')
+
+    def test_too_many_job_ids(self):
+        with mock.patch.object(lambda_get_job_status, 'MAX_BATCH_JOB_IDS', 2):
+            self.assertEqual(self.status(job_ids='a,b,c')['statusCode'], 400)
+
+if __name__ == '__main__':
+    unittest.main()
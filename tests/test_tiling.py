@@ -0,0 +1,60 @@
+import unittest
+from . import support  # noqa: F401 (sys.path)
+import tiling
+
+def label(name, left, top, width, height, confidence=90.0):
+    return {'Name': name, 'Confidence': confidence, 'Parents': [], 'Instances': [
+        {'BoundingBox': {'Left': left, 'Top': top, 'Width': width, 'Height': height}, 'Confidence': confidence},
+    ]}
+
+class TileBoxesTest(unittest.TestCase):
+    def test_tiles_cover_image_and_last_tile_touches_edge(self):
+        boxes = tiling.tile_boxes(2500, 1200, tile_size=1024, overlap=0.2)
+
+        self.assertEqual(min(box[0] for box in boxes), 0)
+        self.assertEqual(max(box[2] for box in boxes), 2500)
+        self.assertEqual(max(box[3] for box in boxes), 1200)
+        self.assertTrue(all(box[2] - box[0] <= 1024 and box[3] - box[1] <= 1024 for box in boxes))
+
+    def test_small_image_is_one_tile(self):
+        self.assertEqual(tiling.tile_boxes(800, 600, tile_size=1024), [(0, 0, 800, 600)])
+
+class RemapTest(unittest.TestCase):
+    def test_tile_coordinates_map_to_full_image(self):
+        # Tile 1000x500 bắt đầu tại (2000, 1000) trên ảnh 4000x2000
+        remapped = tiling.remap_labels([label('Car', 0.5, 0.2, 0.1, 0.4)], (2000, 1000, 3000, 1500), 4000, 2000)
+        box = remapped[0]['Instances'][0]['BoundingBox']
+
+        self.assertAlmostEqual(box['Left'], (2000 + 0.5 * 1000) / 4000)
+        self.assertAlmostEqual(box['Top'], (1000 + 0.2 * 500) / 2000)
+        self.assertAlmostEqual(box['Width'], 0.1 * 1000 / 4000)
+        self.assertAlmostEqual(box['Height'], 0.4 * 500 / 2000)
+
+    def test_full_frame_is_unchanged_and_scene_labels_are_kept(self):
+        labels = [label('Car', 0.25, 0.5, 0.1, 0.2), {'Name': 'Outdoors', 'Confidence': 80.0, 'Instances': [], 'Parents': []}]
+        remapped = tiling.remap_labels(labels, (0, 0, 4000, 2000), 4000, 2000)
+
+        self.assertEqual(remapped[0]['Instances'][0]['BoundingBox'], labels[0]['Instances'][0]['BoundingBox'])
+        self.assertEqual(remapped[1], labels[1])
+
+    def test_object_split_across_tiles_is_merged(self):
+        from PIL import Image
+
+        image = Image.new('RGB', (2000, 1000))
+        # Cùng một đối tượng ở vùng chồng lấn của hai tile liền nhau, toạ độ toàn ảnh (900, 100, 200x200)
+        def detect(tile, box):
+            left, top, right, bottom = box
+            if left <= 900 and right >= 1100:
+                return [label('Car', (900 - left) / (right - left), (100 - top) / (bottom - top),
+                              200 / (right - left), 200 / (bottom - top))]
+            return []
+
+        labels = tiling.detect_tiled(image, detect, max_labels=10, tile_size=1024, overlap=0.5, include_full_frame=False)
+        self.assertEqual(len(labels), 1)
+        self.assertEqual(len(labels[0]['Instances']), 1)
+        box = labels[0]['Instances'][0]['BoundingBox']
+        self.assertAlmostEqual(box['Left'], 0.45)
+        self.assertAlmostEqual(box['Width'], 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Kích thước tile (pixel), tỷ lệ chồng lấn giữa hai tile liền nhau và số lời gọi song song
+TILE_SIZE = 1024
+TILE_OVERLAP = 0.2
+TILE_CONCURRENCY = 4
+# Hai box cùng nhãn có diện tích giao / diện tích box nhỏ hơn từ ngưỡng này trở lên được gộp làm một
+MERGE_THRESHOLD = 0.5
+
+def tile_positions(length: int, tile_size: int, stride: int) -> list[int]:
+    """Vị trí bắt đầu các tile trên một chiều, tile cuối áp sát mép ảnh"""
+    if length <= tile_size:
+        return [0]
+    positions = list(range(0, length - tile_size, stride))
+    positions.append(length - tile_size)
+    return positions
+
+def tile_boxes(width: int, height: int, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP) -> list[tuple[int, int, int, int]]:
+    """Chia ảnh thành các tile chồng lấn, trả về (left, top, right, bottom) theo pixel"""
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (left, top, min(width, left + tile_size), min(height, top + tile_size))
+        for top in tile_positions(height, tile_size, stride)
+        for left in tile_positions(width, tile_size, stride)
+    ]
+
+def remap_labels(labels: list[dict], box: tuple[int, int, int, int], width: int, height: int) -> list[dict]:
+    """Đổi BoundingBox của một tile sang toạ độ tỷ lệ (0-1) của toàn ảnh"""
+    left, top, right, bottom = box
+    tile_width, tile_height = right - left, bottom - top
+    remapped = []
+    for label in labels:
+        instances = []
+        for instance in label.get("Instances", []):
+            bbox = instance.get("BoundingBox")
+            if not bbox:
+                continue
+            instances.append({
+                **instance,
+                "BoundingBox": {
+                    "Left": (left + bbox["Left"] * tile_width) / width,
+                    "Top": (top + bbox["Top"] * tile_height) / height,
+                    "Width": bbox["Width"] * tile_width / width,
+                    "Height": bbox["Height"] * tile_height / height,
+                },
+            })
+        remapped.append({**label, "Instances": instances})
+    return remapped
+
+def overlap_matrix(boxes: 'np.ndarray') -> 'np.ndarray':
+    """Diện tích giao / diện tích box nhỏ hơn giữa mọi cặp box (left, top, width, height)"""
+    import numpy as np
+
+    left, top = boxes[:, 0], boxes[:, 1]
+    right, bottom = left + boxes[:, 2], top + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    inter_width = np.clip(np.minimum(right[:, None], right[None, :]) - np.maximum(left[:, None], left[None, :]), 0, None)
+    inter_height = np.clip(np.minimum(bottom[:, None], bottom[None, :]) - np.maximum(top[:, None], top[None, :]), 0, None)
+    smaller = np.minimum(areas[:, None], areas[None, :])
+    return np.divide(inter_width * inter_height, smaller, out=np.zeros_like(smaller), where=smaller > 0)
+
+def merge_instances(instances: list[dict], threshold: float = MERGE_THRESHOLD) -> list[dict]:
+    """
+    Gộp các instance cùng nhãn bị cắt hoặc lặp lại ở vùng chồng lấn giữa các tile:
+    cả cụm được thay bằng box bao ngoài với confidence cao nhất.
+    """
+    import numpy as np
+
+    if not instances:
+        return []
+
+    boxes = np.array([[instance["BoundingBox"][key] for key in ("Left", "Top", "Width", "Height")] for instance in instances], dtype=np.float64)
+    confidences = np.array([instance.get("Confidence") or 0.0 for instance in instances])
+    overlaps = overlap_matrix(boxes)
+    np.fill_diagonal(overlaps, 1.0)
+    order = np.argsort(-confidences, kind="stable")
+
+    merged = []
+    while order.size:
+        best = order[0]
+        members = order[overlaps[best, order] >= threshold]
+        left, top = boxes[members, 0].min(), boxes[members, 1].min()
+        right, bottom = (boxes[members, 0] + boxes[members, 2]).max(), (boxes[members, 1] + boxes[members, 3]).max()
+        merged.append({
+            **instances[best],
+            "BoundingBox": {"Left": float(left), "Top": float(top), "Width": float(right - left), "Height": float(bottom - top)},
+        })
+        order = order[overlaps[best, order] < threshold]
+    return merged
+
+def merge_tiled_labels(results: list[list[dict]], max_labels: int, threshold: float = MERGE_THRESHOLD) -> list[dict]:
+    """Gộp kết quả của các tile (đã đổi toạ độ) thành một danh sách Labels giống response của DetectLabels"""
+    by_name = {}
+    for labels in results:
+        for label in labels:
+            merged = by_name.setdefault(label["Name"], {**label, "Instances": []})
+            merged["Confidence"] = max(merged["Confidence"], label["Confidence"])
+            merged["Instances"].extend(label.get("Instances", []))
+
+    labels = sorted(by_name.values(), key=lambda label: label["Confidence"], reverse=True)[:max_labels]
+    return [{**label, "Instances": merge_instances(label["Instances"], threshold)} for label in labels]
+
+def detect_tiled(image, detect_fn, max_labels: int, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP,
+                 concurrency: int = TILE_CONCURRENCY, rate_limiter=None, include_full_frame: bool = True,
+                 threshold: float = MERGE_THRESHOLD) -> list[dict]:
+    """
+    Chạy DetectLabels trên từng tile song song (tối đa `concurrency` lời gọi, qua `rate_limiter` nếu có).
+    `detect_fn(tile_image, box)` trả về response['Labels'] của tile. Lượt toàn ảnh (include_full_frame)
+    giữ lại các đối tượng lớn và nhãn cảnh không có instance.
+    """
+    width, height = image.size
+    boxes = tile_boxes(width, height, tile_size, overlap)
+    if include_full_frame and boxes != [(0, 0, width, height)]:
+        boxes.append((0, 0, width, height))
+
+    def run(box):
+        if rate_limiter:
+            rate_limiter.acquire()
+        tile = image if box == (0, 0, width, height) else image.crop(box)
+        return remap_labels(detect_fn(tile, box), box, width, height)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(executor.map(run, boxes))
+    return merge_tiled_labels(results, max_labels, threshold)